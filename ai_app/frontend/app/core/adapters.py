@@ -0,0 +1,197 @@
+import json
+from typing import Any, Callable
+from app.core.config import settings
+from app.core.detections import detection
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is slower but reads the same payloads
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+# (prediction text, confidence, error, detections), as returned by request_prediction
+Parsed = tuple[str | None, float, str | None, list[dict]]
+Parser = Callable[[Any], Parsed | None]
+
+LABEL_KEYS = ("class_name", "label", "prediction")
+ROOT_LABEL_KEYS = ("prediction", "label", "result", "class")
+CONFIDENCE_KEYS = ("confidence", "score")
+BBOX_KEYS = ("bbox", "box")
+# Used when the predictor doesn't report a confidence
+DEFAULT_CONFIDENCE = 0.99
+
+
+def _first_key(data: dict, keys: tuple[str, ...], default: str | None = None) -> str | None:
+    return next((key for key in keys if data.get(key)), default)
+
+
+def top_k(detections: list[dict]) -> list[dict]:
+    """The PREDICTOR_TOP_K most confident detections, most confident first (0 keeps all, in predictor order)."""
+    if settings.PREDICTOR_TOP_K <= 0:
+        return detections
+    return sorted(detections, key=lambda d: d["confidence"] or 0.0, reverse=True)[:settings.PREDICTOR_TOP_K]
+
+
+class ResponseAdapter:
+    """Reads one shape of predictor response.
+
+    `bind(sample)` inspects a decoded payload once and returns a parser
+    specialised to it (e.g. with the label key already resolved), or None if
+    the payload isn't this shape. A bound parser returns None when a later
+    payload stops matching, which makes the registry pick again.
+    """
+
+    name = ""
+
+    def bind(self, sample: Any) -> Parser | None:
+        raise NotImplementedError
+
+
+class DetectionListAdapter(ResponseAdapter):
+    """`{"predictions": [{"class_name": ..., "confidence": ..., "bbox": [...]}, ...]}` (YOLO-style)."""
+
+    name = "detections"
+
+    def bind(self, sample):
+        if not isinstance(sample, dict):
+            return None
+        items = sample.get("predictions")
+        if not isinstance(items, list) or not items or not isinstance(items[0], dict):
+            return None
+        label_key = _first_key(items[0], LABEL_KEYS)
+        if label_key is None:
+            return None
+        confidence_key = _first_key(items[0], CONFIDENCE_KEYS, "confidence")
+        bbox_key = _first_key(items[0], BBOX_KEYS, "bbox")
+
+        def parse(data):
+            items = data.get("predictions") if isinstance(data, dict) else None
+            if not items or not isinstance(items, list):
+                return None
+            detections = []
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                # Items from one backend share a shape; the fallback covers mixed payloads
+                label = item.get(label_key) or item.get(_first_key(item, LABEL_KEYS, label_key))
+                if label:
+                    detections.append(detection(label, item.get(confidence_key), item.get(bbox_key)))
+            if not detections:
+                return None
+            detections = top_k(detections)
+            text = ", ".join(d["class_name"] for d in detections)
+            return text, detections[0]["confidence"] or DEFAULT_CONFIDENCE, None, detections
+
+        return parse
+
+
+class RootLabelAdapter(ResponseAdapter):
+    """`{"prediction": "bottle", "confidence": 0.9}` (or label/result/class, score)."""
+
+    name = "label"
+
+    def bind(self, sample):
+        if not isinstance(sample, dict):
+            return None
+        label_key = _first_key(sample, ROOT_LABEL_KEYS)
+        if label_key is None:
+            return None
+        confidence_key = _first_key(sample, CONFIDENCE_KEYS, "confidence")
+
+        def parse(data):
+            label = data.get(label_key) if isinstance(data, dict) else None
+            if not label:
+                return None
+            confidence = data.get(confidence_key) or DEFAULT_CONFIDENCE
+            return label, confidence, None, [detection(label, confidence)]
+
+        return parse
+
+
+class SingleValueAdapter(ResponseAdapter):
+    """`{"anything": "bottle"}`: the value of a one-key object is taken as the label."""
+
+    name = "single_value"
+
+    def bind(self, sample):
+        if not isinstance(sample, dict) or len(sample) != 1:
+            return None
+
+        def parse(data):
+            if not isinstance(data, dict) or len(data) != 1:
+                return None
+            label = next(iter(data.values()))
+            if not label or not isinstance(label, (str, int, float)):
+                return None
+            return label, DEFAULT_CONFIDENCE, None, [detection(label, DEFAULT_CONFIDENCE)]
+
+        return parse
+
+
+class StringAdapter(ResponseAdapter):
+    """A bare JSON string: `"bottle"`."""
+
+    name = "string"
+
+    def bind(self, sample):
+        if not isinstance(sample, str) or not sample:
+            return None
+
+        def parse(data):
+            if not isinstance(data, str) or not data:
+                return None
+            return data, DEFAULT_CONFIDENCE, None, [detection(data, DEFAULT_CONFIDENCE)]
+
+        return parse
+
+
+class AdapterRegistry:
+    """Response adapters in detection order, and the one bound to each predictor endpoint.
+
+    With PREDICTOR_RESPONSE_ADAPTER="auto" the first adapter that can read an
+    endpoint's first response is kept for that endpoint; otherwise the named
+    adapter is always used.
+    """
+
+    def __init__(self):
+        self.adapters: dict[str, ResponseAdapter] = {}
+        self._bound: dict[str, tuple[str, Parser]] = {}
+
+    def register(self, adapter: ResponseAdapter):
+        self.adapters[adapter.name] = adapter
+        self._bound.clear()
+
+    def check_setting(self):
+        """Fail fast on a PREDICTOR_RESPONSE_ADAPTER that names no registered adapter."""
+        forced = settings.PREDICTOR_RESPONSE_ADAPTER
+        if forced != "auto" and forced not in self.adapters:
+            choices = ", ".join(repr(name) for name in ["auto", *self.adapters])
+            raise RuntimeError(f"PREDICTOR_RESPONSE_ADAPTER={forced!r} is not a response adapter. Choose one of {choices}.")
+
+    def selected(self) -> dict[str, str]:
+        """Endpoint -> adapter name."""
+        return {endpoint: name for endpoint, (name, _) in self._bound.items()}
+
+    def parse(self, endpoint: str, data: Any) -> Parsed | None:
+        bound = self._bound.get(endpoint)
+        if bound is not None:
+            result = bound[1](data)
+            if result is not None:
+                return result
+
+        # First response from this endpoint, or its shape changed
+        forced = settings.PREDICTOR_RESPONSE_ADAPTER
+        candidates = self.adapters.values() if forced == "auto" else [self.adapters[forced]]
+        for adapter in candidates:
+            parser = adapter.bind(data)
+            result = parser(data) if parser is not None else None
+            if result is not None:
+                self._bound[endpoint] = (adapter.name, parser)
+                return result
+        return None
+
+
+response_adapters = AdapterRegistry()
+for _adapter in (DetectionListAdapter(), RootLabelAdapter(), SingleValueAdapter(), StringAdapter()):
+    response_adapters.register(_adapter)
@@ -0,0 +1,198 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from app.core.auth import SESSION_COOKIE
+from app.core.config import settings
+from app.core.metrics import PREDICT_ADMISSION, PREDICT_IN_FLIGHT
+from app.core.security import decode_access_token
+from app.core.shared_state import shared_state
+
+# Upload endpoints guarded by AdmissionMiddleware -> setting with their body size limit
+GUARDED_ROUTES = {
+    "/predict": "PREDICT_MAX_UPLOAD_BYTES",
+    "/predict/jobs": "PREDICT_MAX_UPLOAD_BYTES",
+    "/predict/batch": "PREDICT_BATCH_MAX_BYTES",
+    "/predict/stream/video": "STREAM_VIDEO_MAX_BYTES",
+}
+# Multipart framing (boundaries, part headers) on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_BUCKETS = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """PREDICT_RATE_BURST tokens, refilled at PREDICT_RATE_LIMIT per second; one per upload."""
+
+    def __init__(self):
+        self.tokens = float(settings.PREDICT_RATE_BURST)
+        self.updated_at = time.monotonic()
+
+    def try_take(self) -> float:
+        """0 if a token was taken, otherwise seconds until the next one."""
+        now = time.monotonic()
+        self.tokens = min(settings.PREDICT_RATE_BURST, self.tokens + (now - self.updated_at) * settings.PREDICT_RATE_LIMIT)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / settings.PREDICT_RATE_LIMIT
+
+
+class RateLimiter:
+    """Token bucket per client key (user id, or address when not signed in), LRU-bounded.
+
+    Buckets live in this worker process: the single-worker setup (SHARED_STATE_BACKEND=memory).
+    """
+
+    def __init__(self, maxsize: int = MAX_BUCKETS):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    async def try_acquire(self, key: str) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket()
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.try_take()
+
+
+class SharedRateLimiter:
+    """The per-client limit across all workers, as counters in shared state (one atomic INCR per upload).
+
+    A window of PREDICT_RATE_BURST / PREDICT_RATE_LIMIT seconds admits
+    PREDICT_RATE_BURST uploads: the token bucket's sustained rate and burst,
+    except that a client can fit two bursts around a window boundary.
+    """
+
+    async def try_acquire(self, key: str) -> float:
+        window = settings.PREDICT_RATE_BURST / settings.PREDICT_RATE_LIMIT
+        now = time.time()
+        try:
+            count = await shared_state.incr(f"admission:{key}:{int(now // window)}", ttl=window * 2)
+        except Exception as e:
+            # Uploads keep flowing without the limit rather than failing with shared state
+            logger.warning("rate limit check failed, admitting: %s: %s", type(e).__name__, e)
+            return 0.0
+        if count <= settings.PREDICT_RATE_BURST:
+            return 0.0
+        return window - now % window
+
+
+def build_rate_limiter() -> RateLimiter | SharedRateLimiter:
+    return RateLimiter() if shared_state.name == "memory" else SharedRateLimiter()
+
+
+class UploadTooLarge(HTTPException):
+    """Raised from `receive` mid-body; FastAPI re-raises HTTPExceptions from body parsing, so it becomes the 413."""
+
+    def __init__(self):
+        super().__init__(status_code=413, detail="Upload is too large", headers={"Connection": "close"})
+
+
+def client_key(scope) -> str:
+    """The signed-in user id from the session cookie (signature checked, no DB hit), else the client address."""
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                key, _, token = part.strip().partition("=")
+                if key == SESSION_COOKIE:
+                    claims = decode_access_token(token)
+                    if claims and "sub" in claims:
+                        return f"user:{claims['sub']}"
+    client = scope.get("client")
+    return f"addr:{client[0] if client else 'unknown'}"
+
+
+def _content_length(scope) -> int | None:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: admission control for the upload endpoints.
+
+    Runs before the multipart body is parsed, so refused uploads cost almost
+    nothing: a client over its rate gets 429, a full worker 503, and a body
+    over the size limit 413, either up front from Content-Length or as soon
+    as the streamed bytes pass the limit.
+
+    The rate limit holds across workers when shared state does; the in-flight
+    cap is per worker on purpose, as it guards this process's memory.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiter = build_rate_limiter()
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in GUARDED_ROUTES:
+            return await self.app(scope, receive, send)
+
+        route = scope["path"]
+        max_bytes = getattr(settings, GUARDED_ROUTES[route]) + MULTIPART_OVERHEAD
+        declared = _content_length(scope)
+        if declared is not None and declared > max_bytes:
+            return await self._reject(scope, receive, send, route, "too_large", 413, "Upload is too large")
+
+        if settings.PREDICT_RATE_LIMIT > 0:
+            wait = await self.limiter.try_acquire(client_key(scope))
+            if wait:
+                return await self._reject(scope, receive, send, route, "rate_limited", 429,
+                                          "Too many uploads, slow down", math.ceil(wait))
+
+        if settings.PREDICT_MAX_IN_FLIGHT and self.in_flight >= settings.PREDICT_MAX_IN_FLIGHT:
+            return await self._reject(scope, receive, send, route, "overloaded", 503,
+                                      "Server is busy, try again shortly", settings.PREDICT_OVERLOAD_RETRY_AFTER)
+
+        received = 0
+        response_started = False
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    PREDICT_ADMISSION.labels(route, "too_large").inc()
+                    raise UploadTooLarge()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        PREDICT_ADMISSION.labels(route, "admitted").inc()
+        self.in_flight += 1
+        PREDICT_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, counting_receive, send_wrapper)
+        except UploadTooLarge as e:
+            # Only reaches here if the app let it escape instead of answering
+            if not response_started:
+                await JSONResponse({"detail": e.detail}, status_code=413, headers=e.headers)(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            PREDICT_IN_FLIGHT.dec()
+
+    async def _reject(self, scope, receive, send, route, decision, status_code, detail, retry_after=None):
+        PREDICT_ADMISSION.labels(route, decision).inc()
+        # The body is left unread; closing the connection spares the client from sending it
+        headers = {"Connection": "close"}
+        if retry_after is not None:
+            headers["Retry-After"] = str(retry_after)
+        await JSONResponse({"detail": detail}, status_code=status_code, headers=headers)(scope, receive, send)
@@ -0,0 +1,131 @@
+import time
+from dataclasses import dataclass
+from fastapi import Cookie, HTTPException, Request, Response, WebSocket, WebSocketException, status
+from starlette.requests import HTTPConnection
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import create_access_token, decode_access_token
+from app.db.database import AsyncSessionLocal
+from app.db.models import User
+
+SESSION_COOKIE = "session"
+# Re-issue the token once less than this share of its lifetime is left
+REFRESH_WHEN_REMAINING = 0.5
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    is_active: bool
+
+
+class LoginRequired(Exception):
+    """Raised by `page_user`; main.py turns it into a redirect to /login."""
+
+
+# user id -> CurrentUser, so most requests never touch the users table
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+async def load_user(user_id: int) -> CurrentUser | None:
+    user = user_cache.get(user_id)
+    if user is None:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(User, user_id)
+        if row is None:
+            return None
+        user = CurrentUser(row.id, row.username, row.is_active is not False)
+        user_cache.set(user_id, user)
+    return user
+
+
+def set_session_cookie(response: Response, user_id: int):
+    response.set_cookie(
+        key=SESSION_COOKIE,
+        value=create_access_token(user_id),
+        max_age=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        httponly=True,
+        samesite="lax",
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def clear_session_cookie(response: Response):
+    response.delete_cookie(SESSION_COOKIE)
+
+
+async def _authenticate(request: HTTPConnection, token: str | None) -> CurrentUser | None:
+    claims = decode_access_token(token) if token else None
+    if claims is None:
+        return None
+    try:
+        user_id = int(claims["sub"])
+    except (KeyError, ValueError):
+        return None
+    user = await load_user(user_id)
+    if user is None or not user.is_active:
+        return None
+    # Sliding window: active sessions get a fresh token, idle ones expire
+    if claims["exp"] - time.time() < settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 * REFRESH_WHEN_REMAINING:
+        request.state.session_user_id = user.id
+    return user
+
+
+async def current_user(request: Request, session: str | None = Cookie(default=None)) -> CurrentUser:
+    """Shared dependency for JSON endpoints: the signed-in user, or 401."""
+    user = await _authenticate(request, session)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user
+
+
+async def page_user(request: Request, session: str | None = Cookie(default=None)) -> CurrentUser:
+    """Shared dependency for HTML pages: the signed-in user, or a redirect to /login."""
+    user = await _authenticate(request, session)
+    if user is None:
+        raise LoginRequired()
+    return user
+
+
+async def websocket_user(websocket: WebSocket, session: str | None = Cookie(default=None)) -> CurrentUser:
+    """Shared dependency for WebSocket routes: the signed-in user, or the handshake is refused.
+
+    The session is not refreshed here; the pages around the stream do that.
+    """
+    user = await _authenticate(websocket, session)
+    if user is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+    return user
+
+
+class SessionRefreshMiddleware:
+    """Pure ASGI middleware: adds the refreshed session cookie chosen by the auth dependencies.
+
+    Done here rather than in the dependency because routes return their own
+    Response objects, which would drop cookies set on an injected Response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                user_id = scope.get("state", {}).get("session_user_id")
+                headers = list(message.get("headers", []))
+                # The route may have signed in or out itself (login, logout)
+                if user_id is not None and not any(
+                    name == b"set-cookie" and value.startswith(SESSION_COOKIE.encode() + b"=")
+                    for name, value in headers
+                ):
+                    cookie = Response()
+                    set_session_cookie(cookie, user_id)
+                    headers += [(name, value) for name, value in cookie.raw_headers if name == b"set-cookie"]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+from app.core.config import settings
+from app.core.metrics import (
+    PREDICTOR_BACKEND_HEALTHY,
+    PREDICTOR_BACKEND_LATENCY,
+    PREDICTOR_BACKEND_OUTSTANDING,
+    PREDICTOR_BACKEND_REQUESTS,
+)
+from app.core.resilience import predictor_endpoints
+
+# Completed calls kept per backend for the latency percentiles and request rate
+STATS_WINDOW = 60.0
+STATS_SAMPLES = 512
+
+logger = logging.getLogger(__name__)
+
+
+def health_url(endpoint: str) -> str:
+    """`http://gpu1:8000/predict` -> `http://gpu1:8000/health`."""
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme}://{parts.netloc}{settings.PREDICTOR_HEALTH_PATH}"
+
+
+class Backend:
+    """Load and latency bookkeeping for one predictor endpoint."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.updated_at = time.monotonic()
+        self.healthy = True
+        self.check_streak = 0 # Consecutive health checks disagreeing with `healthy`
+        self.requests = 0
+        self.errors = 0
+        self.samples: deque[tuple[float, float]] = deque(maxlen=STATS_SAMPLES) # (finished_at, seconds)
+        PREDICTOR_BACKEND_HEALTHY.labels(url).set(1)
+
+    def observe(self, seconds: float):
+        """Fold a response time into the time-decayed EWMA (recent calls weigh most)."""
+        now = time.monotonic()
+        weight = math.exp(-(now - self.updated_at) / settings.PREDICTOR_EWMA_DECAY)
+        self.ewma = self.ewma * weight + seconds * (1 - weight) if self.requests else seconds
+        self.updated_at = now
+
+    def cost(self) -> float:
+        if settings.PREDICTOR_BALANCING == "least_outstanding":
+            return self.outstanding
+        # Peak EWMA: expected latency scaled by the queue already waiting on it
+        return self.ewma * (self.outstanding + 1)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = sorted(seconds for finished_at, seconds in self.samples if now - finished_at <= STATS_WINDOW)
+
+        def percentile(p: float) -> float | None:
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(len(recent) * p / 100))] * 1000, 2)
+
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma * 1000, 2),
+            "requests": self.requests,
+            "errors": self.errors,
+            "requests_per_second": round(len(recent) / STATS_WINDOW, 2),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+        }
+
+
+class _Call:
+    failed = False
+
+
+class PredictorPool:
+    """Spreads predictions over EXTERNAL_PREDICTOR_API and PREDICTOR_REPLICAS.
+
+    `order()` ranks the healthy backends by PREDICTOR_BALANCING (peak EWMA
+    latency or least outstanding requests), so the resilient upstream tries the
+    cheapest one first and retries/hedges to the next. A background task probes
+    every backend's PREDICTOR_HEALTH_PATH; one failing PREDICTOR_HEALTH_FALL
+    checks in a row is taken out of rotation until it passes PREDICTOR_HEALTH_RISE.
+    Any answer below 500 counts as up, since not every predictor serves /health.
+    """
+
+    def __init__(self):
+        self.backends: dict[str, Backend] = {}
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+
+    def _sync(self) -> list[Backend]:
+        # Endpoints come from settings, which may change (e.g. in benchmarks)
+        urls = predictor_endpoints()
+        for url in urls:
+            if url not in self.backends:
+                self.backends[url] = Backend(url)
+        return [self.backends[url] for url in urls]
+
+    def order(self) -> list[str]:
+        backends = self._sync()
+        candidates = [b for b in backends if b.healthy] or backends # All down: let the breakers decide
+        # Shuffle first so equal costs (e.g. idle backends) don't all go to the first one
+        random.shuffle(candidates)
+        return [b.url for b in sorted(candidates, key=Backend.cost)]
+
+    @asynccontextmanager
+    async def track(self, url: str):
+        """Count a call to `url` as outstanding and record its latency and outcome.
+
+        The caller sets `failed` on the yielded object for error responses.
+        """
+        if url not in self.backends:
+            self.backends[url] = Backend(url)
+        backend = self.backends[url]
+        call = _Call()
+        backend.outstanding += 1
+        PREDICTOR_BACKEND_OUTSTANDING.labels(url).inc()
+        started = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            # A hedge that lost the race says nothing about the backend
+            backend.outstanding -= 1
+            PREDICTOR_BACKEND_OUTSTANDING.labels(url).dec()
+            raise
+        except Exception:
+            call.failed = True
+            self._finish(backend, call, started)
+            raise
+        self._finish(backend, call, started)
+
+    def _finish(self, backend: Backend, call: _Call, started: float):
+        backend.outstanding -= 1
+        PREDICTOR_BACKEND_OUTSTANDING.labels(backend.url).dec()
+        elapsed = time.monotonic() - started
+        if call.failed:
+            # Fast failures (refused connections) must not make a backend look fast
+            elapsed = max(elapsed, settings.PREDICTOR_FAILURE_PENALTY)
+        backend.observe(elapsed)
+        backend.requests += 1
+        backend.errors += call.failed
+        backend.samples.append((time.monotonic(), elapsed))
+        PREDICTOR_BACKEND_LATENCY.labels(backend.url).observe(elapsed)
+        PREDICTOR_BACKEND_REQUESTS.labels(backend.url, "error" if call.failed else "success").inc()
+
+    def stats(self) -> dict:
+        return {
+            "strategy": settings.PREDICTOR_BALANCING,
+            "backends": [backend.stats() for backend in self._sync()],
+        }
+
+    def start(self, client: httpx.AsyncClient):
+        if settings.PREDICTOR_HEALTH_INTERVAL <= 0:
+            return
+        self._client = client
+        self._task = asyncio.create_task(self._run(), name="predictor-health")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.gather(*(self.check(backend) for backend in self._sync()))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. a malformed replica URL (httpx.InvalidURL); keep checking the others next round
+                logger.exception("predictor health check failed")
+            await asyncio.sleep(settings.PREDICTOR_HEALTH_INTERVAL)
+
+    async def check(self, backend: Backend):
+        try:
+            response = await self._client.get(health_url(backend.url), timeout=settings.PREDICTOR_HEALTH_TIMEOUT)
+            up = response.status_code < 500
+        except httpx.HTTPError:
+            up = False
+        if up == backend.healthy:
+            backend.check_streak = 0
+            return
+        backend.check_streak += 1
+        if backend.check_streak >= (settings.PREDICTOR_HEALTH_RISE if up else settings.PREDICTOR_HEALTH_FALL):
+            backend.healthy = up
+            backend.check_streak = 0
+            PREDICTOR_BACKEND_HEALTHY.labels(backend.url).set(int(up))
+            logger.warning("predictor backend %s", "up" if up else "down", extra={"backend": backend.url})
+
+
+predictor_pool = PredictorPool()
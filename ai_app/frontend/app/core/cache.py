@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.shared_state import SharedState, shared_state
+from app.db.models import Prediction, PredictionDetection, TrainingJob
+
+
+class TTLCache:
+    """Small in-process LRU cache where every entry also expires after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass(frozen=True)
+class CachedPrediction:
+    prediction_text: str
+    confidence: float
+    image_path: str | None
+    detections: tuple = ()
+
+
+class PredictionCache:
+    """Prediction results keyed by the SHA-256 of the uploaded image.
+
+    Two tiers: shared state (in-process, or Redis shared by every worker) with
+    a TTL, then the indexed `Prediction.content_hash` column, so results
+    survive restarts. "memory" in the stats means the first tier.
+
+    Both tiers are scoped to a generation, the model version: starting a
+    training run opens a new one (`TrainingJob.model_version`), so results of
+    the previous model are no longer found. Callers read the generation before
+    predicting and pass it along; results of an older generation that finish
+    late are not cached.
+    """
+
+    KEY = "prediction-cache:"
+    GENERATION = KEY + "generation"
+    STATS = ("memory_hits", "db_hits", "misses", "invalidations")
+
+    def __init__(self, state: SharedState, ttl: float):
+        self.state = state
+        self.ttl = ttl
+
+    async def _count(self, stat: str):
+        await self.state.incr(f"{self.KEY}stats:{stat}")
+
+    async def generation(self, db: AsyncSession) -> int:
+        """The current generation: from shared state, else the latest training run's model version."""
+        raw = await self.state.get(self.GENERATION)
+        if raw is not None:
+            return int(raw)
+        value = await db.scalar(select(func.max(TrainingJob.model_version))) or 0
+        await self.state.set(self.GENERATION, str(value).encode("ascii"))
+        return value
+
+    async def lookup(self, db: AsyncSession, content_hash: str, generation: int) -> CachedPrediction | None:
+        raw = await self.state.get(f"{self.KEY}entry:{generation}:{content_hash}")
+        if raw is not None:
+            await self._count("memory_hits")
+            data = json.loads(raw)
+            return CachedPrediction(**{**data, "detections": tuple(data["detections"])})
+
+        row = (await db.execute(
+            select(Prediction.id, Prediction.prediction_text, Prediction.confidence, Prediction.image_path)
+            .where(
+                Prediction.content_hash == content_hash,
+                Prediction.model_version == generation,
+                Prediction.status == "completed",
+            )
+            .order_by(Prediction.id.desc())
+            .limit(1)
+        )).first()
+        if row is None:
+            await self._count("misses")
+            return None
+
+        await self._count("db_hits")
+        detections = (await db.execute(
+            select(PredictionDetection.class_name, PredictionDetection.confidence, PredictionDetection.bbox)
+            .where(PredictionDetection.prediction_id == row.id)
+            .order_by(PredictionDetection.id)
+        )).all()
+        cached = CachedPrediction(row.prediction_text, row.confidence, row.image_path, tuple(d._asdict() for d in detections))
+        await self.store(content_hash, cached, generation)
+        return cached
+
+    async def store(self, content_hash: str, result: CachedPrediction, generation: int):
+        # Predicted by the previous model while a training run started: drop it
+        current = await self.state.get(self.GENERATION)
+        if current is not None and int(current) != generation:
+            return
+        await self.state.set(f"{self.KEY}entry:{generation}:{content_hash}", json.dumps(asdict(result)).encode("utf-8"), self.ttl)
+
+    async def next_generation(self, db: AsyncSession) -> int:
+        """Model version for a training run that is starting; record it on the job and commit, then `activate` it."""
+        return (await db.scalar(select(func.max(TrainingJob.model_version))) or 0) + 1
+
+    async def activate(self, generation: int):
+        """Switch every worker to `generation`; earlier results stop being served.
+
+        Rows keep their hashes: older generations are filtered out, not rewritten.
+        """
+        await self.state.set(self.GENERATION, str(generation).encode("ascii"))
+        await self.state.delete_prefix(f"{self.KEY}entry:")
+        await self._count("invalidations")
+
+    async def stats(self) -> dict:
+        counts = {stat: int(await self.state.get(f"{self.KEY}stats:{stat}") or 0) for stat in self.STATS}
+        lookups = counts["memory_hits"] + counts["db_hits"] + counts["misses"]
+        return {
+            "enabled": settings.PREDICTION_CACHE_ENABLED,
+            "backend": self.state.name,
+            **counts,
+            "hit_ratio": round((counts["memory_hits"] + counts["db_hits"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+prediction_cache = PredictionCache(shared_state, settings.PREDICTION_CACHE_TTL)
@@ -1,25 +1,201 @@
+from typing import Literal
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
+# Anyone who has read this file could sign session tokens with it
+DEFAULT_SECRET_KEY = "supersecretkey"
+
 class Settings(BaseSettings):
-    MYSQL_USER: str
-    MYSQL_PASSWORD: str
-    MYSQL_HOST: str
-    MYSQL_PORT: int
-    MYSQL_DATABASE: str
+    MYSQL_USER: str = ""
+    MYSQL_PASSWORD: str = ""
+    MYSQL_HOST: str = ""
+    MYSQL_PORT: int = 3306
+    MYSQL_DATABASE: str = ""
+    SQLITE_PATH: str | None = None # Use SQLite instead of MySQL (benchmarks, development); ":memory:" for one process
     PORT: int = 8000
-    SECRET_KEY: str = "supersecretkey" # Change in production
-    ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    SECRET_KEY: str = DEFAULT_SECRET_KEY # Must be set unless SQLITE_PATH is (development, benchmarks)
+    ALGORITHM: Literal["HS256", "HS384", "HS512"] = "HS256" # Session JWTs (see security.JWT_ALGORITHMS); anything else fails at startup
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30 # Session lifetime; refreshed while the user is active
+    SESSION_COOKIE_SECURE: bool = False # Set to true when served over HTTPS
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 60.0 # How long a deactivated user can keep using a live session
+    BCRYPT_ROUNDS: int = 12 # Existing hashes are upgraded on the next successful login
+    PASSWORD_HASH_WORKERS: int = 4
     TRAIN_CONFIG_URL: str = "https://8530796ab19b.ngrok-free.app/train/config"
     UPDATE_CONFIG_URL: str = "https://8530796ab19b.ngrok-free.app/train/config"
     START_TRAINING_URL: str = "https://8530796ab19b.ngrok-free.app/train/start"
     EXTERNAL_PREDICTOR_API: str = "https://8530796ab19b.ngrok-free.app/predict"
+    TRAINING_STATUS_URL: str = "https://8530796ab19b.ngrok-free.app/train/status"
+
+    # Logging (JSON lines on stdout, written by a background thread)
+    LOG_LEVEL: str = "INFO" # DEBUG adds per-request summaries with timing spans, sampled below
+    LOG_FORMAT: str = "json" # Or "text" for development
+    LOG_DEBUG_SAMPLE_RATE: float = 0.1 # Share of requests whose DEBUG records are kept
+    LOG_SLOW_REQUEST: float = 1.0 # Requests slower than this (seconds) are summarised at INFO
+    LOG_QUEUE_SIZE: int = 10000 # Records waiting for the writer thread; more are dropped
+
+    # State shared by worker processes: prediction cache, job notifications, training tracker lease
+    SHARED_STATE_BACKEND: str = "memory" # "redis" when running several workers
+    SHARED_STATE_URL: str = "redis://localhost:6379/0"
+    SHARED_STATE_PREFIX: str = "ai_app:"
+    SHARED_STATE_MEMORY_SIZE: int = 10000 # Max keys held by the in-memory backend (LRU)
+
+    # Schema migrations: `python manage.py migrate`; startup only checks the version
+    AUTO_MIGRATE: bool = False # Apply pending migrations on startup instead of refusing to start (development)
+
+    # Database connection pool (MySQL drops idle connections after wait_timeout)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800 # Keep below the server's wait_timeout
+    DB_POOL_PRE_PING: bool = True
+
+    # Outbound HTTP clients (shared, pooled per upstream for the app lifetime)
+    HTTP2_ENABLED: bool = True
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    PREDICTOR_TIMEOUT: float = 60.0
+    PREDICTOR_MAX_CONNECTIONS: int = 50
+    PREDICTOR_MAX_KEEPALIVE: int = 20
+    TRAINING_TIMEOUT: float = 10.0
+    START_TRAINING_TIMEOUT: float = 30.0
+    TRAINING_MAX_CONNECTIONS: int = 10
+    TRAINING_MAX_KEEPALIVE: int = 5
+
+    # Upstream resilience: circuit breakers, budgeted retries, hedged predictor requests
+    BREAKER_ENABLED: bool = True
+    BREAKER_FAILURE_THRESHOLD: int = 5 # Consecutive failures before the circuit opens
+    BREAKER_RECOVERY_TIMEOUT: float = 30.0 # Seconds open before a half-open probe
+    BREAKER_HALF_OPEN_PROBES: int = 1
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.2
+    UPSTREAM_RETRY_MAX_DELAY: float = 2.0
+    RETRY_BUDGET_RATIO: float = 0.2 # Retries + hedges may add at most ~20% extra load
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    PREDICTOR_REPLICAS: list[str] = [] # Extra predictor URLs, e.g. '["http://gpu2:8000/predict"]'
+    PREDICTOR_HEDGE_DELAY: float = 0.0 # Seconds before hedging to a replica; 0 disables
+
+    # Predictor responses
+    PREDICTOR_RESPONSE_ADAPTER: str = "auto" # Or force one: "detections", "label", "single_value", "string"
+    PREDICTOR_TOP_K: int = 0 # Keep only the k most confident detections; 0 keeps all
+
+    # Predictor load balancing over EXTERNAL_PREDICTOR_API + PREDICTOR_REPLICAS
+    PREDICTOR_BALANCING: str = "ewma" # "ewma" (peak EWMA latency) or "least_outstanding"
+    PREDICTOR_EWMA_DECAY: float = 10.0 # Seconds for old latency samples to fade out
+    PREDICTOR_FAILURE_PENALTY: float = 5.0 # Latency charged for a failed call
+    PREDICTOR_HEALTH_INTERVAL: float = 10.0 # 0 disables active health checks
+    PREDICTOR_HEALTH_PATH: str = "/health"
+    PREDICTOR_HEALTH_TIMEOUT: float = 2.0
+    PREDICTOR_HEALTH_FALL: int = 2 # Failed checks in a row before a backend leaves rotation
+    PREDICTOR_HEALTH_RISE: int = 2 # Passed checks in a row before it comes back
+
+    # Remote training config (served stale-while-revalidate)
+    TRAIN_CONFIG_TTL: float = 60.0
+
+    # Training status tracker (adaptive polling of TRAINING_STATUS_URL)
+    TRAINING_POLL_MIN_INTERVAL: float = 2.0
+    TRAINING_POLL_MAX_INTERVAL: float = 60.0
+    TRAINING_POLL_BACKOFF: float = 1.5
+
+    # Prediction result cache (keyed by image SHA-256)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_TTL: float = 3600.0
+
+    # Batch prediction
+    PREDICT_BATCH_CONCURRENCY: int = 8
+    PREDICT_BATCH_STORE_CONCURRENCY: int = 4 # Images of a batch written to storage at once
+    PREDICT_BATCH_MAX_FILES: int = 500
+    PREDICT_BATCH_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Image pre-processing before the predictor call (needs Pillow)
+    PREPROCESS_ENABLED: bool = False
+    PREPROCESS_MAX_SIDE: int = 640 # Match the model's input size (YOLO default imgsz)
+    PREPROCESS_FORMAT: str = "jpeg" # "jpeg" or "webp"
+    PREPROCESS_QUALITY: int = 85
+    PREPROCESS_WORKERS: int = 2 # Worker processes
+
+    # Admission control for uploads (/predict, /predict/jobs, /predict/batch)
+    PREDICT_RATE_LIMIT: float = 2.0 # Sustained uploads per second per user (or address), across all workers with shared state; 0 disables
+    PREDICT_RATE_BURST: int = 20
+    PREDICT_MAX_IN_FLIGHT: int = 64 # Upload requests served at once by each worker process; 0 disables
+    PREDICT_OVERLOAD_RETRY_AFTER: int = 2
+    PREDICT_MAX_UPLOAD_BYTES: int = 25 * 1024 * 1024 # Single-image uploads; batches use PREDICT_BATCH_MAX_BYTES
+
+    # Async prediction jobs (/predict/jobs)
+    PREDICT_QUEUE_WORKERS: int = 4 # Predictions run at once by the job workers
+    PREDICT_QUEUE_SIZE: int = 100 # Waiting jobs before new ones get 503
+    PREDICT_JOB_STALE_AFTER: float = 600.0 # Checked this often; a job "running" (or still "queued") this long is re-queued
+    PREDICT_JOB_MAX_WAIT: float = 30.0 # Longest ?wait= for long-polling a job
+
+    # Frame streams: WebSocket /predict/stream and video uploads to /predict/stream/video
+    STREAM_SAMPLE_FPS: float = 1.0 # Frames per second looked at, unless the client asks for fewer (?fps=)
+    STREAM_MAX_SAMPLE_FPS: float = 5.0
+    STREAM_DEDUP_DISTANCE: int = 4 # Skip frames whose dHash is within this many bits (of 256) of the last one predicted; -1 disables
+    STREAM_MAX_IN_FLIGHT: int = 2 # Predictor calls per stream at once; live frames arriving while full are dropped
+    STREAM_MAX_CONNECTIONS: int = 16 # Streams served at once per worker
+    STREAM_MAX_FRAME_BYTES: int = 8 * 1024 * 1024
+    STREAM_VIDEO_MAX_BYTES: int = 512 * 1024 * 1024 # Needs PyAV (pip install av)
+    STREAM_VIDEO_MAX_FRAMES: int = 3600 # Sampled frames per video
+
+    # Upload storage: "local" (sharded tree under app/static) or "s3" (needs boto3)
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = "predictions"
+    S3_ENDPOINT_URL: str | None = None # Set for MinIO/R2/other S3-compatible stores
+    S3_REGION: str | None = None
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    S3_PUBLIC_URL: str | None = None # e.g. a CDN in front of the bucket
+
+    # Image retention and compaction (background job)
+    RETENTION_DAYS: int = 0 # 0 keeps images forever
+    RETENTION_INTERVAL: float = 6 * 3600
+    RETENTION_ORPHAN_GRACE: float = 24 * 3600 # Unreferenced images younger than this are kept
+    RETENTION_BATCH_SIZE: int = 500
+
+    # Thumbnails (generated in the background, served instead of originals in listings)
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_SIZE: int = 320
+    THUMBNAIL_FORMAT: str = "webp"
+    THUMBNAIL_QUALITY: int = 80
+    THUMBNAIL_QUEUE_SIZE: int = 1000
+
+    # Static files that are not content-hashed (seconds before revalidating)
+    STATIC_MAX_AGE: int = 3600
+
+    # Dashboard
+    DASHBOARD_PAGE_SIZE: int = 12
+    DASHBOARD_CLASS_STATS_LIMIT: int = 8
+
+    @model_validator(mode="after")
+    def _require_mysql(self):
+        if not self.SQLITE_PATH:
+            missing = [key for key in ("MYSQL_USER", "MYSQL_HOST", "MYSQL_DATABASE") if not getattr(self, key)]
+            if missing:
+                raise ValueError(f"{', '.join(missing)} must be set (or SQLITE_PATH to use SQLite)")
+        return self
+
+    @property
+    def _sqlite_database(self):
+        # A named shared-cache database, so every connection in the process sees the same one
+        if self.SQLITE_PATH == ":memory:":
+            return "file:ai_app?mode=memory&cache=shared&uri=true"
+        return self.SQLITE_PATH
 
     @property
     def DATABASE_URL(self):
         from urllib.parse import quote_plus
+        if self.SQLITE_PATH:
+            return f"sqlite:///{self._sqlite_database}"
         return f"mysql+mysqlconnector://{self.MYSQL_USER}:{quote_plus(self.MYSQL_PASSWORD)}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
 
+    @property
+    def ASYNC_DATABASE_URL(self):
+        from urllib.parse import quote_plus
+        if self.SQLITE_PATH:
+            return f"sqlite+aiosqlite:///{self._sqlite_database}"
+        return f"mysql+aiomysql://{self.MYSQL_USER}:{quote_plus(self.MYSQL_PASSWORD)}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+
     class Config:
         env_file = ".env"
         extra = "ignore"
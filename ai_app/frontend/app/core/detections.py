@@ -0,0 +1,116 @@
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import DetectionDailyRollup, Prediction, PredictionDetection
+
+CLASS_NAME_LENGTH = 100
+
+
+def detection(class_name, confidence=None, bbox=None) -> dict:
+    return {
+        "class_name": str(class_name)[:CLASS_NAME_LENGTH],
+        "confidence": float(confidence) if confidence is not None else None,
+        "bbox": bbox if isinstance(bbox, (list, tuple)) else None,
+    }
+
+
+def detection_models(detections: list[dict]) -> list[PredictionDetection]:
+    """Child rows for a new Prediction (created_at comes from the server clock)."""
+    return [PredictionDetection(**item) for item in detections]
+
+
+def _rollup_upsert(dialect: str, rows: list[dict]):
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(DetectionDailyRollup).values(rows)
+        return stmt.on_duplicate_key_update(
+            detections=DetectionDailyRollup.detections + stmt.inserted.detections,
+            confidence_sum=DetectionDailyRollup.confidence_sum + stmt.inserted.confidence_sum,
+        )
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(DetectionDailyRollup).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[DetectionDailyRollup.day, DetectionDailyRollup.class_name],
+            set_={
+                "detections": DetectionDailyRollup.detections + stmt.excluded.detections,
+                "confidence_sum": DetectionDailyRollup.confidence_sum + stmt.excluded.confidence_sum,
+            },
+        )
+    raise NotImplementedError(f"No rollup upsert for the {dialect} dialect")
+
+
+async def update_rollups(db: AsyncSession, detections: list[dict]):
+    """Add today's detections to the daily per-class rollup; the caller commits.
+
+    Counts are aggregated per class first, so a whole batch costs one upsert.
+    Rows are sorted by class so concurrent upserts lock them in the same order.
+    """
+    counts = defaultdict(lambda: [0, 0.0])
+    for item in detections:
+        counts[item["class_name"]][0] += 1
+        counts[item["class_name"]][1] += item["confidence"] or 0.0
+    if not counts:
+        return
+
+    rows = [
+        {"day": func.current_date(), "class_name": class_name, "detections": n, "confidence_sum": total}
+        for class_name, (n, total) in sorted(counts.items())
+    ]
+    await db.execute(_rollup_upsert(db.bind.dialect.name, rows))
+
+
+def rebuild_rollups(conn: Connection):
+    """Recompute every daily rollup from the detection rows; the caller commits."""
+    day = func.date(PredictionDetection.created_at)
+    conn.execute(delete(DetectionDailyRollup))
+    conn.execute(insert(DetectionDailyRollup).from_select(
+        ["day", "class_name", "detections", "confidence_sum"],
+        select(
+            day,
+            PredictionDetection.class_name,
+            func.count(PredictionDetection.id),
+            func.coalesce(func.sum(PredictionDetection.confidence), 0.0),
+        ).group_by(day, PredictionDetection.class_name),
+    ))
+
+
+def backfill_detections(conn: Connection, chunk_size: int = 1000) -> int:
+    """Derive detection rows for predictions stored before the table existed.
+
+    Only runs while the detections table is empty. Old rows only kept the
+    joined class names, so each class gets the prediction's confidence and no bbox.
+    """
+    if conn.execute(select(PredictionDetection.id).limit(1)).first() is not None:
+        return 0
+
+    last_id = 0
+    created = 0
+    while True:
+        rows = conn.execute(
+            select(Prediction.id, Prediction.prediction_text, Prediction.confidence, Prediction.created_at)
+            .where(Prediction.id > last_id)
+            .order_by(Prediction.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        values = [
+            {"prediction_id": row.id, **detection(name.strip(), row.confidence), "created_at": row.created_at}
+            for row in rows
+            for name in (row.prediction_text or "").split(",")
+            if name.strip()
+        ]
+        if values:
+            conn.execute(insert(PredictionDetection), values)
+            created += len(values)
+        last_id = rows[-1].id
+
+    if created:
+        rebuild_rollups(conn)
+    conn.commit()
+    return created
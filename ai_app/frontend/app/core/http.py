@@ -0,0 +1,84 @@
+import logging
+import httpx
+from fastapi import Request
+from fastapi.requests import HTTPConnection
+from app.core.config import settings
+
+# Upstream names used as registry keys
+PREDICTOR = "predictor"
+TRAINING = "training"
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientRegistry:
+    """Long-lived httpx clients, one per upstream service.
+
+    Each client keeps its own keep-alive pool, so repeated calls to the same
+    upstream reuse open (TLS) connections instead of handshaking every time.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def register(self, name: str, *, timeout: float, max_connections: int, max_keepalive: int) -> httpx.AsyncClient:
+        if name in self._clients:
+            raise ValueError(f"HTTP client '{name}' is already registered")
+
+        http2 = settings.HTTP2_ENABLED
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing, falling back to HTTP/1.1")
+                http2 = False
+
+        client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(timeout, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self._clients[name] = client
+        return client
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        try:
+            return self._clients[name]
+        except KeyError:
+            raise RuntimeError(f"HTTP client '{name}' is not registered (is the app lifespan running?)") from None
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+def build_http_clients() -> HTTPClientRegistry:
+    registry = HTTPClientRegistry()
+    registry.register(
+        PREDICTOR,
+        timeout=settings.PREDICTOR_TIMEOUT,
+        max_connections=settings.PREDICTOR_MAX_CONNECTIONS,
+        max_keepalive=settings.PREDICTOR_MAX_KEEPALIVE,
+    )
+    registry.register(
+        TRAINING,
+        timeout=settings.TRAINING_TIMEOUT,
+        max_connections=settings.TRAINING_MAX_CONNECTIONS,
+        max_keepalive=settings.TRAINING_MAX_KEEPALIVE,
+    )
+    return registry
+
+
+# FastAPI dependencies
+def get_predictor_client(request: HTTPConnection) -> httpx.AsyncClient:
+    # HTTPConnection: also injected into WebSocket routes
+    return request.app.state.http_clients.get(PREDICTOR)
+
+
+def get_training_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_clients.get(TRAINING)
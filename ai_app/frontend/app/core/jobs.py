@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import mimetypes
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import httpx
+from sqlalchemy import func, or_, select, true, update
+from sqlalchemy.orm import selectinload
+from app.core.cache import prediction_cache, CachedPrediction
+from app.core.config import settings
+from app.core.detections import detection_models, update_rollups
+from app.core.metrics import PREDICT_JOB_WAIT, PREDICT_JOBS, PREDICT_QUEUE_DEPTH
+from app.core.predictor import request_prediction
+from app.core.shared_state import claim, relay, shared_state
+from app.core.storage import media_url, storage
+from app.core.thumbnails import thumbnail_worker
+from app.core.tracing import current_trace, span, trace
+from app.db.database import AsyncSessionLocal
+from app.db.models import Prediction
+
+# Prediction.status values; rows made by the synchronous endpoint are "completed" straight away
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+FINISHED = {COMPLETED, FAILED}
+# Ids of finished jobs, so long-polls in any worker return as soon as it's done
+CHANNEL = "prediction-jobs"
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """The job queue is at PREDICT_QUEUE_SIZE; the client should retry later."""
+
+
+def job_event(prediction: Prediction) -> dict:
+    event = {
+        "id": prediction.id,
+        "status": prediction.status,
+        "filename": prediction.filename,
+        "image_url": media_url(prediction.image_path) or None,
+        "created_at": prediction.created_at.isoformat() if prediction.created_at else None,
+    }
+    if prediction.status == COMPLETED:
+        event.update(
+            prediction=prediction.prediction_text,
+            confidence=prediction.confidence,
+            detections=[
+                {"class_name": d.class_name, "confidence": d.confidence, "bbox": d.bbox}
+                for d in prediction.detections
+            ],
+        )
+    elif prediction.status == FAILED:
+        event["error"] = prediction.error
+    return event
+
+
+class JobWatcher:
+    """A job's "finished" notifications since `PredictionQueue.watch` started."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """True once notified (consuming the notification), False on timeout."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class PredictionQueue:
+    """Asynchronous predictions: accepted right away, run by a bounded worker pool.
+
+    The Prediction row is the durable job record (queued -> running ->
+    completed/failed); the in-memory queue only carries ids, so jobs left
+    queued or interrupted by a restart are picked up again by _recover. At most
+    PREDICT_QUEUE_WORKERS predictions run at once, and submit() refuses new
+    jobs while PREDICT_QUEUE_SIZE are waiting.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+        self._waiters: dict[int, set[JobWatcher]] = {}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self, client: httpx.AsyncClient):
+        self._client = client
+        self._queue = asyncio.Queue(maxsize=settings.PREDICT_QUEUE_SIZE)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"prediction-worker-{i}")
+            for i in range(settings.PREDICT_QUEUE_WORKERS)
+        ]
+        self._tasks.append(asyncio.create_task(self._recover(), name="prediction-recovery"))
+        self._tasks.append(asyncio.create_task(relay(CHANNEL, self._on_finished), name="prediction-jobs-relay"))
+
+    async def stop(self):
+        # Jobs being processed go back to "queued" (see _worker), so the next start picks them up
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, prediction_id: int):
+        if self._queue is None:
+            raise RuntimeError("Prediction queue is not running (is the app lifespan running?)")
+        try:
+            self._queue.put_nowait(prediction_id)
+        except asyncio.QueueFull:
+            raise QueueFull() from None
+        PREDICT_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def has_room(self) -> bool:
+        return self._queue is not None and not self._queue.full()
+
+    @contextmanager
+    def watch(self, prediction_id: int):
+        """Collect "finished" notifications for a job (from any worker) while the block runs.
+
+        Subscribe before checking the job's status: a notification arriving
+        between the check and the wait is then kept rather than lost.
+        """
+        watcher = JobWatcher()
+        self._waiters.setdefault(prediction_id, set()).add(watcher)
+        try:
+            yield watcher
+        finally:
+            waiters = self._waiters.get(prediction_id)
+            if waiters is not None:
+                waiters.discard(watcher)
+                if not waiters:
+                    del self._waiters[prediction_id]
+
+    async def _notify(self, prediction_id: int):
+        try:
+            await shared_state.publish(CHANNEL, str(prediction_id).encode())
+        except Exception as e:
+            # Waiters still see the result when their long-poll times out
+            logger.warning("could not announce prediction job %s: %s", prediction_id, e)
+
+    def _on_finished(self, message: bytes):
+        for watcher in self._waiters.get(int(message), ()):
+            watcher.notify()
+
+    async def _recover(self):
+        """Re-queue jobs left behind by a restart or by a worker that went away.
+
+        Runs every PREDICT_JOB_STALE_AFTER seconds, and the lease lets only one
+        worker per period do it. The first pass takes every queued job; later
+        ones only those untouched for PREDICT_JOB_STALE_AFTER, since newer ones
+        are still in some worker's queue. A job queued twice is harmless:
+        process() claims it only once.
+        """
+        first = True
+        while True:
+            try:
+                if await claim("prediction-recovery", settings.PREDICT_JOB_STALE_AFTER):
+                    await self._requeue_unfinished(all_queued=first)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("prediction job recovery failed")
+            first = False
+            await asyncio.sleep(settings.PREDICT_JOB_STALE_AFTER)
+
+    async def _requeue_unfinished(self, all_queued: bool):
+        stale = datetime.now() - timedelta(seconds=settings.PREDICT_JOB_STALE_AFTER)
+        untouched = func.coalesce(Prediction.updated_at, Prediction.created_at) < stale
+        async with AsyncSessionLocal() as db:
+            ids = (await db.scalars(
+                select(Prediction.id)
+                .where(or_(
+                    (Prediction.status == QUEUED) & (true() if all_queued else untouched),
+                    (Prediction.status == RUNNING) & (Prediction.updated_at < stale),
+                ))
+                .order_by(Prediction.id)
+            )).all()
+            if ids:
+                await db.execute(update(Prediction).where(Prediction.id.in_(ids)).values(status=QUEUED))
+                await db.commit()
+        if ids:
+            logger.info("re-queued %d unfinished prediction jobs", len(ids))
+        for prediction_id in ids:
+            # Blocks while the queue is full instead of refusing, unlike submit()
+            await self._queue.put(prediction_id)
+            PREDICT_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def _worker(self):
+        while True:
+            prediction_id = await self._queue.get()
+            PREDICT_QUEUE_DEPTH.set(self._queue.qsize())
+            # Each job gets its own trace id, so its log records can be told apart
+            with trace(f"job-{prediction_id}"):
+                try:
+                    await self.process(prediction_id)
+                except asyncio.CancelledError:
+                    # Shutting down: hand the job to the next start instead of leaving it "running"
+                    await self._requeue(prediction_id)
+                    raise
+                except Exception as e:
+                    logger.exception("prediction job %s crashed", prediction_id)
+                    await self._fail(prediction_id, f"Unexpected Error ({type(e).__name__}): {e}")
+                finally:
+                    await self._notify(prediction_id)
+
+    async def _requeue(self, prediction_id: int):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Prediction)
+                    .where(Prediction.id == prediction_id, Prediction.status == RUNNING)
+                    .values(status=QUEUED)
+                )
+                await db.commit()
+        except Exception as e:
+            # Recovered once it counts as stale (PREDICT_JOB_STALE_AFTER)
+            logger.error("could not re-queue prediction job %s: %s", prediction_id, e)
+
+    async def _fail(self, prediction_id: int, error: str):
+        # Otherwise the job would stay "running" until the next restart
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Prediction)
+                    .where(Prediction.id == prediction_id, Prediction.status == RUNNING)
+                    .values(status=FAILED, error=error)
+                )
+                await db.commit()
+            PREDICT_JOBS.labels(FAILED).inc()
+        except Exception as e:
+            logger.error("could not mark prediction job %s as failed: %s", prediction_id, e)
+
+    async def process(self, prediction_id: int):
+        async with AsyncSessionLocal() as db:
+            # Claim the job; another process may have recovered it already
+            claimed = await db.execute(
+                update(Prediction)
+                .where(Prediction.id == prediction_id, Prediction.status == QUEUED)
+                .values(status=RUNNING)
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+            job = await db.get(Prediction, prediction_id, options=[selectinload(Prediction.detections)])
+            if job.created_at is not None:
+                PREDICT_JOB_WAIT.observe(max(0.0, (datetime.now(job.created_at.tzinfo) - job.created_at).total_seconds()))
+
+            generation = await prediction_cache.generation(db)
+            cached = await prediction_cache.lookup(db, job.content_hash, generation) if settings.PREDICTION_CACHE_ENABLED and job.content_hash else None
+            if cached:
+                result, confidence, error, detections = cached.prediction_text, cached.confidence, None, list(cached.detections)
+            elif not job.image_path:
+                result, confidence, error, detections = None, 0, "The uploaded image is no longer stored", []
+            else:
+                content_type = mimetypes.guess_type(job.filename or "")[0]
+                try:
+                    with span("storage_read"):
+                        content = await storage.read(job.image_path)
+                except Exception as e:
+                    result, confidence, error, detections = None, 0, f"Could not read the uploaded image: {e}", []
+                else:
+                    result, confidence, error, detections = await request_prediction(self._client, job.filename, content, content_type)
+
+            if result and not error:
+                job.status = COMPLETED
+                job.model_version = generation
+                job.prediction_text = str(result)
+                job.confidence = float(confidence)
+                job.detections = detection_models(detections)
+                await update_rollups(db, detections)
+            else:
+                job.status = FAILED
+                job.error = error or "The predictor returned no result"
+            with span("db_commit"):
+                await db.commit()
+            PREDICT_JOBS.labels(job.status).inc()
+            current = current_trace()
+            logger.info("prediction job finished", extra={
+                "prediction_id": job.id,
+                "status": job.status,
+                "cached": bool(cached),
+                "duration_ms": current.elapsed_ms() if current else None,
+                "spans": dict(current.spans) if current else {},
+            })
+
+            if job.status == COMPLETED:
+                thumbnail_worker.enqueue([job.id], job.image_path)
+                if not cached and job.content_hash:
+                    await prediction_cache.store(job.content_hash, CachedPrediction(job.prediction_text, job.confidence, job.image_path, tuple(detections)), generation)
+
+
+prediction_queue = PredictionQueue()
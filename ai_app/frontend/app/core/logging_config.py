@@ -1,14 +1,113 @@
+import atexit
+import json
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
+from app.core.config import settings
+from app.core.tracing import current_trace, sample_debug
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: QueueListener | None = None
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the current request/job id and samples DEBUG records.
+
+    Runs in the logging thread of the caller, where the trace context is visible.
+    """
+
+    def filter(self, record):
+        trace = current_trace()
+        record.request_id = trace.id if trace else None
+        if record.levelno <= logging.DEBUG:
+            return trace.sampled if trace else sample_debug()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops them when the queue is full
+    rather than blocking the event loop on a slow stdout."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback here (args may change after the call returns),
+        # but leave JSON encoding and the write to the listener thread
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.message,
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for development (LOG_FORMAT=text)."""
+
+    def format(self, record):
+        extras = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name} [{record.request_id or '-'}] {record.message}"
+        if extras:
+            line += " " + extras
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
 
 def setup_logging():
-    logger = logging.getLogger("ai_app")
-    logger.setLevel(logging.DEBUG)
-    
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    
-    logger.addHandler(handler)
-    return logger
+    """Route the app's loggers (`app.*`) through a queue to a stdout writer thread.
+
+    Safe to call more than once; the listener is flushed at exit or by
+    `shutdown_logging`.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.handlers = [handler]
+    logger.propagate = False
+
+    _listener = QueueListener(handler.queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
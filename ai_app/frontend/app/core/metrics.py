@@ -0,0 +1,161 @@
+import time
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+
+# ASGI scope of the request being served; the router fills in scope["route"],
+# which gives SQL event hooks a low-cardinality route label.
+_current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out")
+DB_POOL_CONNECTS = Counter("db_pool_connects_total", "New DBAPI connections opened")
+DB_POOL_INVALIDATIONS = Counter("db_pool_invalidations_total", "Connections invalidated (e.g. failed pre-ping)")
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["route"])
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency",
+    ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+HTTP_REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+
+UPSTREAM_CIRCUIT_STATE = Gauge("upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["upstream", "endpoint"])
+UPSTREAM_CIRCUIT_TRANSITIONS = Counter("upstream_circuit_transitions_total", "Circuit breaker state changes", ["upstream", "endpoint", "state"])
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Upstream calls by outcome (success, error, rejected)", ["upstream", "outcome"])
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Upstream retries", ["upstream"])
+UPSTREAM_HEDGES = Counter("upstream_hedges_total", "Hedged upstream requests sent", ["upstream"])
+UPSTREAM_BUDGET_EXHAUSTED = Counter("upstream_retry_budget_exhausted_total", "Retries/hedges skipped by the retry budget", ["upstream"])
+
+PREDICTOR_BACKEND_REQUESTS = Counter("predictor_backend_requests_total", "Predictor calls per backend by outcome", ["backend", "outcome"])
+PREDICTOR_BACKEND_LATENCY = Histogram(
+    "predictor_backend_duration_seconds",
+    "Predictor response time per backend",
+    ["backend"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+PREDICTOR_BACKEND_OUTSTANDING = Gauge("predictor_backend_outstanding", "Predictor calls in flight per backend", ["backend"])
+PREDICTOR_BACKEND_HEALTHY = Gauge("predictor_backend_healthy", "1 while a predictor backend passes health checks", ["backend"])
+
+PREDICT_QUEUE_DEPTH = Gauge("predict_queue_depth", "Async prediction jobs waiting for a worker")
+PREDICT_JOBS = Counter("predict_jobs_total", "Async prediction jobs finished", ["status"])
+PREDICT_JOB_WAIT = Histogram(
+    "predict_job_wait_seconds",
+    "Time async prediction jobs spent queued",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+PREDICT_ADMISSION = Counter("predict_admission_total", "Upload admission decisions by this worker (admitted, rate_limited, overloaded, too_large)", ["route", "decision"])
+PREDICT_IN_FLIGHT = Gauge("predict_in_flight", "Upload requests being served by this worker process (PREDICT_MAX_IN_FLIGHT is per worker)")
+
+STREAM_FRAMES = Counter("stream_frames_total", "Stream frames by outcome (sampled_out, busy, duplicate, predicted, failed, stored)", ["outcome"])
+STREAMS_ACTIVE = Gauge("streams_active", "Frame streams (WebSocket or video upload) being served by this worker")
+
+THUMBNAILS = Counter("thumbnails_total", "Thumbnail requests by outcome (generated, failed, dropped while the queue was full)", ["outcome"])
+
+
+
+def route_label(scope: dict | None = None) -> str:
+    scope = scope if scope is not None else _current_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long each checkout waited for a connection."""
+
+    # Log with SQLAlchemy's pool loggers, not under the app's `app.*` namespace
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.TimedQueuePool"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine):
+    """Attach pool and query metrics to a (sync or AsyncEngine.sync_engine) engine."""
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTS.inc()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.inc()
+
+    # One statement runs at a time per connection, so a single start time will do
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        route = route_label()
+        DB_QUERIES.labels(route).inc()
+        DB_QUERY_LATENCY.labels(route).observe(elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("query_start", None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: exposes the scope to the SQL hooks and times each request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_LATENCY.labels(scope["method"], route_label(scope), str(status_code)).observe(
+                time.perf_counter() - start
+            )
+            _current_scope.reset(token)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,133 @@
+import logging
+import mimetypes
+import os
+import secrets
+from collections.abc import AsyncIterator
+from pathlib import Path
+import httpx
+from starlette.concurrency import run_in_threadpool
+from app.core.adapters import loads, response_adapters
+from app.core.balancer import predictor_pool
+from app.core.config import settings
+from app.core.detections import detection
+from app.core.preprocess import preprocess, scale_detections
+from app.core.resilience import CircuitOpenError, predictor_upstream
+from app.core.storage import CHUNK_SIZE
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def parse_prediction_response(response: httpx.Response, endpoint: str | None = None) -> tuple[str | None, float, str | None, list[dict]]:
+    """Extract (prediction, confidence, error, detections) from the predictor's HTTP response.
+
+    The payload is decoded once (orjson when installed) and read by the
+    response adapter bound to the endpoint that answered; see app/core/adapters.py.
+    """
+    if response.status_code != 200:
+        return None, 0, f"Remote API Error (Status {response.status_code}): {response.text[:200]}", []
+
+    try:
+        data = loads(response.content)
+    except ValueError as parse_err:
+        # If not JSON, maybe it's raw text?
+        text_resp = response.text.strip()
+        if text_resp and len(text_resp) < 50:
+            return text_resp, 0, None, [detection(text_resp)]
+        return None, 0, f"Received non-JSON response or Parse Error: {str(parse_err)} | Text: {text_resp[:100]}", []
+
+    parsed = response_adapters.parse(endpoint or settings.EXTERNAL_PREDICTOR_API, data)
+    if parsed is None:
+        return None, 0, f"Connected! But couldn't find a 'prediction' key in the response. Received: {response.text[:200]}", []
+    return parsed
+
+
+async def _read_chunks(path: Path) -> AsyncIterator[bytes]:
+    # Opened and read in the thread pool: a slow disk must not stall the event loop
+    image = await run_in_threadpool(open, path, "rb")
+    try:
+        while chunk := await run_in_threadpool(image.read, CHUNK_SIZE):
+            yield chunk
+    finally:
+        image.close()
+
+
+async def _multipart_upload(path: Path, filename: str | None, content_type: str | None) -> tuple[dict[str, str], AsyncIterator[bytes]]:
+    """Headers and body of a multipart request carrying the file at `path` as "file", streamed from disk."""
+    boundary = secrets.token_hex(16)
+    # Escaped as httpx does for its own multipart bodies
+    quoted = (filename or "upload").replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+        f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    size = (await run_in_threadpool(os.stat, path)).st_size
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        # Known up front, so the body is not sent chunked
+        "Content-Length": str(len(head) + size + len(tail)),
+    }
+
+    async def body():
+        yield head
+        async for chunk in _read_chunks(path):
+            yield chunk
+        yield tail
+
+    return headers, body()
+
+
+async def request_prediction(client: httpx.AsyncClient, filename: str, content: bytes | Path, content_type: str | None):
+    """Send one image to the external predictor; returns (prediction, confidence, error, detections).
+
+    `content` may be bytes or the path of a spooled upload, which is streamed
+    from disk in chunks. The call goes through the predictor's circuit breaker,
+    retries and (with replicas configured) hedging, so every attempt re-opens the file.
+    With PREPROCESS_ENABLED a downscaled copy is sent instead, and the returned
+    boxes are mapped back onto the original image.
+    """
+    with span("preprocess"):
+        prepared = await preprocess(content)
+    if prepared is not None:
+        content, content_type = prepared.content, prepared.content_type
+        filename = f"{os.path.splitext(filename or 'upload')[0]}{mimetypes.guess_extension(content_type) or ''}"
+
+    async def send(url: str) -> httpx.Response:
+        async with predictor_pool.track(url) as call:
+            # We use "file" as the key, which is standard for FastAPI UploadFile parameters
+            if isinstance(content, bytes):
+                response = await client.post(url, files={"file": (filename, content, content_type)})
+            else:
+                headers, body = await _multipart_upload(content, filename, content_type)
+                response = await client.post(url, headers=headers, content=body)
+            call.failed = response.status_code >= 500
+            return response
+
+    try:
+        # Least-loaded healthy backend first; retries and hedges move down the list
+        with span("upstream"):
+            response = await predictor_upstream.call(send, predictor_pool.order(), hedge_delay=settings.PREDICTOR_HEDGE_DELAY)
+        prediction_result, confidence, error_message, detections = parse_prediction_response(response, str(response.request.url))
+        if prepared is not None:
+            detections = scale_detections(detections, prepared)
+        return prediction_result, confidence, error_message, detections
+    except CircuitOpenError as e:
+        error_message = f"Predictor Unavailable: too many recent failures, not retrying for {e.retry_after:.0f}s. Is the AI backend healthy?"
+    except httpx.ReadError:
+        error_message = f"Read Error: The connection to {settings.EXTERNAL_PREDICTOR_API} was reset while waiting for a response. This usually happens if the AI server crashes or the image is too large for the current timeout."
+    except httpx.RemoteProtocolError:
+        error_message = f"API Error: The server at {settings.EXTERNAL_PREDICTOR_API} disconnected without sending a response. Is the AI backend healthy?"
+    except httpx.ConnectError:
+        error_message = f"Connection Failed: Unable to reach {settings.EXTERNAL_PREDICTOR_API}. Is ngrok running?"
+    except httpx.TimeoutException:
+        error_message = f"Connection Timed Out: The AI server took too long to respond ({settings.PREDICTOR_TIMEOUT:g}s limit)."
+    except OSError as e:
+        # The spooled upload went missing or could not be read
+        logger.warning("could not read the upload for the predictor: %s", e)
+        error_message = f"Upload Error: the uploaded image could not be read ({e.strerror or e})."
+    except Exception as e:
+        logger.exception("predictor call failed")
+        error_message = f"Unexpected Error ({type(e).__name__}): {str(e)}"
+    return None, 0, error_message, []
@@ -0,0 +1,132 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from app.core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional: without Pillow uploads go to the predictor unchanged
+    Image = None
+
+EXIF_ORIENTATION = 0x0112
+# Orientations that rotate by 90/270 degrees, swapping width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+logger = logging.getLogger(__name__)
+
+# Decoding and resizing are CPU-bound and hold the GIL, so they run in worker
+# processes instead of threads. Created on first use.
+_executor = None
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """What to send to the predictor instead of the upload.
+
+    `content` is None when the upload is already small and upright enough to
+    send as is. `scale_x`/`scale_y` map predictor coordinates back onto the
+    upright original (EXIF orientation applied, as browsers display it).
+    """
+    content: bytes | None
+    content_type: str | None
+    scale_x: float = 1.0
+    scale_y: float = 1.0
+    original_size: tuple[int, int] = (0, 0)
+    size: tuple[int, int] = (0, 0)
+
+
+def prepare_image(source: bytes | str, max_side: int, image_format: str, quality: int) -> PreparedImage:
+    """Fix EXIF orientation, downscale to `max_side` and re-encode (blocking)."""
+    image_format = image_format.upper()
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        width, height = image.size
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        if orientation == 1 and max(width, height) <= max_side and image.format == image_format:
+            return PreparedImage(None, None, original_size=(width, height), size=(width, height))
+
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full size
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format=image_format, quality=quality)
+
+    new_width, new_height = image.size
+    return PreparedImage(
+        out.getvalue(),
+        CONTENT_TYPES[image_format],
+        scale_x=width / new_width,
+        scale_y=height / new_height,
+        original_size=(width, height),
+        size=(new_width, new_height),
+    )
+
+
+def scale_detections(detections: list[dict], prepared: PreparedImage) -> list[dict]:
+    """Map bounding boxes from the prepared image back onto the original."""
+    if prepared.scale_x == 1.0 and prepared.scale_y == 1.0:
+        return detections
+    scaled = []
+    for item in detections:
+        bbox = item.get("bbox")
+        if bbox and len(bbox) == 4:
+            x1, y1, x2, y2 = bbox
+            bbox = [
+                round(x1 * prepared.scale_x, 2), round(y1 * prepared.scale_y, 2),
+                round(x2 * prepared.scale_x, 2), round(y2 * prepared.scale_y, 2),
+            ]
+        scaled.append({**item, "bbox": bbox})
+    return scaled
+
+
+def preprocess_available() -> bool:
+    return settings.PREPROCESS_ENABLED and Image is not None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the app has threads (DB pool, thread pools) that fork would copy mid-state
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PREPROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def preprocess(content: bytes | Path) -> PreparedImage | None:
+    """Prepared version of an upload, or None to send it unchanged (disabled, or not a readable image)."""
+    if not preprocess_available():
+        return None
+    # Paths go to the worker as strings so a large upload isn't pickled across
+    source = content if isinstance(content, bytes) else str(content)
+    loop = asyncio.get_running_loop()
+    try:
+        prepared = await loop.run_in_executor(
+            _get_executor(),
+            prepare_image,
+            source,
+            settings.PREPROCESS_MAX_SIDE,
+            settings.PREPROCESS_FORMAT,
+            settings.PREPROCESS_QUALITY,
+        )
+    except Exception as e:
+        logger.warning("pre-processing failed, sending the original image: %s: %s", type(e).__name__, e)
+        return None
+    return prepared if prepared.content is not None else None
+
+
+def shutdown_preprocess_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import httpx
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.resilience import training_upstream
+from app.core.shared_state import shared_state
+from app.db.database import AsyncSessionLocal
+from app.db.models import TrainingJob
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_config(raw: dict) -> dict:
+    """Canonical training config values, with the same defaults the UI uses."""
+    return {
+        "epochs": int(raw.get("epochs", 50)),
+        "batch_size": int(raw.get("batch_size", 32)),
+        "learning_rate": str(raw.get("learning_rate", "0.0001")),
+        "model_name": str(raw.get("model_name", "yolo12")).lower(),
+        "classes": int(raw.get("classes", 1)),
+        "augmentation": bool(raw.get("augmentation", True)),
+    }
+
+
+def config_fingerprint(values: dict) -> str:
+    return hashlib.sha256(json.dumps(normalize_config(values), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RemoteConfigCache:
+    """Stale-while-revalidate view of TRAIN_CONFIG_URL.
+
+    Page views never wait on the remote service: they render the last known
+    config from the DB and, once it is older than TRAIN_CONFIG_TTL, trigger a
+    single background refresh. A new TrainingJob row is only written when the
+    remote config's fingerprint differs from the latest stored one. With
+    several workers, a shared lease lets only one of them refresh per TTL.
+    """
+
+    LEASE_KEY = "train-config:fresh"
+
+    def __init__(self):
+        self.fingerprint: str | None = None
+        self.fetched_at: float | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.changes = 0
+
+    @property
+    def is_stale(self) -> bool:
+        return self.fetched_at is None or time.monotonic() - self.fetched_at > settings.TRAIN_CONFIG_TTL
+
+    def revalidate(self, client: httpx.AsyncClient, force: bool = False):
+        """Start a background refresh if the cached config is stale (and none is running)."""
+        if not (force or self.is_stale):
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh(client, force), name="train-config-refresh")
+
+    async def remember(self, fingerprint: str):
+        """Record a config we just pushed to the remote ourselves."""
+        self.fingerprint = fingerprint
+        self.fetched_at = time.monotonic()
+        await shared_state.set(self.LEASE_KEY, b"1", settings.TRAIN_CONFIG_TTL)
+
+    async def _refresh(self, client: httpx.AsyncClient, force: bool = False):
+        try:
+            if force:
+                await shared_state.set(self.LEASE_KEY, b"1", settings.TRAIN_CONFIG_TTL)
+            elif not await shared_state.set_if_absent(self.LEASE_KEY, b"1", settings.TRAIN_CONFIG_TTL):
+                # Another worker refreshed within the TTL
+                self.fetched_at = time.monotonic()
+                return
+            response = await training_upstream.call(client.get, [settings.TRAIN_CONFIG_URL])
+            if response.status_code != 200:
+                logger.warning("could not fetch remote training config", extra={"status": response.status_code})
+                await self._release()
+                return
+            remote_config = response.json()
+            if not (isinstance(remote_config, dict) and "epochs" in remote_config):
+                return
+
+            self.refreshes += 1
+            self.fetched_at = time.monotonic()
+            values = normalize_config(remote_config)
+            fingerprint = config_fingerprint(values)
+            if fingerprint == self.fingerprint:
+                return
+
+            async with AsyncSessionLocal() as db:
+                latest = await db.scalar(select(TrainingJob.config_fingerprint).order_by(TrainingJob.id.desc()).limit(1))
+                if latest != fingerprint:
+                    db.add(TrainingJob(**values, status="synced", config_fingerprint=fingerprint))
+                    await db.commit()
+                    self.changes += 1
+            self.fingerprint = fingerprint
+        except Exception as e:
+            logger.warning("could not fetch remote training config: %s: %s", type(e).__name__, e)
+            await self._release()
+
+    async def _release(self):
+        # The refresh failed: let the next page view (in any worker) try again
+        try:
+            await shared_state.delete(self.LEASE_KEY)
+        except Exception:
+            pass
+
+
+remote_config_cache = RemoteConfigCache()
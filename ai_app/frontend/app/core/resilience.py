@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+import httpx
+from app.core.config import settings
+from app.core.metrics import (
+    UPSTREAM_BUDGET_EXHAUSTED,
+    UPSTREAM_CIRCUIT_STATE,
+    UPSTREAM_CIRCUIT_TRANSITIONS,
+    UPSTREAM_HEDGES,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_RETRIES,
+)
+
+# Failures where the request most likely never reached (or was never processed by) the upstream
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError)
+RETRYABLE_STATUS = {502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"{upstream} is unavailable (circuit open, next probe in {retry_after:.0f}s)")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing.
+
+    closed -> open after BREAKER_FAILURE_THRESHOLD failures in a row; calls are
+    rejected immediately for BREAKER_RECOVERY_TIMEOUT, then up to
+    BREAKER_HALF_OPEN_PROBES calls go through. A successful probe closes the
+    circuit, a failed one opens it again. Only touched from the event loop.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, upstream: str, endpoint: str):
+        self.upstream = upstream
+        self.endpoint = endpoint
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        UPSTREAM_CIRCUIT_STATE.labels(upstream, endpoint).set(0)
+
+    def _transition(self, state: str):
+        self.state = state
+        UPSTREAM_CIRCUIT_STATE.labels(self.upstream, self.endpoint).set(self._STATE_VALUES[state])
+        UPSTREAM_CIRCUIT_TRANSITIONS.labels(self.upstream, self.endpoint, state).inc()
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning("circuit open", extra={"upstream": self.upstream, "endpoint": self.endpoint, "failures": self.failures})
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + settings.BREAKER_RECOVERY_TIMEOUT - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims a probe slot when half-open)."""
+        if not settings.BREAKER_ENABLED:
+            return True
+        if self.state == self.OPEN:
+            if self.retry_after > 0:
+                return False
+            self.probes = 0
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self.probes >= settings.BREAKER_HALF_OPEN_PROBES:
+                return False
+            self.probes += 1
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        if not settings.BREAKER_ENABLED:
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= settings.BREAKER_FAILURE_THRESHOLD
+        ):
+            self._transition(self.OPEN)
+
+    def release(self):
+        """A call ended without an answer from the upstream (cancelled, or failed locally)."""
+        if self.state == self.HALF_OPEN and self.probes:
+            self.probes -= 1
+
+
+class RetryBudget:
+    """Caps retries and hedges to a fraction of the request rate.
+
+    Every request deposits RETRY_BUDGET_RATIO tokens, and a trickle of
+    RETRY_BUDGET_MIN_PER_SECOND keeps low-traffic retries possible. Each
+    retry/hedge spends one token. When an upstream is failing hard, retries
+    can't multiply the load it sees.
+    """
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.updated_at = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, settings.RETRY_BUDGET_RATIO * 100, settings.RETRY_BUDGET_MIN_PER_SECOND * 10)
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        amount += (now - self.updated_at) * settings.RETRY_BUDGET_MIN_PER_SECOND
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def deposit(self):
+        self._refill(settings.RETRY_BUDGET_RATIO)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def backoff_delay(retry: int) -> float:
+    """Full-jitter exponential backoff for the n-th retry (1-based)."""
+    return random.uniform(0, min(settings.UPSTREAM_RETRY_MAX_DELAY, settings.UPSTREAM_RETRY_BASE_DELAY * 2 ** (retry - 1)))
+
+
+class ResilientUpstream:
+    """Circuit breaking, budgeted retries and hedging around calls to one upstream service.
+
+    Callers pass `send(url) -> httpx.Response` and the endpoints that can
+    serve it. Breakers are kept per endpoint, or one for the whole service when
+    `per_endpoint` is off (e.g. the training API, reached through several URLs
+    of the same host).
+    """
+
+    def __init__(self, name: str, per_endpoint: bool = True):
+        self.name = name
+        self.per_endpoint = per_endpoint
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.budget = RetryBudget()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        key = endpoint if self.per_endpoint else self.name
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(self.name, key)
+        return self.breakers[key]
+
+    def _claim(self, endpoints: list[str]) -> str | None:
+        """First endpoint whose breaker lets a call through."""
+        for endpoint in endpoints:
+            if self.breaker(endpoint).allow():
+                return endpoint
+        return None
+
+    async def _send(self, send: Callable[[str], Awaitable[httpx.Response]], endpoint: str) -> httpx.Response:
+        breaker = self.breaker(endpoint)
+        try:
+            response = await send(endpoint)
+        except httpx.HTTPError:
+            breaker.record_failure()
+            UPSTREAM_REQUESTS.labels(self.name, "error").inc()
+            raise
+        except BaseException:
+            # Cancelled (a hedge that lost) or failed on our side, e.g. the upload couldn't be
+            # read: says nothing about the upstream, but a half-open probe slot must be given back
+            breaker.release()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+            UPSTREAM_REQUESTS.labels(self.name, "error").inc()
+        else:
+            breaker.record_success()
+            UPSTREAM_REQUESTS.labels(self.name, "success").inc()
+        return response
+
+    async def _attempt(self, send, endpoints: list[str], hedge_delay: float) -> httpx.Response:
+        first = self._claim(endpoints)
+        if first is None:
+            UPSTREAM_REQUESTS.labels(self.name, "rejected").inc()
+            raise CircuitOpenError(self.name, min(self.breaker(e).retry_after for e in endpoints))
+        if hedge_delay <= 0 or len(endpoints) < 2:
+            return await self._send(send, first)
+
+        primary = asyncio.create_task(self._send(send, first))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+        # Slow primary: race a second replica, if the breaker and the budget allow it
+        if not self.budget.try_spend():
+            UPSTREAM_BUDGET_EXHAUSTED.labels(self.name).inc()
+            return await primary
+        second = self._claim([e for e in endpoints if e != first])
+        if second is None:
+            return await primary
+        UPSTREAM_HEDGES.labels(self.name).inc()
+
+        pending = {primary, asyncio.create_task(self._send(send, second))}
+        fallback = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                        return task.result()
+                    fallback = task
+            return fallback.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def call(
+        self,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        endpoints: list[str],
+        *,
+        retry: bool = True,
+        hedge_delay: float = 0.0,
+    ) -> httpx.Response:
+        """Run `send` against `endpoints` (in preference order).
+
+        Retries go to the next endpoint after a jittered backoff and only for
+        connection-level failures or 502/503/504, so `retry` must stay off for
+        non-idempotent calls. Raises CircuitOpenError when every breaker is open.
+        """
+        self.budget.deposit()
+        attempts = 1 + (settings.UPSTREAM_MAX_RETRIES if retry else 0)
+        response = None
+        error = None
+        for attempt in range(attempts):
+            if attempt:
+                if not self.budget.try_spend():
+                    UPSTREAM_BUDGET_EXHAUSTED.labels(self.name).inc()
+                    break
+                UPSTREAM_RETRIES.labels(self.name).inc()
+                await asyncio.sleep(backoff_delay(attempt))
+            shift = attempt % len(endpoints)
+            try:
+                response = await self._attempt(send, endpoints[shift:] + endpoints[:shift], hedge_delay)
+            except CircuitOpenError as e:
+                # Nothing to retry against until a breaker goes half-open
+                if response is not None:
+                    return response
+                raise e from error
+            except RETRYABLE_ERRORS as e:
+                error = e
+                response = None
+                continue
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+        if response is not None:
+            return response
+        raise error
+
+
+predictor_upstream = ResilientUpstream("predictor")
+training_upstream = ResilientUpstream("training", per_endpoint=False)
+
+
+def predictor_endpoints() -> list[str]:
+    return [settings.EXTERNAL_PREDICTOR_API, *settings.PREDICTOR_REPLICAS]
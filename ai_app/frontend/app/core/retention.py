@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import mimetypes
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.shared_state import claim
+from app.core.storage import LEGACY_PREFIX, discard_stale_uploads, is_legacy_key, legacy_local_path, object_key, storage
+from app.core.thumbnails import thumbnail_key, thumbnail_worker
+from app.db.database import AsyncSessionLocal
+from app.db.models import Prediction
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RetentionJob:
+    """Periodic storage maintenance, run every RETENTION_INTERVAL.
+
+    1. Compaction: images still stored flat under the old static path are moved
+       into the (sharded, content-addressed) storage backend and
+       `Prediction.image_path`/`thumbnail_path` are rewritten to the new keys.
+    2. Expiry: predictions older than RETENTION_DAYS lose their image references.
+    3. Sweep: stored objects no row references any more (expired, or uploads
+       whose prediction failed) are deleted once older than RETENTION_ORPHAN_GRACE,
+       and so are spooled uploads a crashed or killed request left behind.
+
+    Every step works in RETENTION_BATCH_SIZE chunks and is safe to re-run.
+    With several workers, one of them sweeps per RETENTION_INTERVAL (a shared lease).
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.last_run: dict | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="retention-job")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await claim("retention", settings.RETENTION_INTERVAL):
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("retention job failed")
+            await asyncio.sleep(settings.RETENTION_INTERVAL)
+
+    async def run_once(self) -> dict:
+        started = time.monotonic()
+        stats = {
+            "migrated": await self.compact_legacy(),
+            "expired": await self.expire_references(),
+            "deleted": await self.sweep_unreferenced(),
+            "stale_uploads": await discard_stale_uploads(time.time() - settings.RETENTION_ORPHAN_GRACE),
+        }
+        stats["seconds"] = round(time.monotonic() - started, 3)
+        self.last_run = stats
+        if stats["migrated"] or stats["expired"] or stats["deleted"] or stats["stale_uploads"]:
+            logger.info("retention sweep", extra=stats)
+        return stats
+
+    async def compact_legacy(self) -> int:
+        migrated = 0
+        legacy = f"{LEGACY_PREFIX}%"
+        while True:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(Prediction.image_path, func.max(Prediction.thumbnail_path).label("thumbnail_path"))
+                    .where(Prediction.image_path.like(legacy))
+                    .group_by(Prediction.image_path)
+                    .limit(settings.RETENTION_BATCH_SIZE)
+                )).all()
+                if not rows:
+                    return migrated
+
+                moved = []
+                needs_thumbnail = []
+                for row in rows:
+                    new_key = await self._migrate_file(row.image_path)
+                    values = {"image_path": new_key, "thumbnail_path": None}
+                    if new_key and row.thumbnail_path and is_legacy_key(row.thumbnail_path):
+                        # The old thumbnail is still valid; give it the new-style key
+                        thumb_path = legacy_local_path(row.thumbnail_path)
+                        if await run_in_threadpool(os.path.exists, thumb_path):
+                            values["thumbnail_path"] = thumbnail_key(new_key)
+                            await storage.put_file(thumb_path, values["thumbnail_path"], keep_source=True)
+                            moved.append(row.thumbnail_path)
+                    if new_key and values["thumbnail_path"] is None:
+                        needs_thumbnail.append(new_key)
+                    await db.execute(
+                        update(Prediction).where(Prediction.image_path == row.image_path).values(**values)
+                    )
+                    moved.append(row.image_path)
+                    migrated += 1
+                await db.commit()
+
+                if needs_thumbnail:
+                    by_image: dict[str, list[int]] = {}
+                    for row in (await db.execute(
+                        select(Prediction.id, Prediction.image_path).where(Prediction.image_path.in_(needs_thumbnail))
+                    )).all():
+                        by_image.setdefault(row.image_path, []).append(row.id)
+                    for image_path, ids in by_image.items():
+                        thumbnail_worker.enqueue(ids, image_path)
+
+            # Old copies go only once the rows point at the new keys
+            for key in moved:
+                await storage.delete(key)
+
+    async def _migrate_file(self, legacy_key: str) -> str | None:
+        path = legacy_local_path(legacy_key)
+        if not await run_in_threadpool(os.path.exists, path):
+            return None
+        content_hash = await run_in_threadpool(_hash_file, path)
+        key = object_key(content_hash, path)
+        await storage.put_file(path, key, mimetypes.guess_type(path)[0], keep_source=True)
+        return key
+
+    async def expire_references(self) -> int:
+        if settings.RETENTION_DAYS <= 0:
+            return 0
+        # created_at comes from the DB server clock, assumed to share the app's timezone
+        cutoff = datetime.now() - timedelta(days=settings.RETENTION_DAYS)
+        expired = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                ids = (await db.scalars(
+                    select(Prediction.id)
+                    .where(Prediction.created_at < cutoff, Prediction.image_path.isnot(None))
+                    .limit(settings.RETENTION_BATCH_SIZE)
+                )).all()
+                if not ids:
+                    return expired
+                await db.execute(
+                    update(Prediction).where(Prediction.id.in_(ids)).values(image_path=None, thumbnail_path=None)
+                )
+                await db.commit()
+                expired += len(ids)
+
+    async def sweep_unreferenced(self) -> int:
+        cutoff = time.time() - settings.RETENTION_ORPHAN_GRACE
+        deleted = 0
+        # One page of keys at a time: a store with millions of images is never listed in full
+        async for chunk in storage.iter_older_than(cutoff, settings.RETENTION_BATCH_SIZE):
+            async with AsyncSessionLocal() as db:
+                referenced = set((await db.scalars(
+                    select(Prediction.image_path).where(Prediction.image_path.in_(chunk))
+                )).all())
+                referenced.update((await db.scalars(
+                    select(Prediction.thumbnail_path).where(Prediction.thumbnail_path.in_(chunk))
+                )).all())
+            for key in chunk:
+                # Re-checks the age: a fresh upload of the same image may have just touched it
+                if key not in referenced and await storage.delete(key, older_than=cutoff):
+                    deleted += 1
+        return deleted
+
+
+retention_job = RetentionJob()
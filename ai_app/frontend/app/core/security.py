@@ -1,4 +1,22 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+from app.core.config import settings
+
+# bcrypt releases the GIL while hashing, so a bounded thread pool runs hashes in
+# parallel without stalling the event loop (no need for a process pool).
+_hash_executor = None
+
+def _get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_executor
 
 def verify_password(plain_password, hashed_password):
     # Ensure bytes
@@ -9,13 +27,79 @@ def verify_password(plain_password, hashed_password):
     
     return bcrypt.checkpw(plain_password, hashed_password)
 
-def get_password_hash(password):
+def get_password_hash(password, rounds=None):
     if isinstance(password, str):
         password = password.encode('utf-8')
     
     # Generate salt and hash
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password, salt)
     
     # Return as string for database storage
     return hashed.decode('utf-8')
+
+def get_hash_rounds(hashed_password):
+    # Hashes look like "$2b$12$<salt+digest>"; the cost is the third field
+    if isinstance(hashed_password, bytes):
+        hashed_password = hashed_password.decode('utf-8')
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def needs_rehash(hashed_password):
+    return get_hash_rounds(hashed_password) != settings.BCRYPT_ROUNDS
+
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
+# Session tokens are HS256/384/512 JWTs signed with SECRET_KEY. They are built
+# with hmac directly: verifying one is a single HMAC, no DB or extra dependency.
+JWT_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _sign(signing_input: bytes) -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), signing_input, JWT_ALGORITHMS[settings.ALGORITHM]).digest()
+
+def create_access_token(subject, expires_minutes=None):
+    now = int(time.time())
+    claims = {"sub": str(subject), "iat": now, "exp": now + 60 * (expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)}
+    header = {"alg": settings.ALGORITHM, "typ": "JWT"}
+    signing_input = b".".join(
+        _b64encode(json.dumps(part, separators=(",", ":")).encode("utf-8")) for part in (header, claims)
+    )
+    return (signing_input + b"." + _b64encode(_sign(signing_input))).decode("ascii")
+
+def decode_access_token(token):
+    """Claims of a valid, unexpired token; None for anything else."""
+    try:
+        signing_input, _, signature = token.encode("ascii").rpartition(b".")
+        header_part, _, claims_part = signing_input.partition(b".")
+        # Only accept the configured algorithm, whatever the header claims
+        if json.loads(_b64decode(header_part)).get("alg") != settings.ALGORITHM:
+            return None
+        if not hmac.compare_digest(_sign(signing_input), _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(claims_part))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int) or claims["exp"] <= time.time():
+        return None
+    return claims
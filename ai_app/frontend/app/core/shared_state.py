@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lease holder identity, e.g. "web-1:4121"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}".encode()
+
+
+class SharedState:
+    """State every worker process sees the same: values with TTLs, counters, leases and pub/sub.
+
+    With one worker the in-memory backend is enough; with several
+    (`python manage.py serve --workers N`) use SHARED_STATE_BACKEND=redis so
+    caches, job notifications and the training tracker are shared.
+    """
+
+    name = ""
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        """Atomic SET NX: True if this call created the key (a lease or lock)."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_prefix(self, prefix: str) -> int:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """Add to a counter; `ttl` starts when the counter is created."""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: bytes):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str):
+        """Async context manager yielding an async iterator of messages published from now on."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryState(SharedState):
+    """Single-process default: an LRU dict with expiry, and in-process pub/sub."""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float | None, object]] = OrderedDict()
+        self._channels: dict[str, set[asyncio.Queue]] = {}
+
+    def _get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value, ttl: float | None):
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._set(key, value, ttl)
+
+    async def set_if_absent(self, key, value, ttl):
+        if self._get(key) is not None:
+            return False
+        self._set(key, value, ttl)
+        return True
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def delete_prefix(self, prefix):
+        keys = [key for key in self._data if key.startswith(prefix)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    async def incr(self, key, amount=1, ttl=None):
+        current = self._get(key)
+        if current is None:
+            self._set(key, amount, ttl)
+            return amount
+        expires_at, _ = self._data[key]
+        self._data[key] = (expires_at, current + amount)
+        return current + amount
+
+    async def publish(self, channel, message):
+        for queue in list(self._channels.get(channel, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: drop, like a Redis subscriber that fell behind
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=1000)
+        self._channels.setdefault(channel, set()).add(queue)
+
+        async def messages():
+            while True:
+                yield await queue.get()
+
+        try:
+            yield messages()
+        finally:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._channels[channel]
+
+
+class RedisState(SharedState):
+    """Redis (or anything speaking its protocol) through redis.asyncio.
+
+    redis is only needed when SHARED_STATE_BACKEND=redis. Keys and channels are
+    namespaced with SHARED_STATE_PREFIX so several apps can share one server.
+    `client` may be any redis.asyncio-compatible client, e.g. fakeredis in benchmarks.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "", client=None):
+        if client is None:
+            from redis import asyncio as aioredis
+            client = aioredis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key, value, ttl=None):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def set_if_absent(self, key, value, ttl):
+        return bool(await self.client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000)))
+
+    async def delete(self, key):
+        await self.client.delete(self.prefix + key)
+
+    async def delete_prefix(self, prefix):
+        # SCAN rather than KEYS so a large keyspace doesn't block the server
+        pattern = self.prefix + prefix.replace("[", "\\[").replace("*", "\\*").replace("?", "\\?") + "*"
+        deleted, batch = 0, []
+        async for key in self.client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self.client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await self.client.unlink(*batch)
+        return deleted
+
+    async def incr(self, key, amount=1, ttl=None):
+        value = await self.client.incrby(self.prefix + key, amount)
+        if ttl and value == amount:
+            await self.client.pexpire(self.prefix + key, int(ttl * 1000))
+        return value
+
+    async def publish(self, channel, message):
+        await self.client.publish(self.prefix + channel, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.prefix + channel)
+
+        async def messages():
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+
+        try:
+            yield messages()
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def relay(channel: str, handler):
+    """Call `handler(message)` for every message on `channel`, resubscribing after errors.
+
+    Run as a background task; cancel it to stop.
+    """
+    delay = 0.5
+    while True:
+        try:
+            async with shared_state.subscribe(channel) as messages:
+                delay = 0.5
+                async for message in messages:
+                    handler(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("subscription to %s lost (%s: %s), retrying in %.1fs", channel, type(e).__name__, e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+async def claim(key: str, ttl: float) -> bool:
+    """Lease for a job only one worker should run per `ttl` seconds (sweeps, backfills, recovery).
+
+    Not released when the run ends: workers trying again within `ttl` skip it.
+    If shared state is unreachable the run goes ahead; these jobs are safe to repeat.
+    """
+    try:
+        return await shared_state.set_if_absent(f"lease:{key}", WORKER_ID, ttl)
+    except Exception as e:
+        logger.warning("could not take lease %s (%s: %s), running anyway", key, type(e).__name__, e)
+        return True
+
+
+def build_shared_state() -> SharedState:
+    if settings.SHARED_STATE_BACKEND == "redis":
+        return RedisState(settings.SHARED_STATE_URL, settings.SHARED_STATE_PREFIX)
+    return MemoryState(settings.SHARED_STATE_MEMORY_SIZE)
+
+
+shared_state = build_shared_state()
@@ -0,0 +1,40 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from starlette.datastructures import QueryParams
+from starlette.staticfiles import StaticFiles
+from app.core.config import settings
+
+STATIC_DIR = os.path.join("app", "static")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Uploads and thumbnails are named after the SHA-256 of their content
+_CONTENT_HASHED = re.compile(r"(^|/)[0-9a-f]{64}[^/]*$")
+
+
+@lru_cache(maxsize=None)
+def asset_version(path: str) -> str:
+    """Short content hash of a static asset, for cache-busting `?v=` URLs.
+
+    Computed once per process; a deploy restarts the app and changes the URL.
+    """
+    with open(os.path.join(STATIC_DIR, path.lstrip("/")), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with Cache-Control on top of the default ETag/Last-Modified.
+
+    Content-hashed files (uploads, thumbnails) and `?v=`-versioned assets never
+    change under the same URL, so browsers may keep them forever. Anything else
+    is cached briefly and then revalidated with the ETag.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _CONTENT_HASHED.search(scope["path"]) or QueryParams(scope.get("query_string", b"")).get("v"):
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={settings.STATIC_MAX_AGE}, must-revalidate"
+        return response
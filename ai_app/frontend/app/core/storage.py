@@ -0,0 +1,475 @@
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.path.join("app", "static", "uploads", "predictions")
+# Prefix for web access (relative to the static mount)
+WEB_PREFIX = "static/uploads/predictions"
+# Before sharding, image paths were stored as flat web paths under WEB_PREFIX
+LEGACY_PREFIX = f"{WEB_PREFIX}/"
+# Spooled uploads live next to the shards so the final rename stays on one filesystem
+INCOMING_DIR = os.path.join(UPLOAD_DIR, ".incoming")
+CHUNK_SIZE = 256 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass
+class SpooledUpload:
+    filename: str
+    content_type: str | None
+    path: str
+    content_hash: str
+    size: int
+
+
+def object_key(content_hash: str, filename: str | None) -> str:
+    """`ab/cd/abcd...ef.jpg`: content-addressed, sharded by hash prefix.
+
+    Identical uploads share one object, and no directory holds more than a
+    small slice of the files.
+    """
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{os.path.splitext(filename or '')[1].lower()}"
+
+
+def is_legacy_key(key: str) -> bool:
+    return key.startswith(LEGACY_PREFIX)
+
+
+def legacy_local_path(key: str) -> str:
+    return os.path.join(UPLOAD_DIR, key[len(LEGACY_PREFIX):])
+
+
+class StorageBackend:
+    """Where uploaded images live. Keys are what `Prediction.image_path` stores.
+
+    Writes are idempotent: storing a key that already exists only refreshes
+    its modification time, which the retention sweep uses as "last written".
+    """
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    async def put_file(self, path: str, key: str, content_type: str | None = None, keep_source: bool = False):
+        """Store a local file under `key`; the file is consumed unless `keep_source`."""
+        raise NotImplementedError
+
+    async def put_bytes(self, content: bytes, key: str, content_type: str | None = None):
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def delete(self, key: str, older_than: float | None = None) -> bool:
+        """Remove `key`; with `older_than`, only if it was last written before then."""
+        raise NotImplementedError
+
+    def iter_older_than(self, cutoff: float, batch_size: int) -> AsyncIterator[list[str]]:
+        """Keys last written before `cutoff` (a Unix timestamp), in batches of up to `batch_size`.
+
+        Listed lazily, so a large store is never held in memory at once.
+        """
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Sharded directory tree under the static mount, served by CachedStaticFiles."""
+
+    def __init__(self, root: str = UPLOAD_DIR, web_prefix: str = WEB_PREFIX):
+        self.root = root
+        self.web_prefix = web_prefix
+
+    def path(self, key: str) -> str:
+        if is_legacy_key(key):
+            return legacy_local_path(key)
+        return os.path.join(self.root, *key.split("/"))
+
+    def url(self, key: str) -> str:
+        return f"/{key}" if is_legacy_key(key) else f"/{self.web_prefix}/{key}"
+
+    def _write(self, target: str, write):
+        """Write through a temp file of its own, then rename into place.
+
+        Identical uploads map to one key, so concurrent writes of the same
+        image are normal; whichever rename lands last leaves the same bytes.
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                write(out)
+            os.replace(tmp_path, target)
+        except BaseException:
+            _discard(tmp_path)
+            # Another writer got there first
+            if not os.path.exists(target):
+                raise
+
+    def _put_file(self, source: str, key: str, keep_source: bool):
+        target = self.path(key)
+        if os.path.exists(target):
+            os.utime(target)
+            if not keep_source:
+                os.remove(source)
+            return
+        if keep_source:
+            def copy(out):
+                with open(source, "rb") as f:
+                    shutil.copyfileobj(f, out)
+            self._write(target, copy)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # The spooled source is unique to this upload, so it can be renamed straight into place
+            os.replace(source, target)
+
+    async def put_file(self, path: str, key: str, content_type: str | None = None, keep_source: bool = False):
+        await run_in_threadpool(self._put_file, path, key, keep_source)
+
+    def _put_bytes(self, content: bytes, key: str):
+        target = self.path(key)
+        if os.path.exists(target):
+            os.utime(target)
+            return
+        self._write(target, lambda out: out.write(content))
+
+    async def put_bytes(self, content: bytes, key: str, content_type: str | None = None):
+        await run_in_threadpool(self._put_bytes, content, key)
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self.path(key))
+
+    def _read(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    async def read(self, key: str) -> bytes:
+        return await run_in_threadpool(self._read, key)
+
+    def _delete(self, key: str, older_than: float | None) -> bool:
+        path = self.path(key)
+        try:
+            if older_than is not None and os.stat(path).st_mtime >= older_than:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        if not is_legacy_key(key):
+            # Drop the shard directories once they are empty
+            for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+        return True
+
+    async def delete(self, key: str, older_than: float | None = None) -> bool:
+        return await run_in_threadpool(self._delete, key, older_than)
+
+    def _keys_older_than(self, cutoff: float) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    # Flat files from before sharding
+                    if not entry.name.endswith(".part") and entry.stat().st_mtime < cutoff:
+                        yield f"{LEGACY_PREFIX}{entry.name}"
+                elif entry.is_dir() and len(entry.name) == 2:
+                    with os.scandir(entry.path) as subs:
+                        for sub in subs:
+                            if not (sub.is_dir() and len(sub.name) == 2):
+                                continue
+                            with os.scandir(sub.path) as items:
+                                # Listed up front: the sweep may delete from (and remove) this directory meanwhile
+                                names = [item.name for item in items
+                                         if item.is_file() and not item.name.endswith(".part") and item.stat().st_mtime < cutoff]
+                            for name in names:
+                                yield f"{entry.name}/{sub.name}/{name}"
+
+    def iter_older_than(self, cutoff: float, batch_size: int) -> AsyncIterator[list[str]]:
+        return _batches(self._keys_older_than(cutoff), batch_size)
+
+
+class S3Storage(StorageBackend):
+    """Any S3-compatible object store (AWS, MinIO, R2...) through boto3.
+
+    boto3 is only needed when STORAGE_BACKEND=s3. Its blocking calls run in the
+    thread pool. Legacy flat paths are still read from local disk until the
+    retention job has migrated them.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None, region: str | None = None,
+                 access_key_id: str | None = None, secret_access_key: str | None = None, public_url: str | None = None):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        # Only send checksums when an operation requires them: S3-compatible
+        # servers don't all accept the newer default trailing checksums
+        config = Config(
+            s3={"addressing_style": "path" if endpoint_url else "auto"},
+            request_checksum_calculation="when_required",
+            response_checksum_validation="when_required",
+        )
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=config,
+        )
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.amazonaws.com"
+
+    def _object_name(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def url(self, key: str) -> str:
+        if is_legacy_key(key):
+            return f"/{key}"
+        return f"{self.public_url}/{self._object_name(key)}"
+
+    def _head(self, key: str) -> dict | None:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_name(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def _touch(self, key: str, head: dict):
+        # Server-side copy onto itself refreshes LastModified without re-uploading. REPLACE
+        # drops the stored headers, so the content type and metadata are passed back in
+        name = self._object_name(key)
+        extra = {"ContentType": head["ContentType"]} if head.get("ContentType") else {}
+        self.client.copy_object(
+            Bucket=self.bucket, Key=name, CopySource={"Bucket": self.bucket, "Key": name},
+            MetadataDirective="REPLACE", CacheControl=IMMUTABLE_CACHE_CONTROL,
+            Metadata=head.get("Metadata", {}), **extra,
+        )
+
+    def _put(self, body, key: str, content_type: str | None):
+        head = self._head(key)
+        if head is not None:
+            self._touch(key, head)
+            return
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._object_name(key), Body=body, CacheControl=IMMUTABLE_CACHE_CONTROL, **extra
+        )
+
+    def _put_file(self, path: str, key: str, content_type: str | None, keep_source: bool):
+        with open(path, "rb") as body:
+            self._put(body, key, content_type)
+        if not keep_source:
+            os.remove(path)
+
+    async def put_file(self, path: str, key: str, content_type: str | None = None, keep_source: bool = False):
+        await run_in_threadpool(self._put_file, path, key, content_type, keep_source)
+
+    async def put_bytes(self, content: bytes, key: str, content_type: str | None = None):
+        await run_in_threadpool(self._put, content, key, content_type)
+
+    async def exists(self, key: str) -> bool:
+        if is_legacy_key(key):
+            return await run_in_threadpool(os.path.exists, legacy_local_path(key))
+        return await run_in_threadpool(self._exists, key)
+
+    def _read(self, key: str) -> bytes:
+        if is_legacy_key(key):
+            with open(legacy_local_path(key), "rb") as f:
+                return f.read()
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_name(key))["Body"].read()
+
+    async def read(self, key: str) -> bytes:
+        return await run_in_threadpool(self._read, key)
+
+    def _delete(self, key: str, older_than: float | None) -> bool:
+        if is_legacy_key(key):
+            return LocalStorage()._delete(key, older_than)
+        from botocore.exceptions import ClientError
+        name = self._object_name(key)
+        if older_than is not None:
+            try:
+                head = self.client.head_object(Bucket=self.bucket, Key=name)
+            except ClientError:
+                return False
+            if head["LastModified"].timestamp() >= older_than:
+                return False
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+        return True
+
+    async def delete(self, key: str, older_than: float | None = None) -> bool:
+        return await run_in_threadpool(self._delete, key, older_than)
+
+    def _keys_older_than(self, cutoff: float, page_size: int) -> Iterator[str]:
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket, Prefix=f"{self.prefix}/" if self.prefix else "", PaginationConfig={"PageSize": page_size}
+        )
+        for page in pages:
+            for item in page.get("Contents", []):
+                if item["LastModified"].timestamp() < cutoff:
+                    yield item["Key"][strip:]
+
+    def iter_older_than(self, cutoff: float, batch_size: int) -> AsyncIterator[list[str]]:
+        return _batches(self._keys_older_than(cutoff, min(batch_size, 1000)), batch_size)
+
+
+async def _batches(keys: Iterator[str], batch_size: int) -> AsyncIterator[list[str]]:
+    """Pull up to `batch_size` keys at a time from a blocking iterator, in the thread pool."""
+    while batch := await run_in_threadpool(lambda: list(itertools.islice(keys, batch_size))):
+        yield batch
+
+
+def build_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+        )
+    return LocalStorage()
+
+
+storage = build_storage()
+
+
+def media_url(key: str | None) -> str:
+    """Template filter: browser URL for a stored image key."""
+    return storage.url(key) if key else ""
+
+
+def _open_spool_file():
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=INCOMING_DIR, suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _discard(tmp_path: str):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _discard_spooled_before(cutoff: float) -> int:
+    removed = 0
+    if not os.path.isdir(INCOMING_DIR):
+        return removed
+    with os.scandir(INCOMING_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def spool_upload(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> SpooledUpload:
+    """Stream an upload to a local temp file in chunks, hashing it on the way.
+
+    The whole image is never held in memory, and disk writes run in the
+    thread pool to keep the event loop free. Hand it to `store_upload` (or
+    `discard_upload`) once done with the local copy.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    with span("upload_spool"):
+        out, tmp_path = await run_in_threadpool(_open_spool_file)
+        try:
+            with out:
+                while chunk := await file.read(chunk_size):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await run_in_threadpool(out.write, chunk)
+        except BaseException:
+            await run_in_threadpool(_discard, tmp_path)
+            raise
+
+    return SpooledUpload(
+        filename=file.filename,
+        content_type=file.content_type,
+        path=tmp_path,
+        content_hash=digest.hexdigest(),
+        size=size,
+    )
+
+
+def spool_file(source, filename: str | None, content_type: str | None, chunk_size: int = CHUNK_SIZE) -> SpooledUpload:
+    """Blocking counterpart of `spool_upload` for any readable binary file object (e.g. a zip member)."""
+    digest = hashlib.sha256()
+    size = 0
+    out, tmp_path = _open_spool_file()
+    try:
+        with out:
+            while chunk := source.read(chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return SpooledUpload(filename=filename, content_type=content_type, path=tmp_path, content_hash=digest.hexdigest(), size=size)
+
+
+async def store_upload(upload: SpooledUpload) -> str | None:
+    """Move a spooled upload into storage; returns its key."""
+    key = object_key(upload.content_hash, upload.filename)
+    try:
+        with span("storage_write"):
+            await storage.put_file(upload.path, key, upload.content_type)
+        return key
+    except Exception:
+        logger.exception("could not store upload", extra={"key": key})
+        return None
+
+
+async def discard_upload(upload: SpooledUpload):
+    await run_in_threadpool(_discard, upload.path)
+
+
+async def discard_stale_uploads(cutoff: float) -> int:
+    """Remove spooled uploads last written before `cutoff`: left behind by a crash or kill mid-request."""
+    return await run_in_threadpool(_discard_spooled_before, cutoff)
+
+
+async def save_bytes(content: bytes, content_hash: str, filename: str, content_type: str | None = None) -> str | None:
+    """Store in-memory image bytes under their content hash; returns the key."""
+    key = object_key(content_hash, filename)
+    try:
+        with span("storage_write"):
+            await storage.put_bytes(content, key, content_type)
+        return key
+    except Exception:
+        logger.exception("could not store image", extra={"key": key})
+        return None
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import io
+import logging
+import mimetypes
+import threading
+import uuid
+from collections import Counter
+from typing import AsyncIterator, Awaitable, Callable
+import httpx
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import prediction_cache
+from app.core.config import settings
+from app.core.detections import detection_models, update_rollups
+from app.core.metrics import STREAM_FRAMES, STREAMS_ACTIVE
+from app.core.predictor import request_prediction
+from app.core.storage import save_bytes
+from app.core.thumbnails import thumbnail_worker
+from app.core.tracing import span
+from app.db.database import AsyncSessionLocal
+from app.db.models import Prediction
+
+try:
+    from PIL import Image
+except ImportError:  # Optional: without Pillow only byte-identical frames count as duplicates
+    Image = None
+
+try:
+    import av
+except ImportError:  # Optional: without PyAV /predict/stream/video is unavailable
+    av = None
+
+# dHash grid: 16x16 brightness gradients = a 256-bit fingerprint. The usual 8x8 is too
+# coarse for shelves: one product more or less changes no more bits than sensor noise
+DHASH_SIZE = 16
+# Grey levels a neighbour must be brighter by; keeps flat areas (walls, empty shelf) from flipping bits on sensor noise
+DHASH_MARGIN = 2
+VIDEO_FRAME_QUALITY = 90
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(content: bytes) -> int:
+    """Difference hash of an image: which neighbouring pixels get brighter, on a 17x16 greyscale thumbnail (blocking).
+
+    Sensor noise and re-encoding barely change it; objects moving in or out do.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        # JPEG only: decode at 1/2 to 1/8 scale instead of full size
+        image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+        pixels = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR).tobytes()
+    value = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            offset = row * (DHASH_SIZE + 1) + col
+            value = value << 1 | (pixels[offset + 1] > pixels[offset] + DHASH_MARGIN)
+    return value
+
+
+def fingerprint(content: bytes) -> int | str:
+    """dHash of a frame, or its SHA-256 when it can't be decoded (or Pillow is missing)."""
+    if Image is not None:
+        try:
+            return dhash(content)
+        except Exception:
+            pass
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_duplicate(a: int | str, b: int | str) -> bool:
+    if settings.STREAM_DEDUP_DISTANCE < 0:
+        return False
+    if isinstance(a, int) and isinstance(b, int):
+        return (a ^ b).bit_count() <= settings.STREAM_DEDUP_DISTANCE
+    return a == b
+
+
+def result_signature(prediction_text: str, detections: list[dict]) -> tuple:
+    """What has to change for a result to be stored again: objects per class (confidences and boxes jitter)."""
+    if not detections:
+        return (prediction_text,)
+    return tuple(sorted(Counter(item["class_name"] for item in detections).items()))
+
+
+class FrameStream:
+    """One camera feed or video: frame sampling, near-duplicate skipping, a
+    bounded window of predictor calls, and storage of changed results only.
+
+    Frames go through `offer` in order. At most one frame per `sample_interval`
+    seconds (of the frame's timestamp) is looked at; one whose dHash is within
+    STREAM_DEDUP_DISTANCE bits of the last frame sent to the predictor is
+    skipped, as the previous result still stands. At most STREAM_MAX_IN_FLIGHT
+    predictor calls run at once: live frames arriving while the window is full
+    are dropped (a newer frame follows shortly), videos wait for a free slot.
+
+    Every result is passed to `emit` as it arrives, possibly out of order, and
+    stored as a Prediction row only when the objects per class differ from the
+    last stored result.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, emit: Callable[[dict], Awaitable[None]], *,
+                 name: str = "stream", content_type: str | None = "image/jpeg", sample_interval: float = 0.0):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.content_type = content_type
+        self.sample_interval = sample_interval
+        self.stats = Counter()
+        self._client = client
+        self._emit = emit
+        self._window = asyncio.Semaphore(settings.STREAM_MAX_IN_FLIGHT)
+        self._tasks: set[asyncio.Task] = set()
+        self._last_sampled: float | None = None
+        self._reference: int | str | None = None
+        # Stores run one at a time so "changed" is judged against the latest stored frame
+        self._store_lock = asyncio.Lock()
+        self._stored_signature: tuple | None = None
+        self._stored_frame = -1
+
+    def _count(self, outcome: str) -> str:
+        self.stats[outcome] += 1
+        STREAM_FRAMES.labels(outcome).inc()
+        return outcome
+
+    async def offer(self, content: bytes, timestamp: float, wait: bool = False) -> str:
+        """Consider one frame; returns what happened to it (sampled_out, busy, duplicate or accepted).
+
+        `wait` blocks until the window has room instead of dropping the frame.
+        """
+        frame = self.stats["received"]
+        self.stats["received"] += 1
+        if self._last_sampled is not None and timestamp - self._last_sampled < self.sample_interval:
+            return self._count("sampled_out")
+        if self._window.locked() and not wait:
+            return self._count("busy")
+
+        # A few milliseconds of decoding at reduced scale; Pillow releases the GIL, so a thread will do
+        current = await run_in_threadpool(fingerprint, content)
+        self._last_sampled = timestamp
+        if self._reference is not None and is_duplicate(current, self._reference):
+            return self._count("duplicate")
+
+        await self._window.acquire()
+        self._reference = current
+        task = asyncio.create_task(self._predict(frame, timestamp, content))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return "accepted"
+
+    async def drain(self):
+        """Wait for the predictions still in flight."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def summary(self) -> dict:
+        return {
+            "stream": self.id,
+            **{key: self.stats[key] for key in ("received", "sampled_out", "busy", "duplicate", "predicted", "failed", "stored")},
+        }
+
+    async def _predict(self, frame: int, timestamp: float, content: bytes):
+        filename = f"{self.name}-{frame:06d}{mimetypes.guess_extension(self.content_type or '') or '.jpg'}"
+        try:
+            prediction_result, confidence, error_message, detections = await request_prediction(self._client, filename, content, self.content_type)
+        finally:
+            self._window.release()
+
+        message = {"type": "result", "frame": frame, "timestamp": round(timestamp, 3)}
+        if not prediction_result or error_message:
+            self._count("failed")
+            await self._emit({**message, "error": error_message or "No prediction"})
+            return
+        self._count("predicted")
+        prediction_id = await self._store_if_changed(frame, filename, content, str(prediction_result), float(confidence), detections)
+        await self._emit({
+            **message,
+            "prediction": str(prediction_result),
+            "confidence": float(confidence),
+            "detections": detections,
+            "changed": prediction_id is not None,
+            "prediction_id": prediction_id,
+        })
+
+    async def _store_if_changed(self, frame: int, filename: str, content: bytes, prediction_text: str,
+                                confidence: float, detections: list[dict]) -> int | None:
+        signature = result_signature(prediction_text, detections)
+        async with self._store_lock:
+            # A slower call for an older frame doesn't override a newer result
+            if frame < self._stored_frame or signature == self._stored_signature:
+                return None
+            content_hash = hashlib.sha256(content).hexdigest()
+            image_path = await save_bytes(content, content_hash, filename, self.content_type)
+            try:
+                async with AsyncSessionLocal() as db:
+                    generation = await prediction_cache.generation(db)
+                    row = Prediction(
+                        filename=filename,
+                        prediction_text=prediction_text,
+                        confidence=confidence,
+                        image_path=image_path,
+                        content_hash=content_hash,
+                        model_version=generation,
+                        detections=detection_models(detections),
+                    )
+                    db.add(row)
+                    await update_rollups(db, detections)
+                    with span("db_commit"):
+                        await db.commit()
+            except Exception:
+                # Left unstored: the next result is compared with the older one and stored instead
+                logger.exception("could not store stream result", extra={"stream": self.id, "frame": frame})
+                return None
+            self._stored_signature = signature
+            self._stored_frame = frame
+        thumbnail_worker.enqueue([row.id], image_path)
+        self._count("stored")
+        return row.id
+
+
+class StreamLimit:
+    """Streams served at once by this worker, up to STREAM_MAX_CONNECTIONS."""
+
+    def __init__(self):
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if settings.STREAM_MAX_CONNECTIONS and self.active >= settings.STREAM_MAX_CONNECTIONS:
+            return False
+        self.active += 1
+        STREAMS_ACTIVE.inc()
+        return True
+
+    def release(self):
+        self.active -= 1
+        STREAMS_ACTIVE.dec()
+
+
+stream_limit = StreamLimit()
+
+
+def video_available() -> bool:
+    return av is not None and Image is not None
+
+
+def probe_video(path: str) -> float:
+    """Frame rate of the first video stream; raises ValueError if there is none (blocking)."""
+    try:
+        with av.open(path) as container:
+            if not container.streams.video:
+                raise ValueError("no video stream")
+            return float(container.streams.video[0].average_rate or 0)
+    except av.error.FFmpegError as e:
+        raise ValueError(str(e)) from None
+
+
+def decode_video(path: str, interval: float, max_frames: int, put: Callable[[bytes, float], bool]):
+    """Decode a video, handing one JPEG frame per `interval` seconds of video to `put` (blocking).
+
+    Stops early once `put` returns False or after `max_frames` frames.
+    """
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        next_time, sent = 0.0, 0
+        for frame in container.decode(stream):
+            if frame.time is None or frame.time < next_time:
+                continue
+            next_time = frame.time + interval
+            out = io.BytesIO()
+            frame.to_image().save(out, format="JPEG", quality=VIDEO_FRAME_QUALITY)
+            sent += 1
+            if not put(out.getvalue(), frame.time) or sent >= max_frames:
+                return
+
+
+async def video_frames(path: str, interval: float) -> AsyncIterator[tuple[bytes, float]]:
+    """Sampled frames of a video file as (JPEG bytes, seconds into the video).
+
+    Decoding runs in a thread, at most a few frames ahead of the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    frames: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_MAX_IN_FLIGHT * 2)
+    stopped = threading.Event()
+
+    def handoff(item) -> bool:
+        # Blocks the decoder while the queue is full; gives up once the consumer has gone
+        future = asyncio.run_coroutine_threadsafe(frames.put(item), loop)
+        while not stopped.is_set():
+            try:
+                future.result(timeout=0.5)
+                return True
+            except TimeoutError:
+                continue
+        future.cancel()
+        return False
+
+    def run():
+        try:
+            decode_video(path, interval, settings.STREAM_VIDEO_MAX_FRAMES, lambda content, timestamp: handoff((content, timestamp)))
+        except Exception:
+            logger.exception("video decoding failed")
+        finally:
+            handoff(None)
+
+    decoder = loop.run_in_executor(None, run)
+    try:
+        while (item := await frames.get()) is not None:
+            yield item
+    finally:
+        stopped.set()
+        await decoder
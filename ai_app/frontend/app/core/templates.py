@@ -0,0 +1,30 @@
+from app.core.static import asset_version
+from app.core.storage import media_url
+
+
+class LazyTemplates:
+    """Jinja2Templates built on the first render, so importing the routers doesn't load Jinja."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._templates = None
+
+    def _load(self):
+        if self._templates is None:
+            from fastapi.templating import Jinja2Templates
+            templates = Jinja2Templates(directory=self.directory)
+            templates.env.globals["asset_version"] = asset_version
+            templates.env.filters["media_url"] = media_url
+            self._templates = templates
+        return self._templates
+
+    @property
+    def env(self):
+        return self._load().env
+
+    def TemplateResponse(self, *args, **kwargs):
+        return self._load().TemplateResponse(*args, **kwargs)
+
+
+# Shared by every router so template globals/filters are registered once
+templates = LazyTemplates(directory="app/templates")
@@ -0,0 +1,156 @@
+import asyncio
+import io
+import logging
+import os
+from sqlalchemy import select, update
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.metrics import THUMBNAILS
+from app.core.shared_state import claim
+from app.core.storage import LEGACY_PREFIX, is_legacy_key, storage
+from app.db.database import AsyncSessionLocal
+from app.db.models import Prediction
+
+# Seconds after one worker's startup backfill during which the others skip theirs
+BACKFILL_LEASE = 3600
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional: without Pillow the dashboard keeps showing originals
+    Image = None
+
+
+def thumbnail_key(image_path: str) -> str:
+    """`ab/cd/<sha256>.jpg` -> `ab/cd/<sha256>_320.webp`: still content-addressed, and a new size gets a new URL."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return f"{stem[:2]}/{stem[2:4]}/{stem}_{settings.THUMBNAIL_SIZE}.{settings.THUMBNAIL_FORMAT}"
+
+
+def render_thumbnail(content: bytes) -> bytes:
+    """Downscaled copy of an image (blocking; run in a worker thread)."""
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format=settings.THUMBNAIL_FORMAT.upper(), quality=settings.THUMBNAIL_QUALITY)
+    return out.getvalue()
+
+
+class ThumbnailWorker:
+    """Generates dashboard thumbnails off the request path.
+
+    Handlers enqueue (prediction ids, image key) after committing; the worker
+    stores the thumbnail next to the original and sets `Prediction.thumbnail_path`.
+    On start a second task backfills rows stored before thumbnails existed (or
+    dropped while the queue was full), alongside the queue.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.generated = 0
+        self.failed = 0
+        self.dropped = 0
+        self._dropping = False
+
+    @property
+    def enabled(self) -> bool:
+        return settings.THUMBNAILS_ENABLED and Image is not None
+
+    def start(self):
+        if not self.enabled:
+            if settings.THUMBNAILS_ENABLED:
+                logger.warning("Pillow is not installed, serving original images instead of thumbnails")
+            return
+        self._queue = asyncio.Queue(maxsize=settings.THUMBNAIL_QUEUE_SIZE)
+        self._tasks = [
+            asyncio.create_task(self._run(), name="thumbnail-worker"),
+            asyncio.create_task(self._backfill(), name="thumbnail-backfill"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, prediction_ids: list[int], image_path: str | None):
+        # Legacy flat paths get their thumbnail once the retention job has migrated them
+        if self._queue is None or not image_path or not prediction_ids or is_legacy_key(image_path):
+            return
+        try:
+            self._queue.put_nowait((prediction_ids, image_path))
+            self._dropping = False
+        except asyncio.QueueFull:
+            # Picked up by the backfill on the next start
+            self.dropped += 1
+            THUMBNAILS.labels("dropped").inc()
+            if not self._dropping:
+                self._dropping = True
+                logger.warning("thumbnail queue is full (%d waiting), leaving new uploads to the next backfill", self._queue.qsize())
+
+    async def _run(self):
+        while True:
+            prediction_ids, image_path = await self._queue.get()
+            await self.process(prediction_ids, image_path)
+
+    async def _backfill(self):
+        try:
+            # One worker per BACKFILL_LEASE; rows skipped meanwhile are picked up by a later start
+            if await claim("thumbnail-backfill", BACKFILL_LEASE):
+                await self._backfill_missing()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("thumbnail backfill failed")
+
+    async def _backfill_missing(self):
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(Prediction.id, Prediction.image_path)
+                    .where(
+                        Prediction.id > last_id,
+                        Prediction.thumbnail_path.is_(None),
+                        Prediction.image_path.isnot(None),
+                        Prediction.image_path.notlike(f"{LEGACY_PREFIX}%"),
+                    )
+                    .order_by(Prediction.id)
+                    .limit(500)
+                )).all()
+            if not rows:
+                return
+            by_image: dict[str, list[int]] = {}
+            for row in rows:
+                by_image.setdefault(row.image_path, []).append(row.id)
+            for image_path, ids in by_image.items():
+                await self.process(ids, image_path)
+            last_id = rows[-1].id
+
+    async def process(self, prediction_ids: list[int], image_path: str):
+        key = thumbnail_key(image_path)
+        try:
+            if not await storage.exists(key):
+                thumbnail = await run_in_threadpool(render_thumbnail, await storage.read(image_path))
+                await storage.put_bytes(thumbnail, key, f"image/{settings.THUMBNAIL_FORMAT}")
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Prediction)
+                    .where(Prediction.id.in_(prediction_ids))
+                    .values(thumbnail_path=key)
+                )
+                await db.commit()
+            self.generated += 1
+            THUMBNAILS.labels("generated").inc()
+        except Exception as e:
+            self.failed += 1
+            THUMBNAILS.labels("failed").inc()
+            logger.warning("thumbnail generation failed: %s", e, extra={"key": image_path})
+
+
+thumbnail_worker = ThumbnailWorker()
@@ -0,0 +1,129 @@
+import logging
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from app.core.config import settings
+from app.core.metrics import route_label
+
+logger = logging.getLogger("app.requests")
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Incoming ids are echoed into logs and headers, so only short, plain ones are kept
+_VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._-]{1,64}$")
+
+
+@dataclass
+class Trace:
+    """One request (or background job): its id, whether its DEBUG logs are kept, and time per span."""
+
+    id: str
+    sampled: bool
+    started: float = field(default_factory=time.perf_counter)
+    spans: dict[str, float] = field(default_factory=dict)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def sample_debug() -> bool:
+    return random.random() < settings.LOG_DEBUG_SAMPLE_RATE
+
+
+@contextmanager
+def trace(trace_id: str | None = None):
+    """Make a new Trace current for the block (a request or a background job)."""
+    current = Trace(trace_id or uuid.uuid4().hex[:16], sample_debug())
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    """Add the block's duration to the current trace under `name`.
+
+    Repeated (or concurrent, as in batches) spans of one name are summed.
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.spans[name] = round(current.spans.get(name, 0.0) + (time.perf_counter() - start) * 1000, 2)
+
+
+def _incoming_request_id(scope) -> str | None:
+    for name, value in scope.get("headers", []):
+        if name == REQUEST_ID_HEADER and _VALID_REQUEST_ID.match(value):
+            return value.decode("ascii")
+    return None
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: a request id per request (kept from X-Request-ID
+    when the client sends one), echoed back in the response, and a summary
+    record with the spans once the response has started. Time spent waiting
+    for the request body is recorded as the `upload_read` span.
+
+    Requests slower than LOG_SLOW_REQUEST are logged at INFO, the rest at
+    DEBUG, so they are subject to LOG_DEBUG_SAMPLE_RATE.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with trace(_incoming_request_id(scope)) as current:
+            status_code = 500
+            first_byte_ms = None
+
+            async def send_wrapper(message):
+                nonlocal status_code, first_byte_ms
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    first_byte_ms = current.elapsed_ms()
+                    message = {**message, "headers": [*message.get("headers", []), (REQUEST_ID_HEADER, current.id.encode("ascii"))]}
+                await send(message)
+
+            async def timed_receive():
+                # Waiting for the body is the upload read; waiting for a disconnect is not
+                start = time.perf_counter()
+                message = await receive()
+                if message["type"] == "http.request":
+                    current.spans["upload_read"] = round(current.spans.get("upload_read", 0.0) + (time.perf_counter() - start) * 1000, 2)
+                return message
+
+            try:
+                await self.app(scope, timed_receive, send_wrapper)
+            finally:
+                # Time to the first byte: event streams stay open on purpose
+                duration_ms = first_byte_ms if first_byte_ms is not None else current.elapsed_ms()
+                level = logging.INFO if duration_ms >= settings.LOG_SLOW_REQUEST * 1000 else logging.DEBUG
+                if logger.isEnabledFor(level):
+                    logger.log(level, "request", extra={
+                        "method": scope["method"],
+                        "route": route_label(scope),
+                        "status": status_code,
+                        "duration_ms": duration_ms,
+                        # A copy: the record is formatted on the logging thread, and spans may still be added
+                        "spans": dict(current.spans),
+                    })
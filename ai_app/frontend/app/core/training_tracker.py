@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import random
+import httpx
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.resilience import training_upstream
+from app.core.shared_state import WORKER_ID, relay, shared_state
+from app.db.database import AsyncSessionLocal
+from app.db.models import TrainingJob
+
+COMPLETED_STATES = {"completed", "complete", "done", "finished", "success", "succeeded"}
+FAILED_STATES = {"failed", "error", "errored", "cancelled", "canceled"}
+
+LEADER_KEY = "training-tracker:leader"
+# Job events for every worker's SSE subscribers, plus b"wakeup" from notify()
+CHANNEL = "training-tracker"
+WAKEUP = b"wakeup"
+
+logger = logging.getLogger(__name__)
+
+
+def parse_training_status(data: dict) -> dict:
+    """Normalise the training service's status payload to status/progress/metrics."""
+    raw_status = str(data.get("status") or data.get("state") or "training").lower()
+    if raw_status in COMPLETED_STATES:
+        status = "completed"
+    elif raw_status in FAILED_STATES:
+        status = "failed"
+    else:
+        status = "training"
+
+    progress = data.get("progress")
+    if progress is None and data.get("epoch") is not None and data.get("epochs"):
+        progress = float(data["epoch"]) / float(data["epochs"])
+    if progress is not None:
+        progress = float(progress)
+        if progress > 1:  # Reported as a percentage
+            progress /= 100
+        progress = max(0.0, min(1.0, progress))
+    if status == "completed":
+        progress = 1.0
+
+    metrics = data.get("metrics")
+    if not isinstance(metrics, dict):
+        metrics = None
+
+    return {"status": status, "progress": progress, "metrics": metrics}
+
+
+def job_event(job: TrainingJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "metrics": job.metrics,
+        "model_name": job.model_name,
+    }
+
+
+class TrainingTracker:
+    """Background poller that keeps TrainingJob rows in sync with the training service.
+
+    Polls quickly while a job keeps changing and backs off (up to
+    TRAINING_POLL_MAX_INTERVAL) while it doesn't. Changes are pushed to every
+    subscriber queue, which the SSE endpoint relays to browsers.
+
+    With several workers only the holder of a shared lease polls; its events
+    reach the other workers' subscribers through shared-state pub/sub.
+    """
+
+    def __init__(self):
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._client: httpx.AsyncClient | None = None
+        self.interval = settings.TRAINING_POLL_MIN_INTERVAL
+        self.worker_id = WORKER_ID
+        # Outlives the longest sleep between polls, so a live leader keeps it
+        self.lease_ttl = 2 * settings.TRAINING_POLL_MAX_INTERVAL + 5
+
+    def start(self, client: httpx.AsyncClient):
+        self._client = client
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(), name="training-tracker"),
+            asyncio.create_task(relay(CHANNEL, self._on_message), name="training-tracker-relay"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            # Hand over to another worker right away instead of after the lease expires
+            if await shared_state.get(LEADER_KEY) == self.worker_id:
+                await shared_state.delete(LEADER_KEY)
+        except Exception:
+            pass
+
+    async def notify(self):
+        """Poll right away, e.g. after a training run was started (in whichever worker leads)."""
+        self._wake()
+        await shared_state.publish(CHANNEL, WAKEUP)
+
+    def _wake(self):
+        self.interval = settings.TRAINING_POLL_MIN_INTERVAL
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _on_message(self, message: bytes):
+        if message == WAKEUP:
+            self._wake()
+        else:
+            self._deliver(json.loads(message))
+
+    async def _lead(self) -> bool:
+        if await shared_state.set_if_absent(LEADER_KEY, self.worker_id, self.lease_ttl):
+            return True
+        if await shared_state.get(LEADER_KEY) == self.worker_id:
+            await shared_state.set(LEADER_KEY, self.worker_id, self.lease_ttl)
+            return True
+        return False
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=100)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def publish(self, event: dict):
+        await shared_state.publish(CHANNEL, json.dumps(event).encode("utf-8"))
+
+    def _deliver(self, event: dict):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: it will catch up from the next event
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                # Another worker polls while it holds the lease
+                active, changed = await self.poll_once() if await self._lead() else (False, False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("training status poll failed: %s: %s", type(e).__name__, e)
+                active, changed = True, False
+
+            if changed:
+                self.interval = settings.TRAINING_POLL_MIN_INTERVAL
+            else:
+                self.interval = min(self.interval * settings.TRAINING_POLL_BACKOFF, settings.TRAINING_POLL_MAX_INTERVAL)
+
+            # Nothing running: sleep until notify() (or the max interval as a safety net)
+            delay = self.interval if active else settings.TRAINING_POLL_MAX_INTERVAL
+            delay *= random.uniform(0.9, 1.1)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def poll_once(self) -> tuple[bool, bool]:
+        """Returns (a job is active, something changed)."""
+        async with AsyncSessionLocal() as db:
+            job = await db.scalar(
+                select(TrainingJob).where(TrainingJob.status == "training").order_by(TrainingJob.id.desc()).limit(1)
+            )
+            if job is None:
+                return False, False
+
+            # No retries: the next poll is the retry
+            response = await training_upstream.call(self._client.get, [settings.TRAINING_STATUS_URL], retry=False)
+            if response.status_code != 200:
+                logger.warning("training status API error", extra={"status": response.status_code})
+                return True, False
+
+            update = parse_training_status(response.json())
+            changed = False
+            for field, value in update.items():
+                if value is not None and getattr(job, field) != value:
+                    setattr(job, field, value)
+                    changed = True
+
+            if changed:
+                await db.commit()
+                await db.refresh(job)
+                await self.publish(job_event(job))
+            return job.status == "training", changed
+
+
+training_tracker = TrainingTracker()
@@ -1,16 +1,52 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
+from app.core.metrics import TimedQueuePool, instrument_engine
 
-engine = create_engine(settings.DATABASE_URL)
+POOL_OPTIONS = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+if settings.SQLITE_PATH:
+    # Connections move between threads in the pool; wait on locks instead of failing at once
+    POOL_OPTIONS["connect_args"] = {"check_same_thread": False, "timeout": 30}
+
+
+def use_sqlite_wal(engine):
+    """Readers don't block the writer (and vice versa) under concurrent requests."""
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+# Sync engine: schema creation, migrations and maintenance commands (manage.py)
+if settings.SQLITE_PATH == ":memory:":
+    # One connection held open for good: the shared in-memory database lives as long as it does
+    engine = create_engine(settings.DATABASE_URL, poolclass=StaticPool, connect_args=POOL_OPTIONS["connect_args"])
+else:
+    engine = create_engine(settings.DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: used by the request handlers so DB round-trips never block the event loop
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
+instrument_engine(async_engine.sync_engine)
+if settings.SQLITE_PATH and settings.SQLITE_PATH != ":memory:":
+    use_sqlite_wal(engine)
+    use_sqlite_wal(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
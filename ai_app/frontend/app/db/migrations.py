@@ -0,0 +1,139 @@
+"""Versioned schema migrations, applied out of band by `python manage.py migrate`.
+
+Each migration runs once and is recorded in `schema_versions`; the app's
+startup only compares the recorded version with LATEST_VERSION. Migration 1
+creates any missing table from the current models, so later migrations must
+check before changing anything (see `add_column`/`add_index`): on a new
+database the change is already there.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.db.database import Base
+from app.db.models import Prediction, SchemaVersion, TrainingJob, User
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        logger.info("adding column %s.%s", table, column)
+        conn.execute(text(ddl))
+
+
+def add_index(conn: Connection, table: str, index: str, ddl: str):
+    if index not in {i["name"] for i in inspect(conn).get_indexes(table)}:
+        logger.info("adding index %s on %s", index, table)
+        conn.execute(text(ddl))
+
+
+def create_tables(conn: Connection):
+    Base.metadata.create_all(conn)
+
+
+def add_late_columns(conn: Connection):
+    # Columns introduced after the tables were first created
+    for table, column, ddl in [
+        ("predictions", "image_path", "ALTER TABLE predictions ADD COLUMN image_path VARCHAR(500) AFTER confidence"),
+        ("predictions", "thumbnail_path", "ALTER TABLE predictions ADD COLUMN thumbnail_path VARCHAR(500) NULL AFTER image_path"),
+        ("predictions", "content_hash", "ALTER TABLE predictions ADD COLUMN content_hash VARCHAR(64) NULL, ADD INDEX ix_predictions_content_hash (content_hash)"),
+        ("predictions", "status", "ALTER TABLE predictions ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'completed', ADD INDEX ix_predictions_status (status)"),
+        ("predictions", "error", "ALTER TABLE predictions ADD COLUMN error TEXT NULL"),
+        ("predictions", "updated_at", "ALTER TABLE predictions ADD COLUMN updated_at DATETIME NULL"),
+        ("training_jobs", "progress", "ALTER TABLE training_jobs ADD COLUMN progress FLOAT NULL AFTER augmentation"),
+        ("training_jobs", "metrics", "ALTER TABLE training_jobs ADD COLUMN metrics JSON NULL AFTER progress"),
+        ("training_jobs", "updated_at", "ALTER TABLE training_jobs ADD COLUMN updated_at DATETIME NULL"),
+        ("training_jobs", "config_fingerprint", "ALTER TABLE training_jobs ADD COLUMN config_fingerprint VARCHAR(64) NULL, ADD INDEX ix_training_jobs_config_fingerprint (config_fingerprint)"),
+    ]:
+        add_column(conn, table, column, ddl)
+
+
+def add_late_indexes(conn: Connection):
+    for table, index, ddl in [
+        ("predictions", "ix_predictions_created_at", "CREATE INDEX ix_predictions_created_at ON predictions (created_at)"),
+        ("predictions", "ix_predictions_image_path", "CREATE INDEX ix_predictions_image_path ON predictions (image_path)"),
+        ("predictions", "ix_predictions_thumbnail_path", "CREATE INDEX ix_predictions_thumbnail_path ON predictions (thumbnail_path)"),
+    ]:
+        add_index(conn, table, index, ddl)
+
+
+def backfill_detection_rows(conn: Connection):
+    from app.core.detections import backfill_detections
+    created = backfill_detections(conn)
+    if created:
+        logger.info("backfilled %d detection rows", created)
+
+
+def add_model_versions(conn: Connection):
+    add_column(conn, "training_jobs", "model_version", "ALTER TABLE training_jobs ADD COLUMN model_version INT NULL")
+    add_column(conn, "predictions", "model_version", "ALTER TABLE predictions ADD COLUMN model_version INT NULL")
+    # Hashes still set survived the last training start's wipe, so they belong to the current model (generation 0)
+    if conn.scalar(select(func.max(TrainingJob.model_version))) is None:
+        conn.execute(
+            update(Prediction)
+            .where(Prediction.content_hash.isnot(None), Prediction.model_version.is_(None))
+            .values(model_version=0)
+        )
+
+
+def seed_admin_user(conn: Connection):
+    from app.core.security import get_password_hash
+    if conn.scalar(select(User.id).where(User.username == "admin")) is None:
+        conn.execute(User.__table__.insert().values(username="admin", hashed_password=get_password_hash("admin123"), is_active=True))
+        logger.info("created the default 'admin' user")
+
+
+MIGRATIONS = [
+    Migration(1, "create tables", create_tables),
+    Migration(2, "add columns introduced after the first release", add_late_columns),
+    Migration(3, "add indexes for dashboard, retention and thumbnails", add_late_indexes),
+    Migration(4, "backfill per-class detection rows", backfill_detection_rows),
+    Migration(5, "seed the default admin user", seed_admin_user),
+    Migration(6, "record the model version of training runs and predictions", add_model_versions),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied migration; 0 for a database that has never been migrated."""
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.scalar(select(func.max(SchemaVersion.version))) or 0
+
+
+def upgrade(engine: Engine, target: int | None = None) -> list[Migration]:
+    """Apply pending migrations up to `target` (default: all), each in its own transaction."""
+    applied = []
+    with engine.connect() as conn:
+        version = current_version(conn)
+        conn.commit()
+        for migration in MIGRATIONS:
+            if migration.version <= version or (target is not None and migration.version > target):
+                continue
+            logger.info("migration %d: %s", migration.version, migration.name)
+            migration.apply(conn)
+            # Same transaction as the migration's own changes (MySQL commits DDL implicitly, though)
+            conn.execute(SchemaVersion.__table__.insert().values(version=migration.version, name=migration.name))
+            conn.commit()
+            applied.append(migration)
+    return applied
+
+
+async def check_schema(async_engine: AsyncEngine) -> int | None:
+    """Startup check: reads the schema version without changing anything. None if the DB is unreachable."""
+    try:
+        async with async_engine.connect() as conn:
+            return await conn.run_sync(current_version)
+    except Exception as e:
+        logger.warning("schema check skipped, database unreachable: %s: %s", type(e).__name__, e)
+        return None
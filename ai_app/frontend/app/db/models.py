@@ -1,7 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, JSON, Text, Float, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 
+class SchemaVersion(Base):
+    """One row per migration applied by `python manage.py migrate` (app/db/migrations.py)."""
+    __tablename__ = "schema_versions"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100))
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class User(Base):
     __tablename__ = "users"
 
@@ -21,7 +30,12 @@ class TrainingJob(Base):
     learning_rate = Column(String(20)) # Store as string just in case
     classes = Column(Integer) # Store number of classes
     augmentation = Column(Boolean)
+    progress = Column(Float, nullable=True) # 0..1, updated by the training tracker
+    metrics = Column(JSON, nullable=True)
+    config_fingerprint = Column(String(64), nullable=True, index=True) # SHA-256 of the normalised config
+    model_version = Column(Integer, nullable=True) # Prediction cache generation started by this run (see app/core/cache.py)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=func.now())
 class Prediction(Base):
     __tablename__ = "predictions"
 
@@ -29,5 +43,38 @@ class Prediction(Base):
     filename = Column(String(255))
     prediction_text = Column(Text)
     confidence = Column(Float)
-    image_path = Column(String(500), nullable=True)
+    image_path = Column(String(500), nullable=True, index=True) # Storage key (or a legacy static/ path)
+    thumbnail_path = Column(String(500), nullable=True, index=True)
+    content_hash = Column(String(64), nullable=True, index=True) # SHA-256 of the uploaded image
+    model_version = Column(Integer, nullable=True) # Cache generation the result was predicted in
+    status = Column(String(20), nullable=False, default="completed", server_default="completed", index=True) # queued/running/failed while an async job
+    error = Column(Text, nullable=True) # Why an async job failed
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=func.now())
+
+    detections = relationship("PredictionDetection", back_populates="prediction", cascade="all, delete-orphan", passive_deletes=True)
+
+class PredictionDetection(Base):
+    """One row per detected object; `prediction_text` keeps the joined summary for display."""
+    __tablename__ = "prediction_detections"
+    __table_args__ = (
+        Index("ix_prediction_detections_class_created", "class_name", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    prediction_id = Column(Integer, ForeignKey("predictions.id", ondelete="CASCADE"), nullable=False, index=True)
+    class_name = Column(String(100), nullable=False)
+    confidence = Column(Float)
+    bbox = Column(JSON, nullable=True) # [x1, y1, x2, y2] as returned by the predictor
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    prediction = relationship("Prediction", back_populates="detections")
+
+class DetectionDailyRollup(Base):
+    """Detections per class per day, kept up to date as predictions are stored."""
+    __tablename__ = "detection_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    class_name = Column(String(100), primary_key=True)
+    detections = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
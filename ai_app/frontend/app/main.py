@@ -1,53 +1,101 @@
-from fastapi import FastAPI, Depends, Request
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse
-from app.db.database import engine, Base, get_db, SessionLocal
-from app.db import models
-from app.routers import auth, dashboard, train, predict
-from app.core.security import get_password_hash
-from sqlalchemy.orm import Session
-
-# Create DB tables
-models.Base.metadata.create_all(bind=engine)
-
-# Auto-migration: Check if image_path exists in predictions table
-try:
-    from sqlalchemy import text
-    with engine.connect() as conn:
-        # Check if the column exists
-        result = conn.execute(text("SHOW COLUMNS FROM predictions LIKE 'image_path'")).fetchone()
-        if not result:
-            print("MIGRATION: Adding 'image_path' column to 'predictions' table...")
-            conn.execute(text("ALTER TABLE predictions ADD COLUMN image_path VARCHAR(500) AFTER confidence"))
-            conn.commit()
-            print("MIGRATION: Successfully added 'image_path' column.")
-except Exception as e:
-    print(f"MIGRATION ERROR (Non-critical): {e}")
-
-app = FastAPI(title="AI Vision Pro")
-
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+from app.db.database import engine, async_engine
+from app.db.migrations import LATEST_VERSION, check_schema, upgrade
+from app.routers import auth, dashboard, train, predict, history
+from app.core.config import DEFAULT_SECRET_KEY, settings
+from app.core.security import shutdown_hash_executor
+from app.core.auth import LoginRequired, SessionRefreshMiddleware
+from app.core.admission import AdmissionMiddleware
+from app.core.http import build_http_clients, PREDICTOR, TRAINING
+from app.core.training_tracker import training_tracker
+from app.core.remote_config import remote_config_cache
+from app.core.metrics import MetricsMiddleware, metrics_endpoint
+from app.core.static import CachedStaticFiles, STATIC_DIR
+from app.core.thumbnails import thumbnail_worker
+from app.core.retention import retention_job
+from app.core.balancer import predictor_pool
+from app.core.jobs import prediction_queue
+from app.core.preprocess import shutdown_preprocess_executor
+from app.core.shared_state import shared_state
+from app.core.adapters import response_adapters
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.tracing import TracingMiddleware
+
+# JSON records through a queue to a writer thread, so logging never blocks the event loop
+setup_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.SECRET_KEY == DEFAULT_SECRET_KEY:
+        if not settings.SQLITE_PATH:
+            raise RuntimeError("SECRET_KEY is the public default, so session tokens could be forged. Set your own in .env, e.g. from `python -c \"import secrets; print(secrets.token_urlsafe(32))\"`.")
+        logger.error("SECRET_KEY is the public default: fine on a SQLite development or benchmark setup, never in production")
+    response_adapters.check_setting()
+    # Migrations run out of band (python manage.py migrate); only check the version here
+    version = await check_schema(async_engine)
+    if version is not None and version < LATEST_VERSION:
+        if not settings.AUTO_MIGRATE:
+            raise RuntimeError(f"Database schema is at version {version}, this code needs {LATEST_VERSION}. Run `python manage.py migrate`.")
+        await asyncio.to_thread(upgrade, engine)
+    elif version is not None and version > LATEST_VERSION:
+        logger.warning("database schema is at version %d, newer than this code (%d)", version, LATEST_VERSION)
+    # Pooled outbound clients shared by all requests
+    app.state.http_clients = build_http_clients()
+    # Keeps "training" jobs in sync with the training service
+    training_tracker.start(app.state.http_clients.get(TRAINING))
+    # Warm the remote training config without delaying startup
+    remote_config_cache.revalidate(app.state.http_clients.get(TRAINING))
+    # Takes predictor backends out of rotation while their health checks fail
+    predictor_pool.start(app.state.http_clients.get(PREDICTOR))
+    # Workers for /predict/jobs, periodically re-queueing jobs left unfinished by a restart or a lost worker
+    prediction_queue.start(app.state.http_clients.get(PREDICTOR))
+    # Dashboard thumbnails, including any missing from earlier uploads
+    thumbnail_worker.start()
+    # Moves legacy uploads into sharded storage and prunes expired/unreferenced images
+    retention_job.start()
+    try:
+        yield
+    finally:
+        await retention_job.stop()
+        await thumbnail_worker.stop()
+        await prediction_queue.stop()
+        await predictor_pool.stop()
+        await training_tracker.stop()
+        await app.state.http_clients.aclose()
+        await async_engine.dispose()
+        await shared_state.close()
+        shutdown_hash_executor()
+        shutdown_preprocess_executor()
+        shutdown_logging()
+
+app = FastAPI(title="AI Vision Pro", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(SessionRefreshMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Outermost: every response, refusals included, carries a request id
+app.add_middleware(TracingMiddleware)
+
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 
 app.include_router(auth.router)
 app.include_router(dashboard.router)
 app.include_router(train.router)
 app.include_router(predict.router)
+app.include_router(history.router)
 
 @app.get("/")
 async def root():
     return RedirectResponse(url="/login")
 
-# Seed initial user
-def seed_user():
-    db = SessionLocal()
-    user = db.query(models.User).filter(models.User.username == "admin").first()
-    if not user:
-        user = models.User(
-            username="admin",
-            hashed_password=get_password_hash("admin123")
-        )
-        db.add(user)
-        db.commit()
-    db.close()
-
-seed_user()
+# Raised by the page_user dependency when there is no valid session
+@app.exception_handler(LoginRequired)
+async def login_required(request: Request, exc: LoginRequired):
+    return RedirectResponse(url="/login", status_code=303)
+
+# Prometheus scrape target: DB pool usage, query counts/latency per route, request latency
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
@@ -1,33 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.db.models import User
-from app.core.security import verify_password, get_password_hash
+from app.core.auth import clear_session_cookie, set_session_cookie
+from app.core.security import verify_password_async, get_password_hash_async, needs_rehash
+from app.core.templates import templates
 
 router = APIRouter(tags=["auth"])
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @router.post("/auth/login", response_class=HTMLResponse)
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user or not await verify_password_async(password, user.hashed_password):
         # In a real app, show error message
         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
     
-    # Simple session management for demo (in production use secure cookies/JWT)
+    # BCRYPT_ROUNDS changed since this hash was made: upgrade it transparently
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(password)
+        await db.commit()
+    
+    # Signed, expiring session token; pages verify it without a DB lookup
     response = RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    response.set_cookie(key="user_id", value=str(user.id))
+    set_session_cookie(response, user.id)
     return response
 
 @router.get("/logout")
 async def logout():
     response = RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    clear_session_cookie(response)
+    # Sessions from before signed tokens
     response.delete_cookie("user_id")
     return response
 
@@ -36,20 +44,20 @@ async def signup_page(request: Request):
     return templates.TemplateResponse("signup.html", {"request": request})
 
 @router.post("/auth/signup", response_class=HTMLResponse)
-async def signup(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user_exists = db.query(User).filter(User.username == username).first()
+async def signup(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user_exists = await db.scalar(select(User.id).where(User.username == username))
     if user_exists:
         return templates.TemplateResponse("signup.html", {"request": request, "error": "Username already exists"})
     
     new_user = User(
         username=username,
-        hashed_password=get_password_hash(password)
+        hashed_password=await get_password_hash_async(password)
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # Auto login after signup
     response = RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    response.set_cookie(key="user_id", value=str(new_user.id))
+    set_session_cookie(response, new_user.id)
     return response
@@ -1,38 +1,128 @@
-from fastapi import APIRouter, Request, Depends, Cookie
-from sqlalchemy.orm import Session
+import logging
+from fastapi import APIRouter, Request, Depends
+from sqlalchemy import func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth import CurrentUser, page_user
 from app.db.database import get_db
-from app.db.models import TrainingJob, Prediction
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from app.db.models import TrainingJob, Prediction, DetectionDailyRollup
+from app.core.config import settings
+from app.core.templates import templates
+from fastapi.responses import HTMLResponse
 
 router = APIRouter(tags=["dashboard"])
-templates = Jinja2Templates(directory="app/templates")
+logger = logging.getLogger(__name__)
+
+# Only the columns the templates render, fetched as plain row tuples
+TRAINING_COLUMNS = (TrainingJob.id, TrainingJob.model_name, TrainingJob.status, TrainingJob.created_at)
+PREDICTION_COLUMNS = (
+    Prediction.id,
+    Prediction.filename,
+    Prediction.prediction_text,
+    Prediction.confidence,
+    Prediction.image_path,
+    Prediction.thumbnail_path,
+    Prediction.created_at,
+)
+
+
+async def get_dashboard_stats(db: AsyncSession, class_limit: int):
+    """Totals, last activity and per-class stats in a single round-trip.
+
+    A one-row derived table holding the totals is LEFT JOINed to the per-class
+    stats, so the totals still come back when there are no predictions. Class
+    stats are summed from the daily rollup, not grouped over every prediction.
+    """
+    totals = select(
+        select(func.count(TrainingJob.id)).scalar_subquery().label("total_training"),
+        select(func.count(Prediction.id)).where(Prediction.status == "completed").scalar_subquery().label("total_predictions"),
+        select(func.max(Prediction.created_at)).where(Prediction.status == "completed").scalar_subquery().label("last_activity"),
+    ).subquery()
+    detections = func.sum(DetectionDailyRollup.detections)
+    per_class = (
+        select(
+            DetectionDailyRollup.class_name,
+            detections.label("count"),
+            (func.sum(DetectionDailyRollup.confidence_sum) / detections).label("avg_confidence"),
+        )
+        .group_by(DetectionDailyRollup.class_name)
+        .order_by(detections.desc())
+        .limit(class_limit)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(totals, per_class.c.class_name, per_class.c["count"], per_class.c.avg_confidence)
+        .select_from(totals.outerjoin(per_class, true()))
+        .order_by(per_class.c["count"].desc())
+    )).all()
+
+    first = rows[0]
+    return {
+        "total_training": first.total_training,
+        "total_predictions": first.total_predictions,
+        "last_activity": first.last_activity,
+        "class_stats": [row for row in rows if row.class_name is not None],
+    }
+
+
+async def get_prediction_page(db: AsyncSession, page_size: int, before: int | None = None, after: int | None = None):
+    """Keyset (id cursor) pagination over predictions, newest first.
+
+    `before` pages towards older rows, `after` towards newer ones. One extra row
+    is fetched to know whether another page exists in that direction.
+    """
+    # Async jobs still queued/running (or failed) have no result to show
+    query = select(*PREDICTION_COLUMNS).where(Prediction.status == "completed")
+    if after is not None:
+        query = query.where(Prediction.id > after).order_by(Prediction.id.asc()).limit(page_size + 1)
+        rows = (await db.execute(query)).all()
+        has_newer = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        has_older = bool(rows)
+    else:
+        if before is not None:
+            query = query.where(Prediction.id < before)
+        rows = (await db.execute(query.order_by(Prediction.id.desc()).limit(page_size + 1))).all()
+        has_older = len(rows) > page_size
+        rows = rows[:page_size]
+        has_newer = before is not None and bool(rows)
+
+    return {
+        "rows": rows,
+        "newer_cursor": rows[0].id if has_newer else None,
+        "older_cursor": rows[-1].id if has_older else None,
+    }
+
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(
-    request: Request, 
-    db: Session = Depends(get_db),
-    user_id: str | None = Cookie(default=None)
+    request: Request,
+    before: int | None = None,
+    after: int | None = None,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(page_user)
 ):
-    if not user_id:
-        return RedirectResponse(url="/login")
-    
+    page_size = settings.DASHBOARD_PAGE_SIZE
+
     # Fetch stats
-    total_training = db.query(TrainingJob).count()
-    total_predictions = db.query(Prediction).count()
-    
-    
-    print(f"DASHBOARD DIAGNOSTIC: Found {total_training} training jobs and {total_predictions} predictions.")
-    
-    recent_training = db.query(TrainingJob).order_by(TrainingJob.id.desc()).all()
-    recent_predictions = db.query(Prediction).order_by(Prediction.id.desc()).all()
-    
+    stats = await get_dashboard_stats(db, settings.DASHBOARD_CLASS_STATS_LIMIT)
+    logger.debug("dashboard stats", extra={"training_jobs": stats["total_training"], "predictions": stats["total_predictions"]})
+
+    recent_training = (await db.execute(
+        select(*TRAINING_COLUMNS).order_by(TrainingJob.id.desc()).limit(page_size)
+    )).all()
+
+    page = await get_prediction_page(db, page_size, before=before, after=after)
+    if not page["rows"] and (before is not None or after is not None):
+        # Stale or out-of-range cursor: fall back to the newest page
+        page = await get_prediction_page(db, page_size)
+
     return templates.TemplateResponse("dashboard.html", {
-        "request": request, 
+        "request": request,
         "user": True,
-        "total_training": total_training,
-        "total_predictions": total_predictions,
+        **stats,
         "recent_training": recent_training,
-        "recent_predictions": recent_predictions,
+        "recent_predictions": page["rows"],
+        "newer_cursor": page["newer_cursor"],
+        "older_cursor": page["older_cursor"],
         "active_page": "dashboard"
     })
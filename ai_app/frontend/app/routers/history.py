@@ -0,0 +1,175 @@
+from datetime import date, datetime, time, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth import CurrentUser, current_user
+from app.db.database import get_db
+from app.db.models import Prediction, PredictionDetection, DetectionDailyRollup
+from app.core.storage import media_url
+
+router = APIRouter(tags=["history"])
+
+
+def _day_bounds(start: date | None, end: date | None) -> tuple[datetime | None, datetime | None]:
+    """Inclusive day range as [start 00:00, day after end 00:00)."""
+    lower = datetime.combine(start, time.min) if start else None
+    upper = datetime.combine(end + timedelta(days=1), time.min) if end else None
+    return lower, upper
+
+
+async def search_predictions(
+    db: AsyncSession,
+    class_name: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    min_confidence: float | None = None,
+    before: int | None = None,
+    limit: int = 50,
+):
+    """Predictions newest first, filtered by day range and detected class.
+
+    Class/confidence filters are a semi-join on `prediction_detections`, served by
+    the (class_name, created_at) index instead of a LIKE scan over prediction_text.
+    Pages use an id cursor like the dashboard.
+    """
+    lower, upper = _day_bounds(start, end)
+    query = select(
+        Prediction.id, Prediction.filename, Prediction.prediction_text, Prediction.confidence,
+        Prediction.image_path, Prediction.thumbnail_path, Prediction.created_at,
+    ).where(Prediction.status == "completed")
+    if lower:
+        query = query.where(Prediction.created_at >= lower)
+    if upper:
+        query = query.where(Prediction.created_at < upper)
+    if before is not None:
+        query = query.where(Prediction.id < before)
+
+    if class_name or min_confidence is not None:
+        matching = select(PredictionDetection.prediction_id)
+        if class_name:
+            matching = matching.where(PredictionDetection.class_name == class_name)
+        if min_confidence is not None:
+            matching = matching.where(PredictionDetection.confidence >= min_confidence)
+        if lower:
+            matching = matching.where(PredictionDetection.created_at >= lower)
+        if upper:
+            matching = matching.where(PredictionDetection.created_at < upper)
+        query = query.where(Prediction.id.in_(matching))
+
+    rows = (await db.execute(query.order_by(Prediction.id.desc()).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Detections for the whole page in one query
+    detections: dict[int, list] = {row.id: [] for row in rows}
+    if rows:
+        for item in (await db.execute(
+            select(
+                PredictionDetection.prediction_id, PredictionDetection.class_name,
+                PredictionDetection.confidence, PredictionDetection.bbox,
+            )
+            .where(PredictionDetection.prediction_id.in_(detections))
+            .order_by(PredictionDetection.id)
+        )).all():
+            detections[item.prediction_id].append({
+                "class_name": item.class_name,
+                "confidence": item.confidence,
+                "bbox": item.bbox,
+            })
+
+    return {
+        "results": [
+            {
+                "id": row.id,
+                "filename": row.filename,
+                "prediction": row.prediction_text,
+                "confidence": row.confidence,
+                "image_path": row.image_path,
+                "thumbnail_path": row.thumbnail_path,
+                "image_url": media_url(row.image_path) or None,
+                "thumbnail_url": media_url(row.thumbnail_path) or None,
+                "created_at": row.created_at,
+                "detections": detections[row.id],
+            }
+            for row in rows
+        ],
+        "next_cursor": rows[-1].id if has_more else None,
+    }
+
+
+async def get_class_analytics(db: AsyncSession, start: date, end: date, class_name: str | None = None):
+    """Daily and total detections per class, read from the daily rollup table.
+
+    Cost depends on days x classes in the range, not on how many predictions exist.
+    """
+    query = (
+        select(
+            DetectionDailyRollup.day,
+            DetectionDailyRollup.class_name,
+            DetectionDailyRollup.detections,
+            DetectionDailyRollup.confidence_sum,
+        )
+        .where(DetectionDailyRollup.day >= start, DetectionDailyRollup.day <= end)
+        .order_by(DetectionDailyRollup.day, DetectionDailyRollup.class_name)
+    )
+    if class_name:
+        query = query.where(DetectionDailyRollup.class_name == class_name)
+
+    daily = []
+    totals: dict[str, list] = {}
+    for row in (await db.execute(query)).all():
+        daily.append({
+            "day": row.day,
+            "class_name": row.class_name,
+            "detections": row.detections,
+            "avg_confidence": row.confidence_sum / row.detections if row.detections else None,
+        })
+        total = totals.setdefault(row.class_name, [0, 0.0])
+        total[0] += row.detections
+        total[1] += row.confidence_sum
+
+    return {
+        "start": start,
+        "end": end,
+        "daily": daily,
+        "classes": sorted(
+            (
+                {"class_name": name, "detections": n, "avg_confidence": conf / n if n else None}
+                for name, (n, conf) in totals.items()
+            ),
+            key=lambda item: item["detections"],
+            reverse=True,
+        ),
+    }
+
+
+@router.get("/history/search")
+async def history_search(
+    class_name: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    min_confidence: float | None = Query(default=None, ge=0, le=1),
+    before: int | None = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(current_user)
+):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await search_predictions(db, class_name, start, end, min_confidence, before, limit)
+
+
+@router.get("/history/analytics")
+async def history_analytics(
+    start: date | None = None,
+    end: date | None = None,
+    class_name: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(current_user)
+):
+    # Defaults to the last 7 days (the rollup uses the database server's date)
+    end = end or await db.scalar(select(func.current_date()))
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await get_class_analytics(db, start, end, class_name)
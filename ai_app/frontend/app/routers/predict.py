@@ -1,155 +1,564 @@
-from fastapi import APIRouter, Request, UploadFile, File, Depends, Cookie
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-import random
+from fastapi import APIRouter, Request, UploadFile, File, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from typing import List
+import asyncio
 import httpx
+import io
 import json
-import traceback
-import base64
+import logging
+import mimetypes
 import os
-import uuid
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+import re
+import time
+import zipfile
+from pathlib import Path
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from app.core.auth import CurrentUser, current_user, page_user, websocket_user
+from app.db.database import get_db, AsyncSessionLocal
 from app.db.models import Prediction
+from app.core.detections import detection_models, update_rollups
 from app.core.config import settings
+from app.core.http import get_predictor_client
+from app.core.balancer import predictor_pool
+from app.core.adapters import response_adapters
+from app.core.predictor import request_prediction
+from app.core.jobs import prediction_queue, job_event, QueueFull, QUEUED, FINISHED
+from app.core.cache import prediction_cache, CachedPrediction
+from app.core.storage import SpooledUpload, spool_file, spool_upload, store_upload, discard_upload, media_url
+from app.core.templates import templates
+from app.core.thumbnails import thumbnail_worker
+from app.core.streams import FrameStream, probe_video, stream_limit, video_available, video_frames
+from app.core.tracing import span, trace
 
 router = APIRouter(tags=["predict"])
-templates = Jinja2Templates(directory="app/templates")
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
 
 @router.get("/predict", response_class=HTMLResponse)
-async def predict_page(request: Request, user_id: str | None = Cookie(default=None)):
-    if not user_id:
-        return RedirectResponse(url="/login")
+async def predict_page(request: Request, user: CurrentUser = Depends(page_user)):
     return templates.TemplateResponse("predict.html", {"request": request, "user": True})
 
 @router.post("/predict", response_class=HTMLResponse)
 async def predict(
-    request: Request, 
-    file: UploadFile = File(...), 
-    db: Session = Depends(get_db),
-    user_id: str | None = Cookie(default=None)
+    request: Request,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_predictor_client),
+    user: CurrentUser = Depends(page_user)
 ):
-    if not user_id:
-        return RedirectResponse(url="/login")
-    
-    # Read file content
-    content = await file.read()
-    
+    # Stream the upload to disk, hashing it as it arrives
+    upload = await spool_upload(file)
+    content_hash = upload.content_hash
+
     prediction_result = None
     confidence = 0
     error_message = None
-    
+    detections = []
+
     try:
-        async with httpx.AsyncClient() as client:
-            # We use "file" as the key, which is standard for FastAPI UploadFile parameters
-            files = {"file": (file.filename, content, file.content_type)}
-            response = await client.post(settings.EXTERNAL_PREDICTOR_API, files=files, timeout=60.0)
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    # Try to find a result in a very flexible way
-                    # Priority 0: Nested predictions list (The structure found in the user's last message)
-                    predictions = data.get("predictions")
-                    if predictions and isinstance(predictions, list) and len(predictions) > 0:
-                        # Take the first prediction as primary, but we'll store all class names
-                        primary = predictions[0]
-                        prediction_result = primary.get("class_name") or primary.get("label") or primary.get("prediction")
-                        confidence = primary.get("confidence") or 0.99
-                        
-                        # If there are multiple, let's join them for the display result
-                        if len(predictions) > 1:
-                            all_classes = [p.get("class_name") or p.get("label") for p in predictions if p.get("class_name") or p.get("label")]
-                            prediction_result = ", ".join(all_classes)
-                    
-                    # Priority 1: Specific known keys at root
-                    if not prediction_result:
-                        prediction_result = data.get("prediction") or data.get("label") or data.get("result") or data.get("class")
-                    
-                    # Priority 2: If it's a direct string or has a single value
-                    if not prediction_result:
-                        if isinstance(data, str):
-                            prediction_result = data
-                        elif isinstance(data, dict) and len(data) == 1:
-                            prediction_result = list(data.values())[0]
-                    
-                    if prediction_result:
-                        # Find confidence if exists (and not already set by Priority 0)
-                        if not confidence:
-                            confidence = data.get("confidence") or data.get("score") or 0.99
-                    else:
-                        error_message = f"Connected! But couldn't find a 'prediction' key in the response. Received: {json.dumps(data)}"
-                except Exception as parse_err:
-                    # If not JSON, maybe it's raw text?
-                    text_resp = response.text.strip()
-                    if text_resp and len(text_resp) < 50:
-                        prediction_result = text_resp
-                    else:
-                        error_message = f"Received non-JSON response or Parse Error: {str(parse_err)} | Text: {text_resp[:100]}"
-            else:
-                error_message = f"Remote API Error (Status {response.status_code}): {response.text[:200]}"
-                
-    except httpx.ReadError:
-        error_message = f"Read Error: The connection to {settings.EXTERNAL_PREDICTOR_API} was reset while waiting for a response. This usually happens if the AI server crashes or the image is too large for the current timeout."
-    except httpx.RemoteProtocolError:
-        error_message = f"API Error: The server at {settings.EXTERNAL_PREDICTOR_API} disconnected without sending a response. Is the AI backend healthy?"
-    except httpx.ConnectError:
-        error_message = f"Connection Failed: Unable to reach {settings.EXTERNAL_PREDICTOR_API}. Is ngrok running?"
-    except httpx.TimeoutException:
-        error_message = "Connection Timed Out: The AI server took too long to respond (60s limit)."
-    except Exception as e:
-        traceback.print_exc()
-        error_message = f"Unexpected Error ({type(e).__name__}): {str(e)}"
-    
+        # Read before predicting: a training run starting meanwhile makes this result stale
+        generation = await prediction_cache.generation(db)
+        # Same image seen before (and no retraining since): skip the upstream round-trip
+        cached = await prediction_cache.lookup(db, content_hash, generation) if settings.PREDICTION_CACHE_ENABLED else None
+        if cached:
+            logger.debug("prediction cache hit", extra={"upload": file.filename, "content_hash": content_hash[:12]})
+            prediction_result = cached.prediction_text
+            confidence = cached.confidence
+            detections = list(cached.detections)
+        else:
+            prediction_result, confidence, error_message, detections = await request_prediction(client, file.filename, Path(upload.path), file.content_type)
+
+        # Kept even when the prediction failed, so the error page can show the image;
+        # unreferenced images are removed by the retention sweep
+        web_image_path = await store_upload(upload)
+    finally:
+        await discard_upload(upload)
+
     # Store in database if successful
     if prediction_result and not error_message:
-        print(f"DEBUG: Attempting to store prediction for {file.filename}")
-        
-        # Save image to static folder for history
-        upload_dir = os.path.join("app", "static", "uploads", "predictions")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        try:
-            with open(file_path, "wb") as f:
-                f.write(content)
-            # Path for web access (relative to static mount)
-            web_image_path = f"static/uploads/predictions/{unique_filename}"
-        except Exception as save_err:
-            print(f"ERROR saving file: {save_err}")
-            web_image_path = None
-
         try:
             new_prediction = Prediction(
                 filename=file.filename,
                 prediction_text=str(prediction_result),
                 confidence=float(confidence),
-                image_path=web_image_path
+                image_path=web_image_path,
+                content_hash=content_hash,
+                model_version=generation,
+                detections=detection_models(detections)
             )
             db.add(new_prediction)
-            db.flush()
-            db.commit()
-            print(f"SUCCESS: Stored prediction for {file.filename} (ID: {new_prediction.id}, Path: {web_image_path}) in database.")
-        except Exception as db_err:
-            db.rollback()
-            print(f"CRITICAL ERROR: Failed to store in database: {str(db_err)}")
-            traceback.print_exc()
+            await update_rollups(db, detections)
+            with span("db_commit"):
+                await db.commit()
+            thumbnail_worker.enqueue([new_prediction.id], web_image_path)
+            if not cached:
+                await prediction_cache.store(content_hash, CachedPrediction(str(prediction_result), float(confidence), web_image_path, tuple(detections)), generation)
+            logger.debug("stored prediction", extra={"prediction_id": new_prediction.id, "upload": file.filename, "key": web_image_path})
+        except Exception:
+            await db.rollback()
+            logger.exception("could not store prediction", extra={"upload": file.filename})
     else:
-        print(f"DEBUG: Skipping storage. Result: {prediction_result}, Error: {error_message}")
-
-    # Convert image to base64 for display
-    image_base64 = base64.b64encode(content).decode('utf-8')
-    image_data_uri = f"data:{file.content_type};base64,{image_base64}"
+        logger.debug("prediction not stored", extra={"upload": file.filename, "result": prediction_result, "error": error_message})
 
+    # The page links to the stored file instead of inlining a base64 copy
     return templates.TemplateResponse("predict.html", {
-        "request": request, 
-        "user": True, 
+        "request": request,
+        "user": True,
         "prediction": str(prediction_result) if prediction_result else None,
         "confidence": float(confidence) if confidence else 0,
         "error": error_message,
-        "image_data": image_data_uri,
+        "image_path": web_image_path,
         "active_page": "predict"
     })
+
+
+@router.post("/predict/jobs", status_code=202)
+async def submit_prediction_job(
+    request: Request,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(current_user)
+):
+    """Accept an image for asynchronous prediction and return right away.
+
+    Poll GET /predict/jobs/{id} (optionally long-polling with ?wait=) or
+    subscribe to /predict/jobs/{id}/events for the result.
+    """
+    # Backpressure: refuse before spooling anything while the workers are behind
+    if not prediction_queue.has_room():
+        raise HTTPException(status_code=503, detail="Prediction queue is full, try again shortly", headers={"Retry-After": "5"})
+
+    upload = await spool_upload(file)
+    try:
+        # The workers read the image back from storage, so it is stored up front
+        web_image_path = await store_upload(upload)
+    finally:
+        await discard_upload(upload)
+
+    job = Prediction(filename=file.filename, image_path=web_image_path, content_hash=upload.content_hash, status=QUEUED)
+    db.add(job)
+    with span("db_commit"):
+        await db.commit()
+    try:
+        prediction_queue.submit(job.id)
+    except QueueFull:
+        # Filled up while the upload was stored; the image is swept by retention
+        await db.execute(delete(Prediction).where(Prediction.id == job.id))
+        await db.commit()
+        raise HTTPException(status_code=503, detail="Prediction queue is full, try again shortly", headers={"Retry-After": "5"})
+
+    status_url = request.url_for("prediction_job_status", job_id=job.id)
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": str(status_url)},
+        content={
+            "id": job.id,
+            "status": QUEUED,
+            "queue_depth": prediction_queue.depth,
+            "status_url": str(status_url),
+            "events_url": str(request.url_for("prediction_job_events", job_id=job.id)),
+        },
+    )
+
+
+async def _load_job(db: AsyncSession, job_id: int) -> Prediction | None:
+    # populate_existing: re-read rows this session has already seen
+    return await db.get(Prediction, job_id, options=[selectinload(Prediction.detections)], populate_existing=True)
+
+
+@router.get("/predict/jobs/{job_id}")
+async def prediction_job_status(
+    job_id: int,
+    wait: float = 0,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(current_user)
+):
+    """Job status, with the result once finished. `wait` long-polls for up to that many seconds."""
+    job = await _load_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Prediction job not found")
+    if job.status not in FINISHED and wait > 0:
+        with prediction_queue.watch(job_id) as watcher:
+            # Subscribed first, then checked again: a job finishing in between isn't missed.
+            # The rollback ends the read transaction so the re-reads see the worker's commit
+            await db.rollback()
+            job = await _load_job(db, job_id)
+            if job is not None and job.status not in FINISHED:
+                await watcher.wait(min(wait, settings.PREDICT_JOB_MAX_WAIT))
+                await db.rollback()
+                job = await _load_job(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Prediction job not found")
+    return job_event(job)
+
+
+@router.get("/predict/jobs/{job_id}/events")
+async def prediction_job_events(
+    request: Request,
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(current_user)
+):
+    """Server-sent events: the job's status on every change, ending once it has finished."""
+    job = await _load_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Prediction job not found")
+
+    event = job_event(job)
+
+    async def event_stream():
+        yield f"event: job\ndata: {json.dumps(event)}\n\n"
+        last_status = event["status"]
+        # Watched for the whole stream, so a notification between two checks isn't lost
+        with prediction_queue.watch(job_id) as watcher:
+            # Checked once straight away: the job may have finished before the watch started
+            finished = True
+            while last_status not in FINISHED and not await request.is_disconnected():
+                # Own short session per check: the request's session is closed once streaming starts
+                async with AsyncSessionLocal() as session:
+                    current = await _load_job(session, job_id)
+                    current = job_event(current) if current is not None else None
+                if current is None:
+                    break
+                if current["status"] != last_status:
+                    last_status = current["status"]
+                    yield f"event: job\ndata: {json.dumps(current)}\n\n"
+                elif not finished:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                if last_status not in FINISHED:
+                    # Woken by the worker that finishes it; the timeout also catches queued -> running
+                    finished = await watcher.wait(timeout=5)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _is_zip(upload: UploadFile) -> bool:
+    return upload.content_type in ("application/zip", "application/x-zip-compressed") or \
+        (upload.filename or "").lower().endswith(".zip")
+
+
+def _extract_zip(path: str, budget: int, into: list[SpooledUpload]) -> int:
+    """Spool the image members of a zip archive, appending them to `into` (blocking).
+
+    Appended as they are written, so the caller can discard them however this ends.
+    Returns the bytes extracted.
+    """
+    extracted = 0
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            # Checked against the declared size before inflating anything; reads stop at that size
+            if extracted + info.file_size > budget:
+                raise HTTPException(status_code=413, detail="Batch exceeds PREDICT_BATCH_MAX_BYTES once uncompressed")
+            with archive.open(info) as member:
+                item = spool_file(member, name, mimetypes.guess_type(name)[0] or "application/octet-stream")
+            into.append(item)
+            extracted += item.size
+    return extracted
+
+
+@router.post("/predict/batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_predictor_client),
+    user: CurrentUser = Depends(current_user)
+):
+    # Every image (zip members included) is spooled to its own file, like /predict: a
+    # batch of up to PREDICT_BATCH_MAX_BYTES is never held in memory
+    items: list[SpooledUpload] = []
+    try:
+        return await _predict_spooled_batch(files, items, db, client)
+    finally:
+        # Stored items were moved into storage already; this drops the rest
+        for item in items:
+            await discard_upload(item)
+
+
+async def _predict_spooled_batch(files: List[UploadFile], items: list[SpooledUpload], db: AsyncSession, client: httpx.AsyncClient):
+    budget = settings.PREDICT_BATCH_MAX_BYTES
+    for upload in files:
+        spooled = await spool_upload(upload)
+        if _is_zip(upload):
+            try:
+                budget -= await run_in_threadpool(_extract_zip, spooled.path, budget, items)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+            finally:
+                await discard_upload(spooled)
+        else:
+            items.append(spooled)
+            budget -= spooled.size
+            if budget < 0:
+                raise HTTPException(status_code=413, detail="Batch exceeds PREDICT_BATCH_MAX_BYTES")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+    if len(items) > settings.PREDICT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.PREDICT_BATCH_MAX_FILES} images per batch")
+
+    # Resolve each distinct image once: from the cache, or from the predictor
+    generation = await prediction_cache.generation(db)
+    outcomes: dict[str, tuple] = {}
+    to_predict: dict[str, SpooledUpload] = {}
+    for item in items:
+        if item.content_hash in outcomes or item.content_hash in to_predict:
+            continue
+        cached = await prediction_cache.lookup(db, item.content_hash, generation) if settings.PREDICTION_CACHE_ENABLED else None
+        if cached:
+            outcomes[item.content_hash] = (cached.prediction_text, cached.confidence, None, list(cached.detections), True)
+        else:
+            to_predict[item.content_hash] = item
+
+    semaphore = asyncio.Semaphore(settings.PREDICT_BATCH_CONCURRENCY)
+
+    async def run_one(item: SpooledUpload):
+        async with semaphore:
+            prediction_result, confidence, error_message, detections = await request_prediction(client, item.filename, Path(item.path), item.content_type)
+        outcomes[item.content_hash] = (prediction_result, confidence, error_message, detections, False)
+
+    await asyncio.gather(*(run_one(item) for item in to_predict.values()))
+
+    # Only images with a result are kept; written a few at a time rather than one after another
+    store_slots = asyncio.Semaphore(settings.PREDICT_BATCH_STORE_CONCURRENCY)
+
+    async def store_one(item: SpooledUpload) -> str | None:
+        prediction_result, _, error_message, _, _ = outcomes[item.content_hash]
+        if not prediction_result or error_message:
+            return None
+        async with store_slots:
+            return await store_upload(item)
+
+    image_paths = await asyncio.gather(*(store_one(item) for item in items))
+
+    results = []
+    rows = []
+    stored_detections = []
+    for item, web_image_path in zip(items, image_paths):
+        filename, content_hash = item.filename, item.content_hash
+        prediction_result, confidence, error_message, detections, from_cache = outcomes[content_hash]
+        succeeded = bool(prediction_result) and not error_message
+        if succeeded:
+            rows.append(Prediction(
+                filename=filename,
+                prediction_text=str(prediction_result),
+                confidence=float(confidence),
+                image_path=web_image_path,
+                content_hash=content_hash,
+                model_version=generation,
+                detections=detection_models(detections),
+            ))
+            stored_detections.extend(detections)
+        results.append({
+            "filename": filename,
+            "prediction": str(prediction_result) if succeeded else None,
+            "confidence": float(confidence) if succeeded else 0,
+            "cached": from_cache,
+            "image_path": web_image_path,
+            "image_url": media_url(web_image_path) or None,
+            "error": error_message,
+        })
+
+    if rows:
+        try:
+            # One flush for the whole batch: detection rows need the new prediction ids,
+            # then the day's rollup gets a single upsert
+            db.add_all(rows)
+            await update_rollups(db, stored_detections)
+            with span("db_commit"):
+                await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.exception("could not store prediction batch", extra={"images": len(items)})
+            raise HTTPException(status_code=500, detail="Failed to store batch results")
+
+        by_image: dict[str, list[int]] = {}
+        for row in rows:
+            by_image.setdefault(row.image_path, []).append(row.id)
+        for image_path, ids in by_image.items():
+            thumbnail_worker.enqueue(ids, image_path)
+
+        for row in rows:
+            await prediction_cache.store(row.content_hash, CachedPrediction(
+                row.prediction_text, row.confidence, row.image_path, tuple(outcomes[row.content_hash][3])
+            ), generation)
+
+    logger.info("prediction batch", extra={"images": len(items), "stored": len(rows), "upstream_calls": len(to_predict)})
+    return {
+        "total": len(results),
+        "succeeded": len(rows),
+        "failed": len(results) - len(rows),
+        "results": results,
+    }
+
+
+def _sample_interval(fps: float | None) -> float:
+    fps = min(fps or settings.STREAM_SAMPLE_FPS, settings.STREAM_MAX_SAMPLE_FPS)
+    return 1 / fps if fps > 0 else 0.0
+
+
+def _is_end(text: str | None) -> bool:
+    try:
+        return json.loads(text or "null") == {"type": "end"}
+    except ValueError:
+        return False
+
+
+@router.websocket("/predict/stream")
+async def predict_stream(
+    websocket: WebSocket,
+    fps: float | None = Query(default=None, gt=0),
+    name: str = Query(default="stream", max_length=50, pattern=r"^[\w.-]+$"),
+    content_type: str = Query(default="image/jpeg", pattern=r"^image/[\w.+-]+$"),
+    client: httpx.AsyncClient = Depends(get_predictor_client),
+    user: CurrentUser = Depends(websocket_user)
+):
+    """Live frames in, detections out.
+
+    Each binary message is one encoded frame (`content_type`). Results come
+    back as JSON text messages as they are ready; see app/core/streams.py for
+    which frames reach the predictor and which results are stored. Sending
+    {"type": "end"} waits for the last results and answers with a summary.
+    """
+    if not stream_limit.try_acquire():
+        raise WebSocketException(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too many streams, try again shortly")
+    try:
+        await websocket.accept()
+        send_lock = asyncio.Lock()
+
+        async def emit(message: dict):
+            try:
+                async with send_lock:
+                    await websocket.send_json(message)
+            except (WebSocketDisconnect, RuntimeError):
+                # Client gone; changed results are stored regardless
+                pass
+
+        with trace():
+            stream = FrameStream(client, emit, name=name, content_type=content_type, sample_interval=_sample_interval(fps))
+            ended = False
+            try:
+                while not ended:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        break
+                    if message.get("bytes") is not None:
+                        if len(message["bytes"]) > settings.STREAM_MAX_FRAME_BYTES:
+                            await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG, reason="Frame is too large")
+                            break
+                        await stream.offer(message["bytes"], time.monotonic())
+                    else:
+                        ended = _is_end(message.get("text"))
+                await stream.drain()
+                if ended:
+                    await emit({"type": "summary", **stream.summary()})
+                    await websocket.close()
+            finally:
+                stream.close()
+                logger.info("frame stream closed", extra=stream.summary())
+    finally:
+        stream_limit.release()
+
+
+@router.post("/predict/stream/video")
+async def predict_video(
+    file: UploadFile = File(...),
+    fps: float | None = Query(default=None, gt=0),
+    client: httpx.AsyncClient = Depends(get_predictor_client),
+    user: CurrentUser = Depends(current_user)
+):
+    """Sample a video file and predict its frames like a live stream.
+
+    The answer is newline-delimited JSON: the result of each predicted frame
+    as it is ready, then a summary.
+    """
+    if not video_available():
+        raise HTTPException(status_code=501, detail="Video uploads need PyAV and Pillow (pip install av pillow)")
+    if not stream_limit.try_acquire():
+        raise HTTPException(status_code=503, detail="Too many streams, try again shortly", headers={"Retry-After": str(settings.PREDICT_OVERLOAD_RETRY_AFTER)})
+
+    upload = None
+    released = False
+
+    async def release():
+        # Once, from whichever runs first: a failed setup, the stream's end or the response's background task
+        nonlocal released
+        if released:
+            return
+        released = True
+        if upload is not None:
+            await discard_upload(upload)
+        stream_limit.release()
+
+    try:
+        upload = await spool_upload(file)
+        try:
+            await run_in_threadpool(probe_video, upload.path)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{file.filename} is not a readable video")
+    except BaseException:
+        await release()
+        raise
+
+    name = re.sub(r"[^\w.-]", "_", os.path.splitext(file.filename or "")[0])[:50] or "video"
+
+    async def results():
+        outgoing: asyncio.Queue = asyncio.Queue()
+        # Frames are sampled by the decoder, on the video's own clock
+        stream = FrameStream(client, outgoing.put, name=name)
+
+        async def feed():
+            try:
+                async for content, timestamp in video_frames(upload.path, _sample_interval(fps)):
+                    await stream.offer(content, timestamp, wait=True)
+                await stream.drain()
+            finally:
+                await outgoing.put(None)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while (message := await outgoing.get()) is not None:
+                yield json.dumps(message) + "\n"
+            await feeder
+            yield json.dumps({"type": "summary", **stream.summary()}) + "\n"
+        finally:
+            feeder.cancel()
+            stream.close()
+            await release()
+            logger.info("video stream finished", extra={"upload": file.filename, **stream.summary()})
+
+    body = results()
+
+    async def cleanup():
+        # Starlette doesn't close the body when the client goes away, before or during the stream
+        await body.aclose()
+        await release()
+
+    return StreamingResponse(body, media_type="application/x-ndjson", background=BackgroundTask(cleanup))
+
+
+@router.get("/predict/cache/stats")
+async def prediction_cache_stats(user: CurrentUser = Depends(current_user)):
+    return await prediction_cache.stats()
+
+
+@router.get("/predict/backends")
+async def predictor_backend_stats(user: CurrentUser = Depends(current_user)):
+    stats = predictor_pool.stats()
+    adapters = response_adapters.selected()
+    for backend in stats["backends"]:
+        backend["response_adapter"] = adapters.get(backend["url"])
+    return stats
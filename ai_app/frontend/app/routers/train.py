@@ -1,56 +1,41 @@
-from fastapi import APIRouter, Request, Form, Depends, Cookie, status, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Request, Form, Depends, status, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth import CurrentUser, current_user, page_user
 from app.db.database import get_db
 from app.db.models import TrainingJob
+from app.core.http import get_training_client
+from app.core.resilience import training_upstream
+from app.core.cache import prediction_cache
+from app.core.training_tracker import training_tracker, job_event
+from app.core.remote_config import remote_config_cache, config_fingerprint
+from app.core.templates import templates
+import asyncio
 import json
+import logging
 import httpx
-import traceback
 
 router = APIRouter(tags=["train"])
-templates = Jinja2Templates(directory="app/templates")
+logger = logging.getLogger(__name__)
 
 @router.get("/train")
 async def train_redirect():
     return RedirectResponse(url="/train/get/config")
 
 @router.get("/train/get/config", response_class=HTMLResponse)
-async def train_view(request: Request, db: Session = Depends(get_db), user_id: str | None = Cookie(default=None)):
-    if not user_id:
-        return RedirectResponse(url="/login")
-    
-    # Get latest config from DB (fallback)
-    config = db.query(TrainingJob).order_by(TrainingJob.id.desc()).first()
+async def train_view(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_training_client),
+    user: CurrentUser = Depends(page_user)
+):
+    # Last known config straight from the DB; never wait on the remote service here
+    config = await db.scalar(select(TrainingJob).order_by(TrainingJob.id.desc()).limit(1))
     
-    # Try to fetch latest config from external API
-    from app.core.config import settings
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(settings.TRAIN_CONFIG_URL, timeout=10.0)
-            if response.status_code == 200:
-                remote_config = response.json()
-                # If we have remote config, we could update our local DB or just pass it to template
-                # For now, let's just make sure we use the remote data if available
-                # Assuming remote_config has similar structure
-                if isinstance(remote_config, dict) and "epochs" in remote_config:
-                    # Update or create local record to sync
-                    new_config = TrainingJob(
-                        epochs=remote_config.get("epochs", 50),
-                        batch_size=remote_config.get("batch_size", 32),
-                        learning_rate=str(remote_config.get("learning_rate", "0.0001")),
-                        model_name=remote_config.get("model_name", "yolo12").lower(),
-                        classes=remote_config.get("classes", 1),
-                        augmentation=remote_config.get("augmentation", True),
-                        status="synced"
-                    )
-                    db.add(new_config)
-                    db.commit()
-                    db.refresh(new_config)
-                    config = new_config
-    except Exception as e:
-        print(f"Error fetching remote config: {e}")
+    # Refresh from the external API in the background once the cached copy is stale
+    remote_config_cache.revalidate(client)
 
     return templates.TemplateResponse("train_view.html", {
         "request": request, 
@@ -60,11 +45,8 @@ async def train_view(request: Request, db: Session = Depends(get_db), user_id: s
     })
 
 @router.get("/train/update/config", response_class=HTMLResponse)
-async def train_update_page(request: Request, db: Session = Depends(get_db), user_id: str | None = Cookie(default=None)):
-    if not user_id:
-        return RedirectResponse(url="/login")
-    
-    config = db.query(TrainingJob).order_by(TrainingJob.id.desc()).first()
+async def train_update_page(request: Request, db: AsyncSession = Depends(get_db), user: CurrentUser = Depends(page_user)):
+    config = await db.scalar(select(TrainingJob).order_by(TrainingJob.id.desc()).limit(1))
     
     return templates.TemplateResponse("train_update.html", {
         "request": request, 
@@ -82,12 +64,10 @@ async def save_training_config(
     model_name: str = Form(...),
     classes: int = Form(...),
     augmentation: str = Form("true"), # Accepting string from dropdown
-    db: Session = Depends(get_db),
-    user_id: str | None = Cookie(default=None)
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_training_client),
+    user: CurrentUser = Depends(page_user)
 ):
-    if not user_id:
-        return RedirectResponse(url="/login")
-    
     # Convert string "true"/"false" to actual boolean
     is_augmented = augmentation.lower() == "true"
     
@@ -101,76 +81,126 @@ async def save_training_config(
         augmentation=is_augmented,
         status="configured"
     )
+    new_job.config_fingerprint = config_fingerprint({
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "learning_rate": learning_rate,
+        "model_name": model_name,
+        "classes": classes,
+        "augmentation": is_augmented
+    })
     db.add(new_job)
-    db.commit()
-    db.refresh(new_job)
+    await db.commit()
+    await db.refresh(new_job)
     
     # Sync with external API using the specific "update config" URL
     from app.core.config import settings
-    print(f"Syncing with external API: {settings.UPDATE_CONFIG_URL}")
-    
     try:
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "epochs": epochs,
-                "batch_size": batch_size,
-                "learning_rate": learning_rate,
-                "model_name": model_name,
-                "classes": classes,
-                "augmentation": is_augmented
-            }
-            response = await client.post(settings.UPDATE_CONFIG_URL, json=payload, timeout=10.0)
-            print(f"External API response: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"Failed to sync config with external API: {e}")
-        traceback.print_exc()
+        payload = {
+            "epochs": epochs,
+            "batch_size": batch_size,
+            "learning_rate": learning_rate,
+            "model_name": model_name,
+            "classes": classes,
+            "augmentation": is_augmented
+        }
+        # Setting the same config twice is harmless, so this one may be retried
+        response = await training_upstream.call(lambda url: client.post(url, json=payload), [settings.UPDATE_CONFIG_URL])
+        # The body is only needed when debugging the training service, and can be large
+        logger.info("training config synced", extra={"status": response.status_code})
+        logger.debug("training config sync response", extra={"body": response.text[:500]})
+        if response.status_code in [200, 201, 202]:
+            # The remote now holds this config; don't record it again as "synced"
+            await remote_config_cache.remember(new_job.config_fingerprint)
+    except Exception:
+        logger.exception("could not sync training config", extra={"url": settings.UPDATE_CONFIG_URL})
 
     # Redirect with "adjusted=true" flag to show success message and training prompt
     return RedirectResponse(url="/train/get/config?adjusted=true", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/train/start")
-async def start_training_process(db: Session = Depends(get_db), user_id: str | None = Cookie(default=None)):
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
+async def start_training_process(
+    db: AsyncSession = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_training_client),
+    user: CurrentUser = Depends(current_user)
+):
     # Get latest config to send to training API
-    config = db.query(TrainingJob).order_by(TrainingJob.id.desc()).first()
+    config = await db.scalar(select(TrainingJob).order_by(TrainingJob.id.desc()).limit(1))
     
     from app.core.config import settings
-    print(f"Triggering training at: {settings.START_TRAINING_URL}")
-    
     success = False
     error_msg = None
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Prepare payload from config
-            payload = {}
-            if config:
-                payload = {
-                    "epochs": config.epochs,
-                    "batch_size": config.batch_size,
-                    "learning_rate": config.learning_rate,
-                    "model_name": config.model_name,
-                    "classes": config.classes,
-                    "augmentation": config.augmentation
-                }
-            
-            response = await client.post(settings.START_TRAINING_URL, json=payload, timeout=30.0)
-            print(f"Training start response: {response.status_code} - {response.text}")
-            if response.status_code in [200, 201, 202]:
-                success = True
-            else:
-                error_msg = f"API Error: {response.status_code}"
+        # Prepare payload from config
+        payload = {}
+        if config:
+            payload = {
+                "epochs": config.epochs,
+                "batch_size": config.batch_size,
+                "learning_rate": config.learning_rate,
+                "model_name": config.model_name,
+                "classes": config.classes,
+                "augmentation": config.augmentation
+            }
+        
+        # Never retried: a duplicate request could start a second run
+        response = await training_upstream.call(
+            lambda url: client.post(url, json=payload, timeout=settings.START_TRAINING_TIMEOUT),
+            [settings.START_TRAINING_URL],
+            retry=False,
+        )
+        logger.info("training start requested", extra={"status": response.status_code})
+        logger.debug("training start response", extra={"body": response.text[:500]})
+        if response.status_code in [200, 201, 202]:
+            success = True
+        else:
+            error_msg = f"API Error: {response.status_code}"
     except Exception as e:
-        print(f"Failed to trigger training: {e}")
-        traceback.print_exc()
+        logger.exception("could not start training", extra={"url": settings.START_TRAINING_URL})
         error_msg = str(e)
     
     # Update status to training if successful
     if success and config:
         config.status = "training"
-        db.commit()
+        # Results from the previous model must not be served any more
+        generation = config.model_version = await prediction_cache.next_generation(db)
+        await db.commit()
+        await prediction_cache.activate(generation)
+        await training_tracker.notify()
         return {"status": "started", "message": "Training is start wait"}
     else:
         return {"status": "error", "message": error_msg or "Could not start training"}
+
+
+@router.get("/train/status")
+async def training_status(db: AsyncSession = Depends(get_db), user: CurrentUser = Depends(current_user)):
+    # Read-only: the tracker keeps this row up to date in the background
+    job = await db.scalar(
+        select(TrainingJob)
+        .where(TrainingJob.status.in_(["training", "completed", "failed"]))
+        .order_by(TrainingJob.id.desc())
+        .limit(1)
+    )
+    return job_event(job) if job else {"status": "none"}
+
+@router.get("/train/events")
+async def training_events(request: Request, user: CurrentUser = Depends(current_user)):
+    async def event_stream():
+        queue = training_tracker.subscribe()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield f"event: training\ndata: {json.dumps(event)}\n\n"
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+        finally:
+            training_tracker.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,147 @@
+"""A scanner script flooding /predict next to a regular user, admission control off vs on.
+
+    python -m benchmarks.bench_admission --scanner-concurrency 64 --scanner-kb 2048 --duration 15
+
+For each mode a server is started with `python manage.py serve` on a free port
+(database from .env, migrated) and a stub predictor. A "scanner" user uploads
+as fast as --scanner-concurrency connections allow while the regular user
+uploads one image every --user-interval seconds. The table shows the regular
+user's latency, how many scanner uploads were served or refused, and the
+server's peak RSS. Refusals include uploads cut off by the server closing the
+connection after an early 429/503/413, which is how they look to a client
+still sending the body. The scanner account is created with `manage.py create-user`
+if it doesn't exist.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import common
+from benchmarks.bench_workers import wait_until_up
+from benchmarks.load_test import login
+from benchmarks.stub_server import StubServer, _free_port, create_stub_app
+
+MODES = {
+    "off": {"PREDICT_RATE_LIMIT": "0", "PREDICT_MAX_IN_FLIGHT": "0", "PREDICT_MAX_UPLOAD_BYTES": str(1 << 40)},
+    "on": {},
+}
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def drive(url: str, args) -> dict:
+    scanner_image = b"\xff\xd8\xff" + os.urandom(args.scanner_kb * 1024)
+    user_image = b"\xff\xd8\xff" + os.urandom(64 * 1024)
+    deadline = time.perf_counter() + args.duration
+    scanner_codes: dict[int, int] = {}
+    user_latencies, user_errors = [], 0
+
+    limits = httpx.Limits(max_connections=args.scanner_concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as scanner, \
+            httpx.AsyncClient(base_url=url, timeout=120.0) as user:
+        await login(scanner, args.scanner_username, args.scanner_password)
+        await login(user, args.username, args.password)
+
+        async def scan(worker: int):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                try:
+                    response = await scanner.post("/predict", files={"file": (f"scan-{worker}-{i}.jpg", scanner_image, "image/jpeg")})
+                    code = response.status_code
+                except httpx.HTTPError:
+                    code = 0
+                scanner_codes[code] = scanner_codes.get(code, 0) + 1
+
+        async def browse():
+            nonlocal user_errors
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await user.post("/predict", files={"file": (f"user-{i}.jpg", user_image, "image/jpeg")})
+                    if response.status_code >= 400:
+                        user_errors += 1
+                except httpx.HTTPError:
+                    user_errors += 1
+                user_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(args.user_interval)
+
+        started = time.perf_counter()
+        await asyncio.gather(browse(), *(scan(w) for w in range(args.scanner_concurrency)))
+        elapsed = time.perf_counter() - started
+
+    summary = common.summarize(user_latencies, elapsed)
+    return {
+        "user_p50_ms": summary["p50_ms"],
+        "user_p95_ms": summary["p95_ms"],
+        "user_errors": user_errors,
+        "scanner_served": scanner_codes.get(200, 0),
+        "scanner_refused": sum(n for code, n in scanner_codes.items() if code in (0, 413, 429, 503)),
+        "scanner_other": sum(n for code, n in scanner_codes.items() if code not in (0, 200, 413, 429, 503)),
+    }
+
+
+def run_mode(mode: str, args, env: dict) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    # One worker runs inside the serve process, so its RSS is the server's
+    process = subprocess.Popen(
+        [sys.executable, "manage.py", "serve", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**env, **MODES[mode]},
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(url, process)
+        result = asyncio.run(drive(url, args))
+        rss = peak_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"admission": mode, **result, "peak_rss_mb": rss}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--scanner-concurrency", type=int, default=64)
+    parser.add_argument("--scanner-kb", type=int, default=2048, help="size of each scanner upload")
+    parser.add_argument("--user-interval", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub predictor latency (s)")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--scanner-username", default="scanner")
+    parser.add_argument("--scanner-password", default="scanner123")
+    args = parser.parse_args()
+
+    # Servers read the database settings from .env, not the placeholders from benchmarks.common
+    env = {key: value for key, value in os.environ.items() if key not in common.PLACEHOLDER_KEYS}
+    subprocess.run([sys.executable, "manage.py", "create-user", args.scanner_username, "--password", args.scanner_password],
+                   env=env, stdout=subprocess.DEVNULL)
+
+    with StubServer(create_stub_app(latency=args.latency)) as stub:
+        env["EXTERNAL_PREDICTOR_API"] = stub.url + "/predict"
+        env["PREDICTOR_HEALTH_INTERVAL"] = "0"
+        # Every scanner upload is a new image, so the prediction cache doesn't hide the load
+        rows = [run_mode(mode, args, env) for mode in args.modes]
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Predictor load balancing across several stub predictors with different latencies.
+
+    python -m benchmarks.bench_balancer --duration 5 --concurrency 16
+
+Three local stubs stand in for GPU boxes of different speed (20, 50 and 150 ms
+per call, two at a time, the rest queue). The "balance" runs compare one backend
+against all three under each PREDICTOR_BALANCING strategy; `calls` shows how the
+requests were split. The "health" runs hang the fastest backend for the middle
+third of the run, with active health checks off vs on; `to_down` counts calls
+sent to it while it hung.
+"""
+import argparse
+import asyncio
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from benchmarks import common
+from benchmarks.stub_server import StubServer, create_stub_app
+from app.core.config import settings
+from app.core import resilience
+from app.core.balancer import predictor_pool
+from app.core.predictor import request_prediction
+
+PAYLOAD = b"\xff\xd8\xff" + b"\x00" * 16 * 1024
+LATENCIES = (0.02, 0.05, 0.15)
+
+
+def configure(urls: list[str], **overrides):
+    settings.EXTERNAL_PREDICTOR_API = urls[0]
+    settings.PREDICTOR_REPLICAS = urls[1:]
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    # Fresh latency history, health state, breakers and budget for every run
+    predictor_pool.backends.clear()
+    resilience.predictor_upstream.breakers.clear()
+    resilience.predictor_upstream.budget = resilience.RetryBudget()
+
+
+async def drive(client: httpx.AsyncClient, duration: float, concurrency: int) -> dict:
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    async def loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            _, _, error, _ = await request_prediction(client, "bench.jpg", PAYLOAD, "image/jpeg")
+            latencies.append(time.perf_counter() - start)
+            if error:
+                errors.append(error)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    stats = common.summarize(latencies, time.perf_counter() - started)
+    return {"rps": stats["rps"], "failed": len(errors), "p50_ms": stats["p50_ms"], "p99_ms": stats["p99_ms"]}
+
+
+@contextmanager
+def stub_predictors():
+    apps = [create_stub_app(latency=latency, capacity=2) for latency in LATENCIES]
+    servers = [StubServer(stub_app).start() for stub_app in apps]
+    try:
+        yield apps, [server.url + "/predict" for server in servers]
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def split(apps) -> str:
+    return "/".join(str(a.state.calls["predict"]) for a in apps)
+
+
+async def run(duration: float, concurrency: int) -> list[dict]:
+    rows = []
+    async with httpx.AsyncClient(timeout=httpx.Timeout(2.0), limits=httpx.Limits(max_connections=200)) as client:
+        for mode, strategy in (("single", "ewma"), ("least_outstanding", "least_outstanding"), ("ewma", "ewma")):
+            with stub_predictors() as (apps, urls):
+                configure(urls[:1] if mode == "single" else urls, PREDICTOR_BALANCING=strategy)
+                stats = await drive(client, duration, concurrency)
+                rows.append({"scenario": "balance", "mode": mode, **stats, "calls": split(apps), "to_down": "-"})
+
+        for mode, interval in (("no_health_checks", 0.0), ("health_checks", 0.2)):
+            with stub_predictors() as (apps, urls):
+                configure(urls, PREDICTOR_BALANCING="ewma", PREDICTOR_HEALTH_INTERVAL=interval, PREDICTOR_HEALTH_TIMEOUT=0.2)
+                predictor_pool.start(client)
+                down = apps[0].state
+
+                async def outage():
+                    await asyncio.sleep(duration / 3)
+                    down.faults["latency"] = 60.0
+                    calls_at_down = down.calls["predict"]
+                    await asyncio.sleep(duration / 3)
+                    down.faults["latency"] = LATENCIES[0]
+                    return down.calls["predict"] - calls_at_down
+
+                stats, to_down = await asyncio.gather(drive(client, duration, concurrency), outage())
+                await predictor_pool.stop()
+                rows.append({"scenario": "health", "mode": mode, **stats, "calls": split(apps), "to_down": to_down})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    common.print_table(asyncio.run(run(args.duration, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Pooled vs per-request httpx clients against a local stub predictor.
+
+    python -m benchmarks.bench_http_pool --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks import common
+from benchmarks.stub_server import StubServer, create_stub_app
+from app.core.http import HTTPClientRegistry, PREDICTOR
+from app.core.config import settings
+
+PAYLOAD = b"\xff\xd8\xff" + b"\x00" * 64 * 1024  # 64 KB fake JPEG
+
+
+async def _drive(n_requests: int, concurrency: int, send) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send()
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return common.summarize(latencies, time.perf_counter() - started)
+
+
+async def run(url: str, n_requests: int, concurrency: int) -> list[dict]:
+    files = lambda: {"file": ("shelf.jpg", PAYLOAD, "image/jpeg")}
+
+    async def per_request():
+        async with httpx.AsyncClient() as client:
+            return await client.post(url, files=files(), timeout=settings.PREDICTOR_TIMEOUT)
+
+    registry = HTTPClientRegistry()
+    pooled_client = registry.register(
+        PREDICTOR,
+        timeout=settings.PREDICTOR_TIMEOUT,
+        max_connections=settings.PREDICTOR_MAX_CONNECTIONS,
+        max_keepalive=settings.PREDICTOR_MAX_KEEPALIVE,
+    )
+
+    async def pooled():
+        return await pooled_client.post(url, files=files())
+
+    rows = []
+    try:
+        for name, send in (("per-request", per_request), ("pooled", pooled)):
+            await _drive(min(20, n_requests), concurrency, send)  # warm-up
+            rows.append({"client": name, **await _drive(n_requests, concurrency, send)})
+    finally:
+        await registry.aclose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub predictor latency in seconds")
+    args = parser.parse_args()
+
+    with StubServer(create_stub_app(latency=args.latency)) as stub:
+        rows = asyncio.run(run(f"{stub.url}/predict", args.requests, args.concurrency))
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Event-loop cost of logging when stdout is slow: print() vs a StreamHandler vs the queue pipeline.
+
+    python -m benchmarks.bench_logging --tasks 50 --records 200 --drain-kbps 512
+
+Each mode runs in a child process whose stdout is a pipe read at
+--drain-kbps (a slow terminal, log shipper or container runtime). --tasks
+coroutines each log --records lines with a short sleep in between, while a
+ticker measures how late the event loop wakes it up. `print` and
+`stream_handler` write on the event loop and stall it once the pipe is full;
+`queue` is app.core.logging_config.setup_logging, which formats and writes on
+a background thread and drops records when its queue is full.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks import common
+
+MODES = ("print", "stream_handler", "queue")
+
+CHILD = """
+import asyncio, json, logging, sys, time
+mode, tasks, records = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+if mode == "queue":
+    from app.core.logging_config import setup_logging, shutdown_logging, NonBlockingQueueHandler
+    setup_logging()
+elif mode == "stream_handler":
+    from app.core.logging_config import ContextFilter, JsonFormatter
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(ContextFilter())
+    logging.getLogger("app").addHandler(handler)
+    logging.getLogger("app").setLevel(logging.INFO)
+    logging.getLogger("app").propagate = False
+logger = logging.getLogger("app.bench")
+
+async def producer(n):
+    for i in range(records):
+        if mode == "print":
+            print(f"INFO: stored prediction {n}-{i} for upload-{i}.jpg in 12.5 ms")
+        else:
+            logger.info("stored prediction", extra={"prediction_id": n * records + i, "upload": f"upload-{i}.jpg", "duration_ms": 12.5})
+        await asyncio.sleep(0.001)
+
+async def main():
+    lags = []
+    done = False
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(n) for n in range(tasks)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, sorted(lags)
+
+elapsed, lags = asyncio.run(main())
+dropped = 0
+if mode == "queue":
+    dropped = NonBlockingQueueHandler.dropped
+result = {"elapsed": elapsed, "lag_p50": lags[len(lags) // 2], "lag_p99": lags[int(len(lags) * 0.99)], "lag_max": lags[-1], "dropped": dropped}
+sys.stderr.write("BENCH " + json.dumps(result) + "\\n")
+sys.stderr.flush()
+if mode == "queue":
+    shutdown_logging()
+"""
+
+
+def drain(pipe, kbps: int):
+    # Read slowly, like a terminal or shipper that can't keep up
+    chunk = 4096
+    delay = chunk / (kbps * 1024)
+    while pipe.read(chunk):
+        time.sleep(delay)
+
+
+def run_mode(mode: str, args) -> dict:
+    env = {**os.environ, "LOG_QUEUE_SIZE": str(args.queue_size)}
+    process = subprocess.Popen(
+        [sys.executable, "-c", CHILD, mode, str(args.tasks), str(args.records)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+    )
+    reader = threading.Thread(target=drain, args=(process.stdout, args.drain_kbps), daemon=True)
+    reader.start()
+    stderr = process.stderr.read().decode()
+    process.wait()
+    line = next((l for l in stderr.splitlines() if l.startswith("BENCH ")), None)
+    if line is None:
+        raise SystemExit(f"{mode} failed: {(stderr.strip().splitlines() or ['?'])[-1]}")
+    result = json.loads(line[len("BENCH "):])
+    return {
+        "mode": mode,
+        "elapsed_s": round(result["elapsed"], 2),
+        "loop_lag_p50_ms": round(result["lag_p50"] * 1000, 2),
+        "loop_lag_p99_ms": round(result["lag_p99"] * 1000, 2),
+        "loop_lag_max_ms": round(result["lag_max"] * 1000, 2),
+        "dropped": result["dropped"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--records", type=int, default=200, help="records per task")
+    parser.add_argument("--drain-kbps", type=int, default=512, help="how fast the reader empties stdout")
+    parser.add_argument("--queue-size", type=int, default=10000, help="LOG_QUEUE_SIZE for the queue mode")
+    args = parser.parse_args()
+    common.print_table([run_mode(mode, args) for mode in args.modes])
+
+
+if __name__ == "__main__":
+    main()
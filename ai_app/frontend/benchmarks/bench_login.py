@@ -0,0 +1,95 @@
+"""Login throughput/tail latency while predictions run concurrently.
+
+    uvicorn app.main:app --port 8000            # in another shell
+    python -m benchmarks.bench_login --url http://127.0.0.1:8000 --logins 20 --predictors 10
+
+Prints three rows: predictions alone, logins alone, and both together. With
+hashing on the event loop, prediction latency balloons in the combined row.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks import common
+from benchmarks.load_test import login
+
+
+async def _loop(deadline: float, latencies: list, errors: list, send):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await send()
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(url: str, n_logins: int, n_predictors: int, duration: float, username: str, password: str) -> list[dict]:
+    image = b"\xff\xd8\xff" + os.urandom(16 * 1024)
+    async with httpx.AsyncClient(base_url=url, timeout=120.0) as predict_client, \
+            httpx.AsyncClient(base_url=url, timeout=120.0) as login_client:
+        await login(predict_client, username, password)
+
+        async def do_login():
+            # Fresh cookie jar each time: every request is a full password check
+            login_client.cookies.clear()
+            return await login_client.post("/auth/login", data={"username": username, "password": password})
+
+        counter = 0
+
+        async def do_predict():
+            nonlocal counter
+            counter += 1
+            # Unique bytes per request so the prediction cache never short-circuits
+            payload = image + counter.to_bytes(8, "big")
+            return await predict_client.post("/predict", files={"file": ("bench.jpg", payload, "image/jpeg")})
+
+        rows = []
+        for label, logins, predictors in (
+            ("predict only", 0, n_predictors),
+            ("login only", n_logins, 0),
+            ("login + predict", n_logins, n_predictors),
+        ):
+            login_lat, predict_lat, errors = [], [], []
+            deadline = time.perf_counter() + duration
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(_loop(deadline, login_lat, errors, do_login) for _ in range(logins)),
+                *(_loop(deadline, predict_lat, errors, do_predict) for _ in range(predictors)),
+            )
+            elapsed = time.perf_counter() - started
+            login_stats = common.summarize(login_lat, elapsed)
+            predict_stats = common.summarize(predict_lat, elapsed)
+            rows.append({
+                "mode": label,
+                "login_rps": login_stats["rps"],
+                "login_p50_ms": login_stats["p50_ms"],
+                "login_p99_ms": login_stats["p99_ms"],
+                "predict_rps": predict_stats["rps"],
+                "predict_p50_ms": predict_stats["p50_ms"],
+                "predict_p99_ms": predict_stats["p99_ms"],
+                "errors": len(errors),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=20, help="concurrent login clients")
+    parser.add_argument("--predictors", type=int, default=10, help="concurrent /predict clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    common.print_table(asyncio.run(run(args.url, args.logins, args.predictors, args.duration, args.username, args.password)))
+
+
+if __name__ == "__main__":
+    main()
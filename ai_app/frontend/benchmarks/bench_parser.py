@@ -0,0 +1,123 @@
+"""Predictor response parsing: the original lookup chain vs the per-backend adapters.
+
+    python -m benchmarks.bench_parser --number 20000
+
+Each recorded response in benchmarks/fixtures/ is parsed --number times by both
+parsers (no network). `legacy_us`/`adapter_us` are microseconds per call, and
+`same` checks both return the same (prediction, confidence, error, detections).
+string.json differs on purpose: the old chain called `.get` on the bare string and
+fell through to the raw-text fallback, so the label kept its JSON quotes.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import common
+from app.core.config import settings
+from app.core.detections import detection
+from app.core.predictor import parse_prediction_response
+
+FIXTURES = Path(__file__).parent / "fixtures"
+ENDPOINT = "http://predictor.bench/predict"
+
+
+def legacy_parse(response: httpx.Response):
+    """parse_prediction_response before the adapters, kept verbatim for comparison."""
+    prediction_result = None
+    confidence = 0
+    error_message = None
+    detections = []
+
+    if response.status_code != 200:
+        return None, 0, f"Remote API Error (Status {response.status_code}): {response.text[:200]}", []
+
+    try:
+        data = response.json()
+        predictions = data.get("predictions")
+        if predictions and isinstance(predictions, list) and len(predictions) > 0:
+            primary = predictions[0]
+            detections = []
+            for item in predictions:
+                if not isinstance(item, dict):
+                    continue
+                class_name = item.get("class_name") or item.get("label") or item.get("prediction")
+                if class_name:
+                    detections.append(detection(class_name, item.get("confidence"), item.get("bbox") or item.get("box")))
+            prediction_result = primary.get("class_name") or primary.get("label") or primary.get("prediction")
+            confidence = primary.get("confidence") or 0.99
+
+            if len(predictions) > 1:
+                all_classes = [p.get("class_name") or p.get("label") for p in predictions if p.get("class_name") or p.get("label")]
+                prediction_result = ", ".join(all_classes)
+
+        if not prediction_result:
+            prediction_result = data.get("prediction") or data.get("label") or data.get("result") or data.get("class")
+
+        if not prediction_result:
+            if isinstance(data, str):
+                prediction_result = data
+            elif isinstance(data, dict) and len(data) == 1:
+                prediction_result = list(data.values())[0]
+
+        if prediction_result:
+            if not confidence:
+                confidence = data.get("confidence") or data.get("score") or 0.99
+            if not detections:
+                detections = [detection(prediction_result, confidence)]
+        else:
+            error_message = f"Connected! But couldn't find a 'prediction' key in the response. Received: {json.dumps(data)}"
+    except Exception as parse_err:
+        text_resp = response.text.strip()
+        if text_resp and len(text_resp) < 50:
+            prediction_result = text_resp
+            detections = [detection(text_resp)]
+        else:
+            error_message = f"Received non-JSON response or Parse Error: {str(parse_err)} | Text: {text_resp[:100]}"
+
+    return prediction_result, confidence, error_message, detections
+
+
+def per_call_us(parse, body: bytes, number: int) -> float:
+    request = httpx.Request("POST", ENDPOINT)
+    # A fresh Response per call: httpx caches the decoded text on it
+    responses = [httpx.Response(200, content=body, request=request) for _ in range(number)]
+    start = time.perf_counter()
+    for response in responses:
+        parse(response)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def run(number: int, top_k: int) -> list[dict]:
+    settings.PREDICTOR_TOP_K = top_k
+    rows = []
+    for path in sorted(FIXTURES.iterdir()):
+        body = path.read_bytes()
+        request = httpx.Request("POST", ENDPOINT)
+        legacy = legacy_parse(httpx.Response(200, content=body, request=request))
+        adapted = parse_prediction_response(httpx.Response(200, content=body, request=request), ENDPOINT)
+        legacy_us = per_call_us(legacy_parse, body, number)
+        adapter_us = per_call_us(lambda r: parse_prediction_response(r, ENDPOINT), body, number)
+        rows.append({
+            "fixture": path.name,
+            "bytes": len(body),
+            "legacy_us": round(legacy_us, 2),
+            "adapter_us": round(adapter_us, 2),
+            "speedup": round(legacy_us / adapter_us, 2),
+            "same": legacy == adapted,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="parses per fixture and parser")
+    parser.add_argument("--top-k", type=int, default=0, help="PREDICTOR_TOP_K for the adapters (0 keeps all)")
+    args = parser.parse_args()
+    common.print_table(run(args.number, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Bytes and time saved by pre-processing uploads before the predictor call.
+
+    python -m benchmarks.bench_preprocess --sizes 12 24 48 --mbps 20
+
+Sizes are in megapixels, e.g. 12 = a 4000x3000 phone photo saved as a
+quality-92 JPEG with EXIF orientation 6 (taken in portrait). Every image goes through
+`request_prediction` to a local stub predictor, unchanged ("raw") and pre-processed.
+`sent_kb` is the multipart body size. `upload_ms` is how long sending it would take
+over a --mbps uplink, since loopback hides that cost. `prep_ms` is the time spent in
+the process pool, and `total_ms` adds it to the measured call plus `upload_ms`.
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+from benchmarks import common
+from benchmarks.stub_server import StubServer, create_stub_app
+from app.core import preprocess
+from app.core.config import settings
+from app.core.predictor import request_prediction
+
+
+def make_photo(megapixels: float) -> bytes:
+    """Noisy gradient (compresses like a photo, unlike flat colour) as a rotated-portrait JPEG."""
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(width * 3 / 4)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    exif = Image.Exif()
+    exif[preprocess.EXIF_ORIENTATION] = 6
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+class MeasuringTransport(httpx.AsyncHTTPTransport):
+    """Counts request body bytes actually sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    async def handle_async_request(self, request):
+        body = b"".join([chunk async for chunk in request.stream])
+        self.sent += len(body)
+        request.stream = httpx.ByteStream(body)
+        return await super().handle_async_request(request)
+
+
+async def run(sizes: list[float], repeat: int, mbps: float) -> list[dict]:
+    rows = []
+    transport = MeasuringTransport()
+    with StubServer(create_stub_app()) as stub:
+        settings.EXTERNAL_PREDICTOR_API = stub.url + "/predict"
+        settings.PREDICTOR_REPLICAS = []
+        async with httpx.AsyncClient(transport=transport, timeout=60.0) as client:
+            for megapixels in sizes:
+                photo = make_photo(megapixels)
+                # /predict hands over the spooled upload's path, not its bytes
+                with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+                    f.write(photo)
+                path = Path(f.name)
+                for mode, enabled in (("raw", False), ("preprocessed", True)):
+                    settings.PREPROCESS_ENABLED = enabled
+                    # Warm up the process pool so worker start-up isn't counted
+                    await preprocess.preprocess(path)
+                    sent, prep, calls = [], [], []
+                    for _ in range(repeat):
+                        transport.sent = 0
+                        start = time.perf_counter()
+                        prepared = await preprocess.preprocess(path)
+                        prep.append(time.perf_counter() - start)
+                        settings.PREPROCESS_ENABLED = False
+                        start = time.perf_counter()
+                        await request_prediction(client, "photo.jpg", prepared.content if prepared else path, "image/jpeg")
+                        calls.append(time.perf_counter() - start)
+                        settings.PREPROCESS_ENABLED = enabled
+                        sent.append(transport.sent)
+                    upload_ms = statistics.fmean(sent) * 8 / (mbps * 1e6) * 1000
+                    prep_ms = statistics.fmean(prep) * 1000 if enabled else 0.0
+                    call_ms = statistics.fmean(calls) * 1000
+                    rows.append({
+                        "megapixels": megapixels,
+                        "mode": mode,
+                        "sent_kb": round(statistics.fmean(sent) / 1024, 1),
+                        "prep_ms": round(prep_ms, 1),
+                        "call_ms": round(call_ms, 1),
+                        "upload_ms": round(upload_ms, 1),
+                        "total_ms": round(prep_ms + call_ms + upload_ms, 1),
+                    })
+                os.unlink(path)
+    preprocess.shutdown_preprocess_executor()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[12, 24])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mbps", type=float, default=20.0, help="uplink bandwidth to the predictor")
+    args = parser.parse_args()
+    common.print_table(asyncio.run(run(args.sizes, args.repeat, args.mbps)))
+
+
+if __name__ == "__main__":
+    main()
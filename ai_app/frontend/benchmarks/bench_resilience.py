@@ -0,0 +1,109 @@
+"""Fault injection against the predictor resilience layer (breaker, retries, hedging).
+
+    python -m benchmarks.bench_resilience --duration 5 --concurrency 10
+
+Drives `request_prediction` against local stub predictors in three scenarios,
+each with the resilience features off ("baseline") and on ("resilient"):
+
+- outage:  the predictor hangs past PREDICTOR_TIMEOUT, then recovers halfway
+           through. With the breaker, calls fail fast instead of waiting out the
+           timeout, and a half-open probe closes the circuit after recovery.
+- flaky:   a share of calls answer 503. Retries recover most of them, and the
+           retry budget caps how many extra upstream calls they cost.
+- tail:    a few calls are slow, and a second replica is configured. Hedging
+           trims p99.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks import common
+from benchmarks.stub_server import StubServer, create_stub_app
+from app.core.config import settings
+from app.core import resilience
+from app.core.predictor import request_prediction
+
+PAYLOAD = b"\xff\xd8\xff" + b"\x00" * 16 * 1024
+
+RESILIENT = {"BREAKER_ENABLED": True, "UPSTREAM_MAX_RETRIES": 2}
+BASELINE = {"BREAKER_ENABLED": False, "UPSTREAM_MAX_RETRIES": 0, "PREDICTOR_HEDGE_DELAY": 0.0}
+
+
+def configure(urls: list[str], overrides: dict):
+    settings.EXTERNAL_PREDICTOR_API = urls[0]
+    settings.PREDICTOR_REPLICAS = urls[1:]
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    # Fresh breakers and budget for every run
+    resilience.predictor_upstream.breakers.clear()
+    resilience.predictor_upstream.budget = resilience.RetryBudget()
+
+
+async def drive(client: httpx.AsyncClient, duration: float, concurrency: int, halfway=None) -> dict:
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    async def loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            _, _, error, _ = await request_prediction(client, "bench.jpg", PAYLOAD, "image/jpeg")
+            latencies.append(time.perf_counter() - start)
+            if error:
+                errors.append(error)
+            # Fast-failed calls never yield; let the other clients and the probe run
+            await asyncio.sleep(0)
+
+    async def heal():
+        await asyncio.sleep(duration / 2)
+        halfway()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(concurrency)), *([heal()] if halfway else []))
+    stats = common.summarize(latencies, time.perf_counter() - started)
+    return {"requests": stats["requests"], "failed": len(errors), "p50_ms": stats["p50_ms"], "p99_ms": stats["p99_ms"]}
+
+
+async def run(duration: float, concurrency: int) -> list[dict]:
+    settings.PREDICTOR_TIMEOUT = 0.5
+    settings.BREAKER_RECOVERY_TIMEOUT = 1.0
+    rows = []
+    async with httpx.AsyncClient(timeout=httpx.Timeout(settings.PREDICTOR_TIMEOUT)) as client:
+        for mode, overrides in (("baseline", BASELINE), ("resilient", RESILIENT)):
+            stub_app = create_stub_app(latency=5.0)
+            with StubServer(stub_app) as stub:
+                configure([stub.url + "/predict"], overrides)
+                stats = await drive(client, duration, concurrency, halfway=lambda: stub_app.state.faults.update(latency=0.0))
+                breaker = resilience.predictor_upstream.breaker(settings.EXTERNAL_PREDICTOR_API)
+                rows.append({"scenario": "outage", "mode": mode, **stats,
+                             "upstream_calls": stub_app.state.calls["predict"], "final_circuit": breaker.state})
+
+        for mode, overrides in (("baseline", BASELINE), ("resilient", RESILIENT)):
+            stub_app = create_stub_app(latency=0.005, error_rate=0.2)
+            with StubServer(stub_app) as stub:
+                configure([stub.url + "/predict"], {**overrides, "BREAKER_FAILURE_THRESHOLD": 50})
+                stats = await drive(client, duration, concurrency)
+                rows.append({"scenario": "flaky", "mode": mode, **stats,
+                             "upstream_calls": stub_app.state.calls["predict"], "final_circuit": "-"})
+
+        for mode, overrides in (("baseline", BASELINE), ("resilient", {**RESILIENT, "PREDICTOR_HEDGE_DELAY": 0.05})):
+            apps = [create_stub_app(latency=0.01, slow_rate=0.05, slow_latency=0.4) for _ in range(2)]
+            with StubServer(apps[0]) as first, StubServer(apps[1]) as second:
+                configure([first.url + "/predict", second.url + "/predict"], overrides)
+                stats = await drive(client, duration, concurrency)
+                rows.append({"scenario": "tail", "mode": mode, **stats,
+                             "upstream_calls": sum(a.state.calls["predict"] for a in apps), "final_circuit": "-"})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    common.print_table(asyncio.run(run(args.duration, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
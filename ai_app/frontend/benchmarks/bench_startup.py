@@ -0,0 +1,96 @@
+"""Cold-start cost of a worker: importing app.main and running the lifespan startup.
+
+    python -m benchmarks.bench_startup --runs 5 --top 15
+
+Each run is a fresh interpreter, like a new uvicorn worker. `import_ms` is the
+time spent importing app.main, `lifespan_ms` the time until the app is ready to
+serve, and `process_ms` the whole run including interpreter start and shutdown.
+The database from .env is used (the placeholders in benchmarks/common.py point
+at 127.0.0.1:3306 otherwise). Run it on two checkouts to compare before/after.
+--top lists app.main's slowest direct imports (cumulative, from `python -X importtime`).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import common
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def ready():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter()
+
+try:
+    error, started = None, asyncio.run(ready())
+except Exception as e:
+    error, started = f"{type(e).__name__}: {e}", time.perf_counter()
+print("BENCH " + json.dumps({"import": imported - start, "lifespan": started - imported, "error": error}))
+"""
+
+
+def run_child() -> dict:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, env=os.environ.copy())
+    elapsed = time.perf_counter() - start
+    line = next((l for l in result.stdout.splitlines() if l.startswith("BENCH ")), None)
+    if line is None:
+        raise SystemExit(f"app.main failed to import: {(result.stderr.strip().splitlines() or ['?'])[-1]}")
+    return {**json.loads(line[len("BENCH "):]), "process": elapsed}
+
+
+def slowest_imports(top: int) -> list[dict]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], capture_output=True, text=True, env=os.environ.copy())
+    rows, children = [], []
+    # A module is printed after everything it imported, indented two spaces per level
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        row = {"module": name.strip(), "self_ms": round(int(self_us) / 1000, 1), "cumulative_ms": round(int(cumulative_us) / 1000, 1)}
+        if depth == 1:
+            children.append(row)
+        elif depth == 0:
+            # Keep app.main and its direct imports, each charged with everything it pulled in
+            if row["module"] == "app.main":
+                rows = [row, *children]
+            children = []
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list; 0 skips the listing")
+    args = parser.parse_args()
+
+    runs = [run_child() for _ in range(args.runs)]
+    errors = {r["error"] for r in runs if r["error"]}
+    rows = [
+        {
+            "phase": phase,
+            "mean_ms": round(statistics.fmean(r[phase] for r in runs) * 1000, 1),
+            "min_ms": round(min(r[phase] for r in runs) * 1000, 1),
+            "max_ms": round(max(r[phase] for r in runs) * 1000, 1),
+        }
+        for phase in ("import", "lifespan", "process")
+    ]
+    common.print_table(rows)
+    for error in errors:
+        print(f"\nStartup raised: {error}")
+    if args.top:
+        print()
+        common.print_table(slowest_imports(args.top))
+
+
+if __name__ == "__main__":
+    main()
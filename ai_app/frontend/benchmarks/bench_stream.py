@@ -0,0 +1,153 @@
+"""Predictor calls and stored rows for a live camera stream: every frame vs sampling vs sampling + dHash dedup.
+
+    python -m benchmarks.bench_stream --seconds 15 --source-fps 15 --scene-seconds 5 --latency 0.2
+
+A synthetic camera sends --source-fps frames per second (textured shelf,
+sensor noise on every frame) for --seconds through app.core.streams.FrameStream,
+as the /predict/stream WebSocket does. Every --scene-seconds an object is
+added. The stub predictor answers after --latency seconds with one detection
+per object, so results only change with the scene.
+
+`calls` is predictor calls; without "only changed results" each of them would
+be a stored row, `stored` is what is kept. `busy` frames arrived while
+STREAM_MAX_IN_FLIGHT calls were running and were dropped. `change_lag_ms` is
+the mean time from a scene change to the first result reflecting it.
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import common
+from benchmarks.stub_server import StubServer, create_s3_stub_app
+
+MODES = ("every_frame", "sampled", "sampled_dedup")
+
+
+def make_frames(scenes: int, variants: int, size: tuple[int, int] = (640, 480)) -> list[list[bytes]]:
+    """JPEG frames per scene (scene n shows n + 1 objects), each variant with fresh sensor noise.
+
+    The object count travels in the JPEG comment, so the stub can answer without decoding.
+    """
+    from PIL import Image, ImageDraw
+
+    shelf = Image.linear_gradient("L").resize(size)
+    frames = []
+    for scene in range(scenes):
+        per_scene = []
+        for _ in range(variants):
+            noise = Image.effect_noise(size, 12)
+            image = Image.merge("RGB", (shelf, noise, shelf.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+            draw = ImageDraw.Draw(image)
+            for n in range(scene + 1):
+                x = 20 + (n % 6) * 100
+                y = 40 + (n // 6) * 220
+                draw.rectangle([x, y, x + 70, y + 180], fill=(30, 160, 60))
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=85, comment=f"objects={scene + 1}")
+            per_scene.append(out.getvalue())
+        frames.append(per_scene)
+    return frames
+
+
+def create_counting_predictor(latency: float):
+    from PIL import Image
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def predict(request: Request):
+        form = await request.form()
+        content = await form["file"].read()
+        with Image.open(io.BytesIO(content)) as image:
+            count = int(image.info.get("comment", b"objects=0").decode().split("=")[1])
+        await asyncio.sleep(latency)
+        return JSONResponse({"predictions": [
+            {"class_name": "bottle", "confidence": round(random.uniform(0.8, 0.95), 3), "bbox": [n * 100.0, 40.0, n * 100.0 + 70, 220.0]}
+            for n in range(count)
+        ]})
+
+    return Starlette(routes=[Route("/predict", predict, methods=["POST"])])
+
+
+async def run_mode(mode: str, frames: list[list[bytes]], args) -> dict:
+    import httpx
+    from app.core.config import settings
+    from app.core.streams import FrameStream
+
+    settings.STREAM_DEDUP_DISTANCE = 4 if mode == "sampled_dedup" else -1
+    scene_started: dict[int, float] = {}
+    first_seen: dict[int, float] = {}
+
+    async def emit(message: dict):
+        count = len(message.get("detections") or [])
+        if count and count not in first_seen:
+            first_seen[count] = time.perf_counter()
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        stream = FrameStream(client, emit, name=mode, sample_interval=0.0 if mode == "every_frame" else 1 / args.sample_fps)
+        start = time.perf_counter()
+        total = int(args.seconds * args.source_fps)
+        for n in range(total):
+            due = start + n / args.source_fps
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            scene = min(int(n / args.source_fps // args.scene_seconds), len(frames) - 1)
+            scene_started.setdefault(scene + 1, time.perf_counter())
+            await stream.offer(frames[scene][n % len(frames[scene])], n / args.source_fps)
+        await stream.drain()
+
+    lags = [first_seen[count] - started for count, started in scene_started.items() if count in first_seen]
+    summary = stream.summary()
+    return {
+        "mode": mode,
+        "frames": summary["received"],
+        "calls": summary["predicted"] + summary["failed"],
+        "busy": summary["busy"],
+        "sampled_out": summary["sampled_out"],
+        "duplicate": summary["duplicate"],
+        "stored": summary["stored"],
+        "scenes_seen": f"{len(lags)}/{len(scene_started)}",
+        "change_lag_ms": round(sum(lags) / len(lags) * 1000, 1) if lags else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--source-fps", type=float, default=15.0)
+    parser.add_argument("--sample-fps", type=float, default=2.0, help="STREAM_SAMPLE_FPS for the sampled modes")
+    parser.add_argument("--scene-seconds", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub predictor latency (s)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ai_app_stream_")
+    with StubServer(create_counting_predictor(args.latency)) as predictor, StubServer(create_s3_stub_app()) as s3:
+        # Set before the app is imported: results go to a scratch SQLite database and the S3 stub
+        os.environ.update({
+            "SQLITE_PATH": os.path.join(workdir, "app.db"),
+            "EXTERNAL_PREDICTOR_API": f"{predictor.url}/predict",
+            "STORAGE_BACKEND": "s3",
+            "S3_BUCKET": "bench",
+            "S3_ENDPOINT_URL": s3.url,
+            "S3_REGION": "us-east-1",
+            "S3_ACCESS_KEY_ID": "bench",
+            "S3_SECRET_ACCESS_KEY": "bench",
+            "LOG_LEVEL": "WARNING",
+        })
+        from app.db.database import engine
+        from app.db.migrations import upgrade
+        upgrade(engine)
+
+        scenes = int(args.seconds // args.scene_seconds) + 1
+        frames = make_frames(scenes, variants=5)
+        rows = [asyncio.run(run_mode(mode, frames, args)) for mode in args.modes]
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
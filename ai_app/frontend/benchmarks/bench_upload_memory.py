@@ -0,0 +1,84 @@
+"""Peak Python memory per upload: buffered (read + multipart + base64) vs streamed.
+
+    python -m benchmarks.bench_upload_memory --sizes 4 16 48
+
+Sizes are in MB. The multipart body is generated exactly as it would be sent
+to the predictor, but consumed locally so only this process's allocations are measured.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from starlette.datastructures import Headers, UploadFile
+
+from benchmarks import common
+from app.core import storage
+from app.core.predictor import _multipart_upload
+
+
+def _make_upload(path: str) -> UploadFile:
+    return UploadFile(open(path, "rb"), filename="shelf.jpg", headers=Headers({"content-type": "image/jpeg"}))
+
+
+async def _send(request: httpx.Request) -> int:
+    sent = 0
+    async for chunk in request.stream:
+        sent += len(chunk)
+    return sent
+
+
+async def buffered(path: str):
+    # What /predict used to do
+    upload = _make_upload(path)
+    content = await upload.read()
+    await _send(httpx.Request("POST", "http://predictor.invalid/predict", files={"file": (upload.filename, content, upload.content_type)}))
+    await storage.save_bytes(content, "bench-buffered", upload.filename)
+    image_data = f"data:{upload.content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+    return len(image_data)
+
+
+async def streamed(path: str):
+    upload = _make_upload(path)
+    stored = await storage.spool_upload(upload)
+    headers, body = await _multipart_upload(Path(stored.path), upload.filename, upload.content_type)
+    await _send(httpx.Request("POST", "http://predictor.invalid/predict", headers=headers, content=body))
+    await storage.discard_upload(stored)
+    return stored.path
+
+
+async def measure(fn, path: str) -> float:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 16, 48], help="image sizes in MB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        storage.UPLOAD_DIR = os.path.join(workdir, "uploads")
+        rows = []
+        for size_mb in args.sizes:
+            path = os.path.join(workdir, f"image-{size_mb}.jpg")
+            with open(path, "wb") as f:
+                f.write(os.urandom(size_mb * 1024 * 1024))
+            rows.append({
+                "image_mb": size_mb,
+                "buffered_peak_mb": round(asyncio.run(measure(buffered, path)), 2),
+                "streamed_peak_mb": round(asyncio.run(measure(streamed, path)), 2),
+            })
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Throughput of `python manage.py serve` with different worker counts.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --scenario mixed --concurrency 50
+
+For each worker count a server is started on a free port with the database from
+.env (migrated: `python manage.py migrate`), a local stub predictor and, unless
+--shared memory, SHARED_STATE_BACKEND=redis pointing at --redis-url or a local
+fakeredis stand-in. `load_test` then drives it for --duration seconds. More
+workers only help up to the number of CPU cores.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import common, load_test
+from benchmarks.stub_server import RedisStandIn, StubServer, _free_port, create_stub_app
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/login", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("Server did not start in time")
+
+
+def run_workers(workers: int, args, env: dict) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "manage.py", "serve", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_until_up(url, process)
+        result = asyncio.run(load_test.run(url, args.scenario, args.concurrency, args.duration, args.username, args.password))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scenario", choices=load_test.SCENARIOS, default="mixed")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--shared", choices=["redis", "memory"], default="redis", help="SHARED_STATE_BACKEND for the servers")
+    parser.add_argument("--redis-url", help="an existing Redis; default: a local fakeredis stand-in")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    # Servers read the database settings from .env, not the placeholders from benchmarks.common
+    env = {key: value for key, value in os.environ.items() if key not in common.PLACEHOLDER_KEYS}
+    env["SHARED_STATE_BACKEND"] = args.shared
+
+    redis = RedisStandIn().start() if args.shared == "redis" and not args.redis_url else None
+    if args.shared == "redis":
+        env["SHARED_STATE_URL"] = args.redis_url or redis.url
+    try:
+        with StubServer(create_stub_app(latency=0.05)) as stub:
+            env["EXTERNAL_PREDICTOR_API"] = stub.url + "/predict"
+            env["PREDICTOR_HEALTH_INTERVAL"] = "0"
+            rows = [run_workers(workers, args, env) for workers in args.workers]
+    finally:
+        if redis:
+            redis.stop()
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
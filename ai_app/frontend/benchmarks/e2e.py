@@ -0,0 +1,255 @@
+"""End-to-end benchmark: the whole app on SQLite against local stubs, with scripted scenarios.
+
+    python -m benchmarks.e2e --output bench-results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.e2e --compare bench-results/abc1234.json --max-regression 10
+
+Needs neither MySQL nor the ngrok services. A fresh SQLite database (in
+/dev/shm with --db memory, the default where it exists) is migrated and
+seeded with --history predictions spread over 90 days, so the dashboard
+works on a large history. The app is started with `python manage.py serve`,
+talking to a stub predictor/training service (--latency, --error-rate,
+--response-shape: one of the recorded responses in benchmarks/fixtures) and,
+with the default --storage s3, an in-memory S3 stub, so nothing is written
+to app/static. The rate limiter is off: the load comes from a single user.
+
+Every scenario (see benchmarks/load_test.py) runs for --duration seconds at
+each --concurrency. For each run the table and the JSON report give
+requests/sec, latency percentiles, errors and the peak RSS of the server
+(all workers). --compare matches runs by scenario and concurrency against an
+earlier report, and --max-regression makes the exit status 1 when requests/sec
+dropped, or p95 grew, by more than that many percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import common, load_test
+from benchmarks.bench_workers import wait_until_up
+from benchmarks.stub_server import StubServer, _free_port, create_s3_stub_app, create_stub_app, response_shapes
+
+DEFAULT_SCENARIOS = ["login", "predict", "predict_unique", "dashboard", "train_config"]
+CLASS_NAMES = ["bottle", "can", "carton", "glass", "paper", "plastic_bag", "tin", "cup"]
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def seed_history(predictions: int, training_jobs: int):
+    """Bulk-insert a history into the (already migrated) database that SQLITE_PATH points at."""
+    from sqlalchemy import insert, select
+    from app.core.detections import rebuild_rollups
+    from app.core.thumbnails import thumbnail_key
+    from app.db.database import engine
+    from app.db.models import Prediction, PredictionDetection, TrainingJob
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        for start in range(0, predictions, 5000):
+            rows, detections = [], []
+            for n in range(start, min(predictions, start + 5000)):
+                created_at = now - timedelta(seconds=rng.uniform(0, 90 * 86400))
+                classes = rng.sample(CLASS_NAMES, rng.randint(1, 3))
+                confidence = round(rng.uniform(0.3, 0.99), 3)
+                content_hash = f"{n:064x}"
+                image_path = f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.jpg"
+                # The images don't exist; with a thumbnail set, the thumbnail backfill leaves them alone
+                rows.append({
+                    "filename": f"history-{n}.jpg",
+                    "prediction_text": ", ".join(classes),
+                    "confidence": confidence,
+                    "image_path": image_path,
+                    "thumbnail_path": thumbnail_key(image_path),
+                    "content_hash": content_hash,
+                    "status": "completed",
+                    "created_at": created_at,
+                })
+                detections.append([(name, confidence, created_at) for name in classes])
+            conn.execute(insert(Prediction), rows)
+            ids = conn.scalars(select(Prediction.id).order_by(Prediction.id.desc()).limit(len(rows))).all()[::-1]
+            conn.execute(insert(PredictionDetection), [
+                {"prediction_id": prediction_id, "class_name": name, "confidence": confidence, "created_at": created_at}
+                for prediction_id, items in zip(ids, detections)
+                for name, confidence, created_at in items
+            ])
+        if training_jobs:
+            conn.execute(insert(TrainingJob), [
+                {"status": "completed", "model_name": "yolo12n", "epochs": 10 + n % 90, "batch_size": 16,
+                 "learning_rate": "0.001", "classes": 2, "augmentation": True, "progress": 1.0,
+                 "created_at": now - timedelta(hours=training_jobs - n)}
+                for n in range(training_jobs)
+            ])
+        rebuild_rollups(conn)
+
+
+def prepare_database(path: str, env: dict, args):
+    subprocess.run([sys.executable, "manage.py", "migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+    if args.history:
+        started = time.perf_counter()
+        # Imported only now: the app's settings must see SQLITE_PATH
+        os.environ.update(env)
+        seed_history(args.history, args.history // 100)
+        print(f"Seeded {args.history} predictions in {time.perf_counter() - started:.1f}s ({path})")
+
+
+def run_scenarios(url: str, pid: int, args) -> list[dict]:
+    # Warm up connection pools, caches and the templates before measuring
+    asyncio.run(load_test.run(url, "mixed", 4, args.warmup, args.username, args.password))
+    results = []
+    for scenario in args.scenarios:
+        for concurrency in args.concurrency:
+            with common.RssSampler(pid) as rss:
+                result = asyncio.run(load_test.run(url, scenario, concurrency, args.duration, args.username, args.password))
+            results.append({**result, "peak_rss_mb": rss.peak_mb})
+            print(f"  {scenario:<15} c={concurrency:<4} {result['rps']:>8} rps  p95 {result['p95_ms']} ms  errors {result['errors']}")
+    return results
+
+
+def compare(results: list[dict], baseline: dict, max_regression: float | None) -> bool:
+    """Print the change against an earlier report; False if a run regressed past `max_regression`."""
+    before = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    rows, ok = [], True
+
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    for result in results:
+        old = before.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        row = {
+            "scenario": result["scenario"],
+            "concurrency": result["concurrency"],
+            "rps": result["rps"],
+            "rps_change_%": change(result["rps"], old["rps"]),
+            "p95_ms": result["p95_ms"],
+            "p95_change_%": change(result["p95_ms"], old["p95_ms"]),
+            "p99_change_%": change(result["p99_ms"], old["p99_ms"]),
+            "rss_change_%": change(result["peak_rss_mb"], old["peak_rss_mb"]),
+        }
+        row["regressed"] = max_regression is not None and (
+            (row["rps_change_%"] or 0) < -max_regression or (row["p95_change_%"] or 0) > max_regression
+        )
+        ok = ok and not row["regressed"]
+        rows.append(row)
+    print(f"\nAgainst {baseline['meta'].get('commit')} ({baseline['meta'].get('created')}):")
+    if not rows:
+        print("no runs with the same scenario and concurrency")
+        return ok
+    common.print_table(rows)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=load_test.SCENARIOS, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and concurrency")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--history", type=int, default=20000, help="predictions seeded before the run")
+    parser.add_argument("--db", choices=["memory", "file"], default="memory" if os.path.isdir("/dev/shm") else "file",
+                        help="SQLite file on tmpfs (/dev/shm) or on disk")
+    parser.add_argument("--storage", choices=["s3", "local"], default="s3",
+                        help="in-memory S3 stub, or the local backend (writes under app/static/uploads)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub predictor/training latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls answering 503")
+    parser.add_argument("--response-shape", choices=response_shapes(), help="recorded predictor response to serve")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="an earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, help="exit 1 if rps drops or p95 grows by more than this %%")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ai_app_e2e_", dir="/dev/shm" if args.db == "memory" else None)
+    db_path = os.path.join(workdir, "app.db")
+    # Nothing from .env or the MySQL placeholders: this run only uses SQLite
+    env = {key: value for key, value in os.environ.items() if not key.startswith("MYSQL_")}
+    env.update({
+        "SQLITE_PATH": db_path,
+        "PREDICT_RATE_LIMIT": "0",
+        "PREDICTOR_HEALTH_INTERVAL": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    stub = StubServer(create_stub_app(latency=args.latency, error_rate=args.error_rate, response_shape=args.response_shape)).start()
+    s3 = StubServer(create_s3_stub_app()).start() if args.storage == "s3" else None
+    env.update({
+        "EXTERNAL_PREDICTOR_API": f"{stub.url}/predict",
+        "TRAIN_CONFIG_URL": f"{stub.url}/train/config",
+        "UPDATE_CONFIG_URL": f"{stub.url}/train/config",
+        "START_TRAINING_URL": f"{stub.url}/train/start",
+        "TRAINING_STATUS_URL": f"{stub.url}/train/status",
+    })
+    if s3:
+        env.update({
+            "STORAGE_BACKEND": "s3",
+            "S3_BUCKET": "bench",
+            "S3_ENDPOINT_URL": s3.url,
+            "S3_REGION": "us-east-1",
+            "S3_ACCESS_KEY_ID": "bench",
+            "S3_SECRET_ACCESS_KEY": "bench",
+        })
+
+    process = None
+    try:
+        prepare_database(db_path, env, args)
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [sys.executable, "manage.py", "serve", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env,
+        )
+        wait_until_up(url, process)
+        results = run_scenarios(url, process.pid, args)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.stop()
+        if s3:
+            s3.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "password")},
+        "results": results,
+    }
+    print()
+    common.print_table(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Concurrent load against a running instance of the app.
+
+    uvicorn app.main:app --port 8000            # in another shell
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --scenario dashboard --concurrency 50
+
+`predict` re-sends one image, so after the first call it is answered from the
+prediction cache; `predict_unique` sends a new image every time and always
+reaches the predictor. `predict_async` goes through the job queue
+(/predict/jobs); a full queue answers 503, counted under errors. `login` signs
+in over and over (password hashing), and `train_config` alternates saving a
+changed training config with viewing it.
+
+Run it against two checkouts (e.g. before/after a change) with the same
+arguments and compare requests/sec and the latency percentiles.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks import common
+
+SCENARIOS = ("login", "dashboard", "predict", "predict_unique", "predict_async", "train_config", "mixed")
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str):
+    response = await client.post("/auth/login", data={"username": username, "password": password})
+    if "session" not in client.cookies and response.status_code != 303:
+        raise SystemExit(f"Login failed ({response.status_code}); check --username/--password")
+
+
+async def run(url: str, scenario: str, concurrency: int, duration: float, username: str, password: str) -> dict:
+    image = b"\xff\xd8\xff" + os.urandom(32 * 1024)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0, follow_redirects=False) as client:
+        await login(client, username, password)
+
+        async def one(i: int):
+            kind = scenario if scenario != "mixed" else ("predict" if i % 4 == 0 else "dashboard")
+            if kind == "dashboard":
+                return await client.get("/dashboard")
+            if kind == "login":
+                return await client.post("/auth/login", data={"username": username, "password": password})
+            if kind == "train_config":
+                if i % 2:
+                    return await client.get("/train/get/config")
+                return await client.post("/train/update/config", data={
+                    "epochs": 10 + i % 90, "batch_size": 16, "learning_rate": "0.001",
+                    "model_name": "yolo12n", "classes": 2, "augmentation": "true",
+                })
+            if kind == "predict_unique":
+                return await client.post("/predict", files={"file": (f"load-{i}.jpg", image + i.to_bytes(8, "big"), "image/jpeg")})
+            if kind == "predict_async":
+                # Submit, then long-poll until the job has finished: end-to-end latency
+                response = await client.post("/predict/jobs", files={"file": (f"load-{i}.jpg", image, "image/jpeg")})
+                while response.status_code in (200, 202) and response.json()["status"] not in ("completed", "failed"):
+                    response = await client.get(f"/predict/jobs/{response.json()['id']}", params={"wait": 30})
+                return response
+            return await client.post("/predict", files={"file": (f"load-{i}.jpg", image, "image/jpeg")})
+
+        deadline = time.perf_counter() + duration
+        counter = 0
+
+        async def worker():
+            nonlocal counter, errors
+            while time.perf_counter() < deadline:
+                counter += 1
+                start = time.perf_counter()
+                try:
+                    response = await one(counter)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"scenario": scenario, "concurrency": concurrency, **common.summarize(latencies, elapsed), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="dashboard")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    rows = [
+        asyncio.run(run(args.url, args.scenario, c, args.duration, args.username, args.password))
+        for c in args.concurrency
+    ]
+    common.print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
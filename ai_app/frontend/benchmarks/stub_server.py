@@ -0,0 +1,335 @@
+"""Local stand-ins for the external services the app talks to.
+
+`create_stub_app` plays the predictor / training service, so the benchmark
+scripts never touch the real ngrok endpoints. `create_s3_stub_app` is a tiny
+in-memory, path-style S3 API (put/get/head/delete/copy/list) for running the
+S3 storage backend locally: STORAGE_BACKEND=s3 S3_ENDPOINT_URL=<stub url>.
+"""
+import asyncio
+import hashlib
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from pathlib import Path
+from urllib.parse import unquote
+from xml.sax.saxutils import escape
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+DEFAULT_PREDICTION = {
+    "predictions": [
+        {"class_name": "bottle", "confidence": 0.93, "bbox": [12.0, 40.5, 220.0, 310.0]},
+        {"class_name": "can", "confidence": 0.81, "bbox": [240.0, 52.0, 330.0, 298.5]},
+    ]
+}
+
+# Recorded predictor responses, served verbatim with `response_shape=<file stem>`
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def response_shapes() -> list[str]:
+    return sorted(path.stem for path in FIXTURES.iterdir() if path.suffix in (".json", ".txt"))
+
+
+DEFAULT_TRAIN_CONFIG = {
+    "epochs": 50,
+    "batch_size": 32,
+    "learning_rate": "0.0001",
+    "model_name": "yolo12n",
+    "classes": 2,
+    "augmentation": True,
+}
+
+
+def create_stub_app(
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    prediction: dict | None = None,
+    train_duration: float = 30.0,
+    slow_rate: float = 0.0,
+    slow_latency: float = 1.0,
+    capacity: int | None = None,
+    response_shape: str | None = None,
+) -> Starlette:
+    """Fake predictor/training API with injectable faults.
+
+    `latency` delays every response, `error_rate` answers 503 at random and
+    `slow_rate` adds `slow_latency` to a fraction of calls (tail latency);
+    `healthy=False` fails /predict and /health with 503. `capacity` caps how
+    many predictions are processed at once (a GPU box); the rest queue. The
+    values live in `app.state.faults` and can be changed while it runs;
+    `app.state.calls` counts requests served. `response_shape` answers
+    /predict with one of the recorded responses in benchmarks/fixtures
+    (see `response_shapes()`) instead of `prediction`.
+    """
+    prediction = prediction or DEFAULT_PREDICTION
+    if response_shape:
+        path = next((p for p in FIXTURES.iterdir() if p.stem == response_shape), None)
+        if path is None:
+            raise ValueError(f"Unknown response shape {response_shape!r}; choose from {', '.join(response_shapes())}")
+        recorded = (path.read_bytes(), "application/json" if path.suffix == ".json" else "text/plain")
+    else:
+        recorded = None
+
+    def prediction_response():
+        if recorded:
+            return Response(recorded[0], media_type=recorded[1])
+        return JSONResponse(prediction)
+    faults = {
+        "latency": latency,
+        "error_rate": error_rate,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "healthy": True,
+    }
+    calls = {"predict": 0}
+    slots = {}
+
+    async def maybe_fail():
+        if not faults["healthy"]:
+            return JSONResponse({"detail": "backend down"}, status_code=503)
+        delay = faults["latency"]
+        if faults["slow_rate"] and random.random() < faults["slow_rate"]:
+            delay += faults["slow_latency"]
+        if delay:
+            await asyncio.sleep(delay)
+        if faults["error_rate"] and random.random() < faults["error_rate"]:
+            return JSONResponse({"detail": "injected failure"}, status_code=503)
+        return None
+
+    async def predict(request: Request):
+        calls["predict"] += 1
+        # Drain the upload like a real predictor would
+        await request.body()
+        if capacity is None:
+            return await maybe_fail() or prediction_response()
+        # Created lazily: it belongs to the server thread's event loop
+        slot = slots.setdefault("predict", asyncio.Semaphore(capacity))
+        async with slot:
+            return await maybe_fail() or prediction_response()
+
+    async def health(request: Request):
+        # A hung backend hangs its health check too
+        if faults["latency"] > 1:
+            await asyncio.sleep(faults["latency"])
+        if not faults["healthy"]:
+            return JSONResponse({"status": "down"}, status_code=503)
+        return JSONResponse({"status": "ok"})
+
+    train_config_state = dict(DEFAULT_TRAIN_CONFIG)
+
+    async def train_config(request: Request):
+        if request.method == "POST":
+            train_config_state.update(await request.json())
+        return await maybe_fail() or JSONResponse(train_config_state)
+
+    training = {"started_at": None}
+
+    async def train_start(request: Request):
+        await request.body()
+        training["started_at"] = time.monotonic()
+        return await maybe_fail() or JSONResponse({"status": "started"}, status_code=202)
+
+    async def train_status(request: Request):
+        # Pretend a run takes `train_duration` seconds from the last /train/start
+        if training["started_at"] is None:
+            return JSONResponse({"status": "idle"})
+        progress = min(1.0, (time.monotonic() - training["started_at"]) / train_duration)
+        return await maybe_fail() or JSONResponse({
+            "status": "completed" if progress >= 1.0 else "training",
+            "progress": round(progress, 3),
+            "metrics": {"mAP50": round(0.4 + 0.5 * progress, 3), "loss": round(1.5 - progress, 3)},
+        })
+
+    app = Starlette(routes=[
+        Route("/predict", predict, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/train/config", train_config, methods=["GET", "POST"]),
+        Route("/train/start", train_start, methods=["POST"]),
+        Route("/train/status", train_status, methods=["GET"]),
+    ])
+    app.state.faults = faults
+    app.state.calls = calls
+    return app
+
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def create_s3_stub_app() -> Starlette:
+    # (bucket, key) -> {"body", "content_type", "cache_control", "etag", "last_modified"}
+    objects: dict[tuple[str, str], dict] = {}
+
+    def no_such_key(request: Request):
+        if request.method == "HEAD":
+            return Response(status_code=404)
+        return Response(
+            '<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code><Message>Not found</Message></Error>',
+            status_code=404, media_type="application/xml",
+        )
+
+    def headers_for(item: dict) -> dict:
+        headers = {"ETag": item["etag"], "Last-Modified": format_datetime(item["last_modified"], usegmt=True)}
+        if item["cache_control"]:
+            headers["Cache-Control"] = item["cache_control"]
+        if item["content_type"]:
+            headers["Content-Type"] = item["content_type"]
+        return headers
+
+    async def bucket(request: Request):
+        name = request.path_params["bucket"]
+        prefix = request.query_params.get("prefix", "")
+        max_keys = int(request.query_params.get("max-keys", 1000))
+        # The continuation token is simply the last key of the previous page
+        after = request.query_params.get("continuation-token", "")
+        keys = sorted(key for bucket_name, key in objects if bucket_name == name and key.startswith(prefix) and key > after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key>"
+            f"<LastModified>{item['last_modified'].strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified>"
+            f"<ETag>{escape(item['etag'])}</ETag><Size>{len(item['body'])}</Size>"
+            f"<StorageClass>STANDARD</StorageClass></Contents>"
+            for key in page
+            for item in [objects[(name, key)]]
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        return Response(
+            f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{S3_NS}"><Name>{escape(name)}</Name>'
+            f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>",
+            media_type="application/xml",
+        )
+
+    async def obj(request: Request):
+        ident = (request.path_params["bucket"], request.path_params["key"])
+        if request.method == "PUT":
+            source = request.headers.get("x-amz-copy-source")
+            if source:
+                source_bucket, _, source_key = unquote(source).lstrip("/").partition("/")
+                original = objects.get((source_bucket, source_key))
+                if original is None:
+                    return no_such_key(request)
+                body, content_type = original["body"], original["content_type"]
+                # Like S3: REPLACE takes the headers of the copy request, stored ones are dropped
+                if request.headers.get("x-amz-metadata-directive") == "REPLACE":
+                    content_type = request.headers.get("content-type")
+            else:
+                body, content_type = await request.body(), request.headers.get("content-type")
+            item = objects[ident] = {
+                "body": body,
+                "content_type": content_type,
+                "cache_control": request.headers.get("cache-control"),
+                "etag": f'"{hashlib.md5(body).hexdigest()}"',
+                "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+            }
+            if source:
+                return Response(
+                    f'<?xml version="1.0" encoding="UTF-8"?><CopyObjectResult><ETag>{escape(item["etag"])}</ETag>'
+                    f"<LastModified>{item['last_modified'].strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified></CopyObjectResult>",
+                    media_type="application/xml",
+                )
+            return Response(headers={"ETag": item["etag"]})
+
+        item = objects.get(ident)
+        if request.method == "DELETE":
+            objects.pop(ident, None)
+            return Response(status_code=204)
+        if item is None:
+            return no_such_key(request)
+        if request.method == "HEAD":
+            return Response(headers={**headers_for(item), "Content-Length": str(len(item["body"]))})
+        return Response(item["body"], media_type=item["content_type"], headers=headers_for(item))
+
+    app = Starlette(routes=[
+        Route("/{bucket}", bucket, methods=["GET"]),
+        Route("/{bucket}/{key:path}", obj, methods=["GET", "HEAD", "PUT", "DELETE"]),
+    ])
+    app.state.objects = objects
+    return app
+
+
+class StubServer:
+    """Runs an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int | None = None):
+        self.app = app
+        self.host = host
+        self.port = port or _free_port()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class RedisStandIn:
+    """A Redis-protocol server (fakeredis) on a background thread, for SHARED_STATE_BACKEND=redis.
+
+    Needs `pip install fakeredis`; worker processes connect to `url` like to a real Redis.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int | None = None):
+        self.host = host
+        self.port = port or _free_port()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self):
+        from fakeredis import TcpFakeServer
+        self._server = TcpFakeServer((self.host, self.port))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
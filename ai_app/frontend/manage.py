@@ -0,0 +1,126 @@
+"""Management commands, run from this directory:
+
+    python manage.py migrate            # apply pending migrations (run before starting the app)
+    python manage.py migrate --to 3     # ...only up to version 3
+    python manage.py status             # applied and pending migrations
+    python manage.py reset --yes        # drop every table and migrate from scratch
+    python manage.py create-user alice  # prompts for the password
+    python manage.py serve --workers 4  # run the app with several worker processes
+"""
+import argparse
+import getpass
+import logging
+import sys
+
+from sqlalchemy import select
+
+from app.db.database import Base, SessionLocal, engine
+from app.db.migrations import LATEST_VERSION, MIGRATIONS, current_version, upgrade
+from app.db.models import User
+
+
+def migrate(args):
+    applied = upgrade(engine, args.to)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if applied:
+        print(f"Applied {len(applied)} migration(s); schema is at version {version}.")
+    else:
+        print(f"Nothing to do; schema is at version {version}.")
+
+
+def status(args):
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version <= version else "pending"
+        print(f"{migration.version:>4}  {state:<8} {migration.name}")
+    print(f"Schema version {version} of {LATEST_VERSION}.")
+    return 0 if version >= LATEST_VERSION else 1
+
+
+def reset(args):
+    if not args.yes:
+        print("This drops every table and all data. Re-run with --yes to confirm.")
+        return 1
+    print("Resetting database tables (Drop All)...")
+    Base.metadata.drop_all(bind=engine)
+    upgrade(engine)
+    print("Database reset successfully!")
+
+
+def create_user(args):
+    from app.core.security import get_password_hash
+    password = args.password or getpass.getpass(f"Password for {args.username}: ")
+    db = SessionLocal()
+    try:
+        if db.scalar(select(User.id).where(User.username == args.username)) is not None:
+            print(f"User '{args.username}' already exists.")
+            return 1
+        db.add(User(username=args.username, hashed_password=get_password_hash(password)))
+        db.commit()
+        print(f"Created user '{args.username}'.")
+    finally:
+        db.close()
+
+
+def serve(args):
+    import uvicorn
+    from app.core.config import settings
+    if args.workers > 1 and settings.SHARED_STATE_BACKEND == "memory":
+        print("WARNING: each worker keeps its own caches and job notifications with SHARED_STATE_BACKEND=memory; "
+              "set SHARED_STATE_BACKEND=redis and SHARED_STATE_URL to share them.")
+    try:
+        with engine.connect() as conn:
+            version = current_version(conn)
+    except Exception as e:
+        # Start anyway, like the app itself; requests fail until the database is up
+        print(f"WARNING: database unreachable ({type(e).__name__}); the schema version was not checked.")
+    else:
+        if version < LATEST_VERSION and not settings.AUTO_MIGRATE:
+            print(f"Schema is at version {version} of {LATEST_VERSION}; run `python manage.py migrate` first.")
+            return 1
+    # Workers are separate processes that each import app.main (and run its lifespan)
+    uvicorn.run("app.main:app", host=args.host, port=args.port or settings.PORT, workers=args.workers,
+                proxy_headers=True, log_level=args.log_level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("migrate", help="apply pending migrations")
+    command.add_argument("--to", type=int, help="stop at this version")
+    command.set_defaults(func=migrate)
+
+    command = commands.add_parser("status", help="show applied and pending migrations (exit 1 if behind)")
+    command.set_defaults(func=status)
+
+    command = commands.add_parser("reset", help="drop all tables and re-create them")
+    command.add_argument("--yes", action="store_true", help="confirm dropping all data")
+    command.set_defaults(func=reset)
+
+    command = commands.add_parser("create-user", help="add a user who can sign in")
+    command.add_argument("username")
+    command.add_argument("--password", help="prompted for when omitted")
+    command.set_defaults(func=create_user)
+
+    command = commands.add_parser("serve", help="run the app with uvicorn, optionally with several workers")
+    command.add_argument("--host", default="0.0.0.0")
+    command.add_argument("--port", type=int, help="defaults to PORT")
+    command.add_argument("--workers", type=int, default=1)
+    command.add_argument("--log-level", default="info")
+    command.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    # Plain lines for the app's loggers (e.g. migration progress) on the command line;
+    # `serve` replaces this with the app's own logging once app.main is imported
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger("app").addHandler(handler)
+    logging.getLogger("app").setLevel(logging.INFO)
+    sys.exit(args.func(args) or 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Settings are read when app.core.config is imported: point the app at a scratch SQLite database
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="ai_app_tests_"), "app.db"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
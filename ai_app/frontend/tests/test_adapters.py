@@ -0,0 +1,16 @@
+import pytest
+
+from app.core.adapters import response_adapters
+from app.core.config import settings
+
+
+def test_misspelled_adapter_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTOR_RESPONSE_ADAPTER", "detection")
+    with pytest.raises(RuntimeError, match="'detections'"):
+        response_adapters.check_setting()
+
+
+@pytest.mark.parametrize("name", ["auto", "detections", "string"])
+def test_known_adapters_pass(monkeypatch, name):
+    monkeypatch.setattr(settings, "PREDICTOR_RESPONSE_ADAPTER", name)
+    response_adapters.check_setting()
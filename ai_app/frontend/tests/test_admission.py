@@ -0,0 +1,64 @@
+"""Upload rate limits: per process on the memory backend, across workers on Redis (fakeredis)."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import admission
+from app.core.admission import RateLimiter, SharedRateLimiter, build_rate_limiter
+from app.core.config import settings
+from app.core.shared_state import MemoryState, RedisState
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICT_RATE_LIMIT", 1.0)
+    monkeypatch.setattr(settings, "PREDICT_RATE_BURST", 5)
+
+
+def test_memory_backend_keeps_buckets_in_process(monkeypatch):
+    monkeypatch.setattr(admission, "shared_state", MemoryState(maxsize=10))
+    limiter = build_rate_limiter()
+    assert isinstance(limiter, RateLimiter)
+
+    async def scenario():
+        return [await limiter.try_acquire("user:1") for _ in range(6)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:5] == [0.0] * 5
+    assert 0 < waits[5] <= 1.0
+
+
+def test_redis_backend_limits_across_workers(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    # Two worker processes: separate clients and limiters, one Redis
+    workers = [RedisState("redis://unused", prefix="test:", client=fakeredis.FakeAsyncRedis(server=server)) for _ in range(2)]
+    monkeypatch.setattr(admission, "shared_state", workers[0])
+    assert isinstance(build_rate_limiter(), SharedRateLimiter)
+    # 2 seconds into a 5-second window
+    monkeypatch.setattr(admission, "time", SimpleNamespace(time=lambda: 1002.0, monotonic=time.monotonic))
+
+    async def scenario():
+        waits = []
+        for n in range(10):
+            monkeypatch.setattr(admission, "shared_state", workers[n % 2])
+            waits.append(await SharedRateLimiter().try_acquire("user:1"))
+        # Another client has its own window
+        waits.append(await SharedRateLimiter().try_acquire("user:2"))
+        return waits
+
+    waits = asyncio.run(scenario())
+    # 5 per 5-second window in total, not 5 per worker; retry when the window ends
+    assert waits[:10] == [0.0] * 5 + [3.0] * 5
+    assert waits[10] == 0.0
+
+
+def test_shared_limiter_admits_when_state_is_down(monkeypatch):
+    class Down(MemoryState):
+        async def incr(self, key, amount=1, ttl=None):
+            raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(admission, "shared_state", Down(maxsize=10))
+    assert asyncio.run(SharedRateLimiter().try_acquire("user:1")) == 0.0
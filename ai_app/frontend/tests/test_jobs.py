@@ -0,0 +1,51 @@
+"""Recovery of unfinished prediction jobs against a scratch SQLite database."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.core.jobs import QUEUED, RUNNING, PredictionQueue
+from app.db.database import AsyncSessionLocal, engine
+from app.db.migrations import upgrade
+from app.db.models import Prediction
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    upgrade(engine)
+
+
+def test_later_passes_requeue_only_untouched_jobs():
+    old = datetime.now() - timedelta(seconds=settings.PREDICT_JOB_STALE_AFTER * 2)
+    new = datetime.now()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Prediction))
+            jobs = {
+                "queued_new": Prediction(filename="a.jpg", status=QUEUED, created_at=new),
+                "queued_old": Prediction(filename="b.jpg", status=QUEUED, created_at=old),
+                "running_new": Prediction(filename="c.jpg", status=RUNNING, created_at=old, updated_at=new),
+                "running_old": Prediction(filename="d.jpg", status=RUNNING, created_at=old, updated_at=old),
+            }
+            db.add_all(jobs.values())
+            await db.commit()
+            ids = {name: job.id for name, job in jobs.items()}
+
+        queue = PredictionQueue()
+        queue._queue = asyncio.Queue()
+        await queue._requeue_unfinished(all_queued=False)
+        later = [queue._queue.get_nowait() for _ in range(queue._queue.qsize())]
+        await queue._requeue_unfinished(all_queued=True)
+        first = [queue._queue.get_nowait() for _ in range(queue._queue.qsize())]
+        async with AsyncSessionLocal() as db:
+            status = await db.get(Prediction, ids["running_old"])
+        return ids, later, first, status.status
+
+    ids, later, first, status = asyncio.run(scenario())
+    assert later == [ids["queued_old"], ids["running_old"]]
+    assert status == QUEUED
+    # The startup pass takes every queued job, however recent
+    assert first == [ids["queued_new"], ids["queued_old"], ids["running_old"]]
@@ -0,0 +1,22 @@
+"""SQL hooks of instrument_engine."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.core.metrics import DB_QUERIES, instrument_engine
+
+
+def test_failed_statements_leave_no_query_state():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    before = DB_QUERIES.labels("background")._value.get()
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.rollback()
+        assert "query_start" not in conn.info
+        conn.execute(text("SELECT 1"))
+        assert conn.info == {}
+    # Only the successful statement is counted
+    assert DB_QUERIES.labels("background")._value.get() == before + 1
@@ -0,0 +1,59 @@
+"""Streaming a spooled upload to the predictor (httpx.MockTransport stands in for it)."""
+import asyncio
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.predictor import request_prediction
+
+
+@pytest.fixture(autouse=True)
+def plain_upload(monkeypatch):
+    monkeypatch.setattr(settings, "PREPROCESS_ENABLED", False)
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RETRIES", 0)
+
+
+async def read_form(request: httpx.Request):
+    body = await request.aread()
+    assert int(request.headers["content-length"]) == len(body)
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", request.headers["content-type"].encode())]}
+    return await Request(scope, receive).form()
+
+
+def test_spooled_upload_is_sent_as_multipart(tmp_path):
+    image = tmp_path / "upload.bin"
+    image.write_bytes(b"\xff\xd8" + bytes(range(256)) * 2048)
+    received = {}
+
+    async def predictor(request):
+        form = await read_form(request)
+        upload = form["file"]
+        received.update(filename=upload.filename, content_type=upload.content_type, content=await upload.read())
+        return httpx.Response(200, json={"prediction": "cat", "confidence": 0.9})
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(predictor)) as client:
+            return await request_prediction(client, 'my "cat".jpg', image, "image/jpeg")
+
+    prediction, confidence, error, _ = asyncio.run(scenario())
+    assert (prediction, confidence, error) == ("cat", 0.9, None)
+    assert received == {"filename": 'my %22cat%22.jpg', "content_type": "image/jpeg", "content": image.read_bytes()}
+
+
+def test_missing_upload_is_an_error_result(tmp_path):
+    async def predictor(request):
+        return httpx.Response(200, json={"prediction": "cat"})
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(predictor)) as client:
+            return await request_prediction(client, "cat.jpg", tmp_path / "gone.jpg", "image/jpeg")
+
+    prediction, confidence, error, detections = asyncio.run(scenario())
+    assert (prediction, confidence, detections) == (None, 0, [])
+    assert error.startswith("Upload Error")
@@ -0,0 +1,200 @@
+"""Circuit breaker, retry budget and hedging against a fake upstream (httpx.MockTransport)."""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker, CircuitOpenError, ResilientUpstream
+
+
+class FakeUpstream:
+    """Answers per URL with a status code after an optional delay; records calls and cancellations."""
+
+    def __init__(self, status: int = 200, delays: dict[str, float] | None = None):
+        self.status = status
+        self.delays = delays or {}
+        self.calls: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        self.calls.append(url)
+        try:
+            await asyncio.sleep(self.delays.get(url, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(url)
+            raise
+        return httpx.Response(self.status, json={"url": url})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "BREAKER_RECOVERY_TIMEOUT", 0.1)
+    monkeypatch.setattr(settings, "BREAKER_HALF_OPEN_PROBES", 1)
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "RETRY_BUDGET_RATIO", 0.1)
+    monkeypatch.setattr(settings, "RETRY_BUDGET_MIN_PER_SECOND", 0.0)
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens():
+    upstream = FakeUpstream(status=500)
+    resilient = ResilientUpstream("test-breaker")
+
+    async def scenario():
+        async with upstream.client() as client:
+            for _ in range(3):
+                assert (await resilient.call(client.get, ["http://a/predict"])).status_code == 500
+            breaker = resilient.breaker("http://a/predict")
+            assert breaker.state == CircuitBreaker.OPEN
+
+            # Open: rejected without reaching the upstream
+            with pytest.raises(CircuitOpenError):
+                await resilient.call(client.get, ["http://a/predict"])
+            assert len(upstream.calls) == 3
+
+            # After the recovery timeout one probe goes through; a failed probe opens it again
+            await asyncio.sleep(0.15)
+            assert (await resilient.call(client.get, ["http://a/predict"])).status_code == 500
+            assert breaker.state == CircuitBreaker.OPEN
+            assert len(upstream.calls) == 4
+
+            # A successful probe closes it
+            await asyncio.sleep(0.15)
+            upstream.status = 200
+            assert (await resilient.call(client.get, ["http://a/predict"])).status_code == 200
+            assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_half_open_lets_only_the_configured_probes_through():
+    breaker = CircuitBreaker("test-probes", "http://a")
+    for _ in range(3):
+        breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    # A probe cancelled before finishing gives its slot back
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_local_error_in_half_open_gives_the_probe_back():
+    resilient = ResilientUpstream("test-local-error")
+    breaker = resilient.breaker("http://a/predict")
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.15)
+
+    async def unreadable_upload(url):
+        raise OSError("spooled upload is gone")
+
+    async def scenario():
+        with pytest.raises(OSError):
+            await resilient.call(unreadable_upload, ["http://a/predict"])
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # The probe slot is free again: the next call goes through and closes the circuit
+        async with FakeUpstream().client() as client:
+            assert (await resilient.call(client.get, ["http://a/predict"])).status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_retry_budget_caps_retries(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_ENABLED", False)
+    upstream = FakeUpstream(status=503)
+    resilient = ResilientUpstream("test-budget")
+
+    async def scenario():
+        async with upstream.client() as client:
+            for _ in range(50):
+                assert (await resilient.call(client.get, ["http://a/predict"])).status_code == 503
+
+    asyncio.run(scenario())
+    # 50 requests deposit 5 tokens: without the budget, 2 retries each would make 150 calls
+    assert 50 <= len(upstream.calls) <= 55
+
+
+def test_retries_use_budget_when_available(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_ENABLED", False)
+    monkeypatch.setattr(settings, "RETRY_BUDGET_RATIO", 2.0)
+    upstream = FakeUpstream(status=503)
+    resilient = ResilientUpstream("test-retries")
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(client.get, ["http://a/predict", "http://b/predict"])
+
+    assert asyncio.run(scenario()).status_code == 503
+    # Every attempt moves on to the next endpoint
+    assert upstream.calls == ["http://a/predict", "http://b/predict", "http://a/predict"]
+
+
+def test_no_retry_for_non_idempotent_calls(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BUDGET_RATIO", 2.0)
+    upstream = FakeUpstream(status=503)
+    resilient = ResilientUpstream("test-no-retry")
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(client.post, ["http://a/train/start"], retry=False)
+
+    assert asyncio.run(scenario()).status_code == 503
+    assert len(upstream.calls) == 1
+
+
+def test_hedge_fires_after_delay_and_cancels_the_loser(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BUDGET_RATIO", 1.0)
+    upstream = FakeUpstream(delays={"http://slow/predict": 5.0, "http://fast/predict": 0.01})
+    resilient = ResilientUpstream("test-hedge")
+
+    async def scenario():
+        async with upstream.client() as client:
+            started = time.monotonic()
+            response = await resilient.call(client.get, ["http://slow/predict", "http://fast/predict"], hedge_delay=0.1)
+            return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(scenario())
+    assert response.json()["url"] == "http://fast/predict"
+    assert 0.1 <= elapsed < 1.0
+    assert upstream.calls == ["http://slow/predict", "http://fast/predict"]
+    assert upstream.cancelled == ["http://slow/predict"]
+    # The cancelled call counts neither as a failure nor as a held probe
+    assert resilient.breaker("http://slow/predict").failures == 0
+
+
+def test_no_hedge_when_primary_answers_in_time(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BUDGET_RATIO", 1.0)
+    upstream = FakeUpstream(delays={"http://a/predict": 0.01})
+    resilient = ResilientUpstream("test-no-hedge")
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(client.get, ["http://a/predict", "http://b/predict"], hedge_delay=0.5)
+
+    assert asyncio.run(scenario()).json()["url"] == "http://a/predict"
+    assert upstream.calls == ["http://a/predict"]
+
+
+def test_no_hedge_without_budget():
+    upstream = FakeUpstream(delays={"http://slow/predict": 0.3})
+    resilient = ResilientUpstream("test-hedge-budget")
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(client.get, ["http://slow/predict", "http://fast/predict"], hedge_delay=0.05)
+
+    # One deposit of 0.1 tokens doesn't pay for a hedge: the slow primary's answer is used
+    assert asyncio.run(scenario()).json()["url"] == "http://slow/predict"
+    assert upstream.calls == ["http://slow/predict"]
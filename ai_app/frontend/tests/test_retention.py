@@ -0,0 +1,46 @@
+"""The retention sweep against a scratch SQLite database and LocalStorage in a temp dir."""
+import asyncio
+import os
+
+import pytest
+
+from app.core import retention
+from app.core.config import settings
+from app.core.storage import LocalStorage
+from app.db.database import AsyncSessionLocal, engine
+from app.db.migrations import upgrade
+from app.db.models import Prediction
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    upgrade(engine)
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    backend = LocalStorage(root=str(tmp_path / "uploads"))
+    monkeypatch.setattr(retention, "storage", backend)
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 2)
+    return backend
+
+
+def test_sweep_deletes_only_unreferenced_keys(local):
+    keys = [f"{n:02x}/00/{n:02x}00.jpg" for n in range(5)]
+    for key in keys:
+        asyncio.run(local.put_bytes(b"image", key))
+        os.utime(local.path(key), (0, 0))
+    fresh = "ff/00/ff00.jpg"
+    asyncio.run(local.put_bytes(b"image", fresh))
+
+    async def reference():
+        async with AsyncSessionLocal() as db:
+            db.add(Prediction(filename="a.jpg", prediction_text="x", confidence=1.0, image_path=keys[1]))
+            db.add(Prediction(filename="b.jpg", prediction_text="x", confidence=1.0, image_path=keys[4], thumbnail_path=keys[3]))
+            await db.commit()
+
+    asyncio.run(reference())
+    assert asyncio.run(retention.retention_job.sweep_unreferenced()) == 2
+    assert [os.path.exists(local.path(key)) for key in keys] == [False, True, False, True, True]
+    # Inside the grace period
+    assert os.path.exists(local.path(fresh))
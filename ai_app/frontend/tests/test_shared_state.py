@@ -0,0 +1,83 @@
+"""Shared state on both backends: in-memory and Redis (fakeredis)."""
+import asyncio
+
+import pytest
+
+from app.core import shared_state as shared_state_module
+from app.core.shared_state import MemoryState, RedisState, claim
+
+
+@pytest.fixture(params=["memory", "redis"])
+def state(request):
+    if request.param == "memory":
+        return MemoryState(maxsize=100)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisState("redis://unused", prefix="test:", client=fakeredis.FakeAsyncRedis())
+
+
+def test_values_and_ttl(state):
+    async def scenario():
+        await state.set("a", b"1")
+        await state.set("b", b"2", ttl=0.05)
+        assert await state.get("a") == b"1"
+        assert await state.get("b") == b"2"
+        await asyncio.sleep(0.1)
+        assert await state.get("b") is None
+        await state.delete("a")
+        assert await state.get("a") is None
+
+    asyncio.run(scenario())
+
+
+def test_set_if_absent_is_a_lease(state):
+    async def scenario():
+        assert await state.set_if_absent("lease", b"w1", ttl=0.05)
+        assert not await state.set_if_absent("lease", b"w2", ttl=0.05)
+        assert await state.get("lease") == b"w1"
+        await asyncio.sleep(0.1)
+        assert await state.set_if_absent("lease", b"w2", ttl=0.05)
+
+    asyncio.run(scenario())
+
+
+def test_incr_and_delete_prefix(state):
+    async def scenario():
+        assert await state.incr("count") == 1
+        assert await state.incr("count", 5) == 6
+        for n in range(3):
+            await state.set(f"entry:{n}", b"x")
+        await state.set("other", b"y")
+        assert await state.delete_prefix("entry:") == 3
+        assert await state.get("entry:0") is None
+        assert await state.get("other") == b"y"
+
+    asyncio.run(scenario())
+
+
+def test_publish_reaches_subscribers(state):
+    async def scenario():
+        async with state.subscribe("jobs") as messages:
+            # Redis confirms the subscription asynchronously
+            await asyncio.sleep(0.05)
+            await state.publish("jobs", b"42")
+            return await asyncio.wait_for(anext(messages), timeout=2)
+
+    assert asyncio.run(scenario()) == b"42"
+
+
+def test_claim_lets_one_worker_run(state, monkeypatch):
+    monkeypatch.setattr(shared_state_module, "shared_state", state)
+
+    async def scenario():
+        return [await claim("retention", ttl=60) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [True, False, False]
+
+
+def test_claim_runs_when_state_is_unreachable(monkeypatch):
+    class Down(MemoryState):
+        async def set_if_absent(self, key, value, ttl):
+            raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(shared_state_module, "shared_state", Down(maxsize=10))
+    assert asyncio.run(claim("retention", ttl=60))
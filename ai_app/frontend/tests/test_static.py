@@ -0,0 +1,22 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.core.static import IMMUTABLE, CachedStaticFiles
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "app.css").write_text("body {}")
+    return TestClient(Starlette(routes=[Mount("/static", CachedStaticFiles(directory=tmp_path))]))
+
+
+@pytest.mark.parametrize("query", ["v=abc123", "x=1&v=abc123"])
+def test_versioned_asset_is_immutable(client, query):
+    assert client.get(f"/static/app.css?{query}").headers["cache-control"] == IMMUTABLE
+
+
+@pytest.mark.parametrize("query", ["", "dev=1", "nav=top", "v="])
+def test_unversioned_asset_is_revalidated(client, query):
+    assert "must-revalidate" in client.get(f"/static/app.css?{query}").headers["cache-control"]
@@ -0,0 +1,134 @@
+"""Storage backends: LocalStorage in a temp dir, S3Storage against the in-memory S3 stand-in."""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.core import storage
+from app.core.storage import LocalStorage, S3Storage
+from benchmarks.stub_server import StubServer, create_s3_stub_app
+
+KEY = "ab/cd/abcd1234.jpg"
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(root=str(tmp_path), web_prefix="static/uploads/predictions")
+
+
+@pytest.fixture(scope="module")
+def s3_server():
+    pytest.importorskip("boto3")
+    app = create_s3_stub_app()
+    with StubServer(app) as server:
+        yield server, app.state.objects
+
+
+@pytest.fixture
+def s3(s3_server):
+    server, objects = s3_server
+    objects.clear()
+    return S3Storage("tests", prefix="uploads", endpoint_url=server.url, region="us-east-1",
+                     access_key_id="test", secret_access_key="test")
+
+
+async def collect(backend, cutoff: float, batch_size: int = 100) -> list[list[str]]:
+    return [batch async for batch in backend.iter_older_than(cutoff, batch_size)]
+
+
+def test_local_concurrent_writes_of_one_key(local):
+    async def scenario():
+        await asyncio.gather(*(local.put_bytes(b"same image", KEY) for _ in range(20)))
+
+    asyncio.run(scenario())
+    assert asyncio.run(local.read(KEY)) == b"same image"
+    # No temp files left behind
+    assert os.listdir(os.path.dirname(local.path(KEY))) == ["abcd1234.jpg"]
+
+
+def test_local_put_existing_key_refreshes_mtime(local, tmp_path):
+    asyncio.run(local.put_bytes(b"image", KEY))
+    os.utime(local.path(KEY), (0, 0))
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"image")
+    asyncio.run(local.put_file(str(source), KEY))
+    assert os.stat(local.path(KEY)).st_mtime > time.time() - 60
+    assert not source.exists()
+
+
+def test_local_delete_older_than(local):
+    asyncio.run(local.put_bytes(b"image", KEY))
+    assert not asyncio.run(local.delete(KEY, older_than=time.time() - 60))
+    assert asyncio.run(collect(local, time.time() + 1)) == [[KEY]]
+    assert asyncio.run(local.delete(KEY, older_than=time.time() + 1))
+    # Empty shard directories are removed too
+    assert os.listdir(local.root) == []
+
+
+def test_s3_put_read_exists(s3, s3_server):
+    _, objects = s3_server
+    asyncio.run(s3.put_bytes(b"jpeg bytes", KEY, "image/jpeg"))
+    assert asyncio.run(s3.exists(KEY))
+    assert not asyncio.run(s3.exists("ab/cd/missing.jpg"))
+    assert asyncio.run(s3.read(KEY)) == b"jpeg bytes"
+    stored = objects[("tests", f"uploads/{KEY}")]
+    assert stored["content_type"] == "image/jpeg"
+    assert "immutable" in stored["cache_control"]
+
+
+def test_s3_rewrite_keeps_content_type(s3, s3_server):
+    _, objects = s3_server
+    asyncio.run(s3.put_bytes(b"jpeg bytes", KEY, "image/jpeg"))
+    before = objects[("tests", f"uploads/{KEY}")]["last_modified"]
+    time.sleep(1.1)
+    # Same key again: only touched (server-side copy), headers preserved
+    asyncio.run(s3.put_bytes(b"jpeg bytes", KEY, None))
+    stored = objects[("tests", f"uploads/{KEY}")]
+    assert stored["last_modified"] > before
+    assert stored["content_type"] == "image/jpeg"
+    assert "immutable" in stored["cache_control"]
+
+
+def test_s3_put_file_consumes_source(s3, tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"png bytes")
+    asyncio.run(s3.put_file(str(source), KEY, "image/png"))
+    assert not source.exists()
+    assert asyncio.run(s3.read(KEY)) == b"png bytes"
+
+
+def test_local_lists_in_batches(local):
+    keys = [f"{n:02x}/00/{n:02x}00.jpg" for n in range(7)]
+    for key in keys:
+        asyncio.run(local.put_bytes(b"image", key))
+    batches = asyncio.run(collect(local, time.time() + 1, batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert sorted(key for batch in batches for key in batch) == keys
+
+
+def test_s3_list_and_delete_older_than(s3):
+    asyncio.run(s3.put_bytes(b"a", KEY, "image/jpeg"))
+    asyncio.run(s3.put_bytes(b"b", "ef/01/ef01.jpg", "image/jpeg"))
+    assert asyncio.run(collect(s3, time.time() + 5)) == [["ab/cd/abcd1234.jpg", "ef/01/ef01.jpg"]]
+    assert asyncio.run(collect(s3, time.time() - 60)) == []
+    assert not asyncio.run(s3.delete(KEY, older_than=time.time() - 60))
+    assert asyncio.run(s3.delete(KEY, older_than=time.time() + 5))
+    assert not asyncio.run(s3.exists(KEY))
+
+
+def test_s3_lists_page_by_page(s3):
+    keys = [f"{n:02x}/00/{n:02x}00.jpg" for n in range(5)]
+    for key in keys:
+        asyncio.run(s3.put_bytes(b"image", key, "image/jpeg"))
+    assert asyncio.run(collect(s3, time.time() + 5, batch_size=2)) == [keys[0:2], keys[2:4], keys[4:]]
+
+
+def test_stale_spooled_uploads_are_discarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "INCOMING_DIR", str(tmp_path))
+    stale, fresh = tmp_path / "a.part", tmp_path / "b.part"
+    stale.write_bytes(b"x")
+    fresh.write_bytes(b"y")
+    os.utime(stale, (0, 0))
+    assert asyncio.run(storage.discard_stale_uploads(time.time() - 60)) == 1
+    assert list(tmp_path.iterdir()) == [fresh]
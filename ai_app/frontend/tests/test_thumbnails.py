@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.core import thumbnails
+from app.core.config import settings
+from app.core.thumbnails import ThumbnailWorker
+
+KEY = "ab/cd/" + "ab" * 32 + ".jpg"
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    if thumbnails.Image is None:
+        pytest.skip("Pillow is not installed")
+    monkeypatch.setattr(settings, "THUMBNAILS_ENABLED", True)
+    monkeypatch.setattr(settings, "THUMBNAIL_QUEUE_SIZE", 1)
+
+
+def test_uploads_are_processed_while_the_backfill_runs(monkeypatch):
+    worker = ThumbnailWorker()
+    processed = []
+
+    async def slow_backfill():
+        await asyncio.Event().wait()
+
+    async def process(prediction_ids, image_path):
+        processed.append(prediction_ids)
+
+    async def always(key, ttl):
+        return True
+
+    monkeypatch.setattr(thumbnails, "claim", always)
+    monkeypatch.setattr(worker, "_backfill_missing", slow_backfill)
+    monkeypatch.setattr(worker, "process", process)
+
+    async def scenario():
+        worker.start()
+        for prediction_id in range(1, 4):
+            worker.enqueue([prediction_id], KEY)
+            await asyncio.sleep(0.01)
+        await worker.stop()
+
+    asyncio.run(scenario())
+    assert processed == [[1], [2], [3]]
+    assert worker.dropped == 0
+
+
+def test_full_queue_counts_dropped_uploads():
+    worker = ThumbnailWorker()
+    worker._queue = asyncio.Queue(maxsize=1)
+    for prediction_id in range(1, 4):
+        worker.enqueue([prediction_id], KEY)
+    assert worker.dropped == 2
+    assert worker._queue.get_nowait() == ([1], KEY)
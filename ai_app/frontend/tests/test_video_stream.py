@@ -0,0 +1,52 @@
+"""/predict/stream/video gives back its stream slot and spooled upload on every path."""
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core import storage
+from app.core.streams import stream_limit
+from app.routers import predict
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "INCOMING_DIR", str(tmp_path))
+    monkeypatch.setattr(predict, "video_available", lambda: True)
+    return tmp_path
+
+
+def call_endpoint():
+    upload = UploadFile(io.BytesIO(b"not really a video"), filename="shelf.mp4")
+    return predict.predict_video(file=upload, fps=None, client=None, user=None)
+
+
+@pytest.mark.parametrize("error", [ValueError("no video stream"), OSError("disk full"), RuntimeError("codec crashed")])
+def test_failed_probe_releases_slot_and_upload(spool_dir, monkeypatch, error):
+    def probe(path):
+        raise error
+
+    monkeypatch.setattr(predict, "probe_video", probe)
+    expected = HTTPException if isinstance(error, ValueError) else type(error)
+    with pytest.raises(expected):
+        asyncio.run(call_endpoint())
+    assert stream_limit.active == 0
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_disconnect_before_streaming_releases_slot_and_upload(spool_dir, monkeypatch):
+    monkeypatch.setattr(predict, "probe_video", lambda path: 25.0)
+
+    async def scenario():
+        response = await call_endpoint()
+        assert stream_limit.active == 1
+        assert len(list(spool_dir.iterdir())) == 1
+        # What Starlette runs once the client has gone, the body never iterated
+        await response.background()
+        # Idempotent: a second cleanup doesn't release the slot twice
+        await response.background()
+
+    asyncio.run(scenario())
+    assert stream_limit.active == 0
+    assert list(spool_dir.iterdir()) == []